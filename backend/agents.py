@@ -2,10 +2,13 @@
 Custom Agent and Runner implementation for GPT-5 compatibility
 """
 import asyncio
-from typing import Any, Dict, List, Optional, Type
+from typing import Any, Callable, Dict, List, Optional, Protocol, Tuple, Type
 from pydantic import BaseModel
-from openai import OpenAI
-import os
+from llm_client import acreate_response
+from handoff import handoff_lines
+from instruction_blocks import CHANGED_BLOCKS_HEADER, assign_issues, split_blocks
+from structured_output import StructuredOutputError, parse_output, text_format
+from tracing import set_attributes, span
 # Optional enhanced logging - fallback if not available
 try:
     from enhanced_logging import log_model_request, log_model_response, log_model_error
@@ -19,14 +22,41 @@ except ImportError:
     def log_model_error(*args, **kwargs): pass
 import time
 
-# Initialize client lazily to avoid import-time errors
-client = None
+# Orchestration graph: stage -> stages whose output it needs. Stages without a
+# matching tool are left out; stages whose dependencies are done run concurrently.
+PIPELINE_DEPENDENCIES: Dict[str, List[str]] = {
+    "search": [],
+    "extract": [],
+    "critique": [],
+    "revise": ["search", "extract", "critique"],
+}
 
-def get_client():
-    global client
-    if client is None:
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-    return client
+# How each stage's output is labelled in the context of the stages that consume it
+STAGE_LABELS = {
+    "search": "🔍 Search Results",
+    "extract": "📋 Extracted Instructions",
+    "critique": "🔍 Critique",
+    "revise": "✏️ Revision",
+}
+
+# Token budget of each stage's output in the context of the stages that consume it
+STAGE_HANDOFF_TOKENS = {
+    "search": 600,
+    "extract": 500,
+    "critique": 1500,
+    "revise": 2000,
+}
+DEFAULT_HANDOFF_TOKENS = 800
+
+class StageCheckpoints(Protocol):
+    """Where Runner keeps completed stage outputs so a retried run can skip them"""
+    def get(self, stage: str) -> Optional[str]: ...
+    def put(self, stage: str, content: str) -> None: ...
+
+class BlockCache(Protocol):
+    """Per-instruction-block output items (e.g. critique issues) kept across runs"""
+    def get(self, block: str) -> Optional[List[Dict[str, Any]]]: ...
+    def put(self, block: str, items: List[Dict[str, Any]]) -> None: ...
 
 class Agent:
     def __init__(
@@ -36,7 +66,15 @@ class Agent:
         instructions: str = "",
         output_type: Optional[Type[BaseModel]] = None,
         tools: Optional[List[Dict]] = None,
-        reasoning_effort: str = "medium"
+        reasoning_effort: str = "medium",
+        web_search: bool = True,
+        known_facts: str = "",
+        stage_dependencies: Optional[Dict[str, List[str]]] = None,
+        timeout: Optional[float] = None,
+        block_cache: Optional[BlockCache] = None,
+        max_rounds: int = 1,
+        token_budget: Optional[int] = None,
+        time_budget: Optional[float] = None
     ):
         self.name = name
         self.model = model
@@ -44,6 +82,14 @@ class Agent:
         self.output_type = output_type
         self.tools = tools or []
         self.reasoning_effort = reasoning_effort
+        self.web_search = web_search      # attach the web_search_preview tool to the model call
+        self.known_facts = known_facts    # cached research used instead of the search stage
+        self.stage_dependencies = stage_dependencies  # tool stage graph, PIPELINE_DEPENDENCIES by default
+        self.timeout = timeout            # seconds for a whole Runner.run of this agent (None = no limit)
+        self.block_cache = block_cache    # per-block `issues` of an earlier run, used by the critique stage
+        self.max_rounds = max_rounds      # critique/revise rounds; further rounds stop early on convergence
+        self.token_budget = token_budget  # tokens for all rounds together (None = no limit)
+        self.time_budget = time_budget    # seconds for all rounds together (None = no limit)
     
     def as_tool(self, tool_name: str, tool_description: str) -> Dict[str, Any]:
         """Convert this agent to a tool that can be used by other agents"""
@@ -57,27 +103,64 @@ class Agent:
         }
 
 class RunResult:
-    def __init__(self, content: str, agent_name: str):
+    def __init__(self, content: str, agent_name: str, artifacts: Optional[Dict[str, str]] = None,
+                 timings: Optional[Dict[str, Dict[str, float]]] = None, error: bool = False,
+                 output: Optional[BaseModel] = None, skipped: bool = False, tokens: int = 0,
+                 refinement: Optional[Dict[str, Any]] = None):
         self.final_output = content
         self.value = content
         self.agent_name = agent_name
         self.content = content
+        self.artifacts = artifacts or {}  # intermediate stage outputs, e.g. "search"
+        self.timings = timings or {}      # stage -> {"start", "seconds"} relative to the run start
+        self.error = error                # content is an "Error: ..." message, not model output
+        self.output = output              # validated agent.output_type instance, if any
+        self.skipped = skipped            # the stage wasn't needed; content is its input unchanged
+        self.tokens = tokens              # total tokens the model calls of this result used
+        self.refinement = refinement      # rounds, stop_reason and tokens of the critique/revise rounds
     
     def __str__(self):
         return self.content
 
 class Runner:
     @staticmethod
-    async def run(agent: Agent, input_data: str) -> RunResult:
+    async def run(agent: Agent, input_data: str, on_stage: Optional[Callable[[str], None]] = None,
+                  timeout: Optional[float] = None, checkpoints: Optional[StageCheckpoints] = None) -> RunResult:
         """
-        Run an agent with input data and return structured results
+        Run an agent with input data and return structured results.
+        `on_stage` is called with the name of each pipeline step as it starts.
+        `timeout` (default agent.timeout) bounds the whole run: when it expires the
+        in-flight model calls are cancelled and an error result is returned.
+        Cancelling the task awaiting run() cancels them the same way.
+        With `checkpoints`, completed tool stages are saved there and stages that
+        already have a checkpoint are not run again.
         """
+        timeout = timeout if timeout is not None else agent.timeout
+        if timeout is None:
+            return await Runner._run(agent, input_data, on_stage, checkpoints)
+        try:
+            return await asyncio.wait_for(Runner._run(agent, input_data, on_stage, checkpoints), timeout)
+        except asyncio.TimeoutError:
+            print(f"⏱️ {agent.name} timed out after {timeout:.1f}s")
+            return RunResult(f"Error: {agent.name} timed out after {timeout:.1f}s", agent.name, error=True)
+    
+    @staticmethod
+    async def _run(agent: Agent, input_data: str, on_stage: Optional[Callable[[str], None]] = None,
+                   checkpoints: Optional[StageCheckpoints] = None) -> RunResult:
+        with span("agent.run", agent=agent.name, model=agent.model, reasoning_effort=agent.reasoning_effort) as run_span:
+            result = await Runner._dispatch(agent, input_data, on_stage, checkpoints)
+            run_span.set(error=result.error)
+            return result
+    
+    @staticmethod
+    async def _dispatch(agent: Agent, input_data: str, on_stage: Optional[Callable[[str], None]] = None,
+                        checkpoints: Optional[StageCheckpoints] = None) -> RunResult:
         try:
             print(f"🤖 Running {agent.name} with {agent.model}")
             
             # For agents with tools (main orchestrating agent)
             if agent.tools:
-                return await Runner._run_with_tools(agent, input_data)
+                return await Runner._run_with_tools(agent, input_data, on_stage, checkpoints)
             
             # For simple agents without tools
             else:
@@ -85,14 +168,12 @@ class Runner:
                 
         except Exception as e:
             print(f"❌ Error running agent {agent.name}: {e}")
-            return RunResult(f"Error: {str(e)}", agent.name)
+            return RunResult(f"Error: {str(e)}", agent.name, error=True)
     
     @staticmethod
     async def _run_simple_agent(agent: Agent, input_data: str) -> RunResult:
         """Run a simple agent without tools"""
         try:
-            client = get_client()
-            
             # Log the agent request
             full_prompt = f"{agent.instructions}\n\nUser: {input_data}"
             log_model_request(
@@ -105,15 +186,20 @@ class Runner:
             
             start_time = time.time()
             try:
-                response = client.responses.create(
+                # With an output_type the reply is constrained to its JSON schema
+                structured = {"text": text_format(agent.output_type)} if agent.output_type else {}
+                response = await acreate_response(
+                    endpoint="agent",
                     model=agent.model,
                     input=full_prompt,
-                    tools=[{"type": "web_search_preview"}],
-                    reasoning={"effort": agent.reasoning_effort}
+                    tools=[{"type": "web_search_preview"}] if agent.web_search else [],
+                    reasoning={"effort": agent.reasoning_effort},
+                    **structured
                 )
                 
                 processing_time = time.time() - start_time
                 content = response.output_text
+                tokens = getattr(getattr(response, "usage", None), "total_tokens", 0) or 0
                 
                 # Log the successful response
                 log_model_response(
@@ -135,88 +221,314 @@ class Runner:
                 )
                 raise api_error
             
-            # If output_type is specified, try to parse it
             if agent.output_type:
                 try:
-                    import json
-                    # Try to extract JSON from the response
-                    json_start = content.find('{')
-                    json_end = content.rfind('}') + 1
-                    if json_start != -1 and json_end > json_start:
-                        json_str = content[json_start:json_end]
-                        parsed_data = json.loads(json_str)
-                        validated_output = agent.output_type(**parsed_data)
-                        return RunResult(validated_output.value if hasattr(validated_output, 'value') else str(validated_output), agent.name)
-                except Exception as parse_error:
-                    print(f"⚠️ Could not parse output as {agent.output_type}: {parse_error}")
+                    with span("parse.output", output_type=agent.output_type.__name__):
+                        output = parse_output(agent.output_type, content)
+                except StructuredOutputError as parse_error:
+                    print(f"❌ {agent.name}: {parse_error}")
+                    return RunResult(f"Error: {parse_error}", agent.name, error=True)
+                return RunResult(Runner._output_content(output), agent.name, output=output, tokens=tokens)
             
-            return RunResult(content, agent.name)
+            return RunResult(content, agent.name, tokens=tokens)
             
         except Exception as e:
             print(f"❌ Error in simple agent {agent.name}: {e}")
-            return RunResult(f"Error: {str(e)}", agent.name)
+            return RunResult(f"Error: {str(e)}", agent.name, error=True)
+    
+    @staticmethod
+    def _output_content(output: BaseModel) -> str:
+        """Single-value outputs hand on their text; others their compact JSON"""
+        return output.value if hasattr(output, 'value') else output.model_dump_json()
+    
+    @staticmethod
+    def _actionable(critique: Optional[RunResult]) -> bool:
+        """Whether a critique asks for changes - true unless it validated with no suggestions"""
+        if critique is None or critique.error or critique.output is None:
+            return True
+        return any(str(issue.suggestion).strip() for issue in critique.output.issues)
+    
+    @staticmethod
+    def _notify(on_stage: Optional[Callable[[str], None]], stage: str) -> None:
+        """Report progress without letting a failing callback break the run"""
+        if on_stage is None:
+            return
+        try:
+            on_stage(stage)
+        except Exception as e:
+            print(f"⚠️ Stage callback failed for {stage}: {e}")
+    
+    @staticmethod
+    def _stage_order(graph: Dict[str, List[str]], stages: List[str]) -> List[str]:
+        """Topological order of the present stages; dependencies on absent stages are ignored"""
+        order: List[str] = []
+        pending = {stage: [dep for dep in graph[stage] if dep in stages] for stage in stages}
+        while pending:
+            ready = [stage for stage, deps in pending.items() if all(dep in order for dep in deps)]
+            if not ready:
+                raise ValueError(f"Pipeline stages have a dependency cycle: {sorted(pending)}")
+            for stage in ready:
+                order.append(stage)
+                del pending[stage]
+        return order
+    
+    @staticmethod
+    def _analysis_context(input_data: str, dependency_results: Dict[str, RunResult]) -> str:
+        """Input for a stage that builds on earlier ones: the original plus their outputs"""
+        return f"Original: {input_data}\n\nPrevious analysis:\n" + Runner._handoff(dependency_results)
+    
+    @staticmethod
+    def _handoff(stage_results: Dict[str, RunResult]) -> str:
+        """Earlier stage outputs in compact form, each within its STAGE_HANDOFF_TOKENS budget"""
+        sections = []
+        for stage, result in stage_results.items():
+            budget = STAGE_HANDOFF_TOKENS.get(stage, DEFAULT_HANDOFF_TOKENS)
+            lines = ["- Not available (stage failed)."] if result.error else handoff_lines(result.content, result.output, budget)
+            sections.append(f"{STAGE_LABELS.get(stage, stage)}:\n" + "\n".join(lines))
+        return "\n\n".join(sections)
+    
+    @staticmethod
+    async def _run_stage(agent: Agent, stage: str, stage_agent: Optional[Agent], input_data: str,
+                         dependency_results: Dict[str, RunResult], on_stage: Optional[Callable[[str], None]]) -> RunResult:
+        if stage == "search" and agent.known_facts:
+            Runner._notify(on_stage, "search_cached")
+            return RunResult(agent.known_facts, "search_cache")
+        if stage == "revise" and not Runner._actionable(dependency_results.get("critique")):
+            Runner._notify(on_stage, "revise_skipped")
+            return RunResult(input_data, stage_agent.name, skipped=True)
+        Runner._notify(on_stage, stage)
+        if stage == "search":
+            return await Runner.run(stage_agent, f"Research information for: {input_data}")
+        if dependency_results:
+            return await Runner.run(stage_agent, Runner._analysis_context(input_data, dependency_results))
+        if stage_agent.block_cache is not None and stage_agent.output_type:
+            return await Runner._run_incremental(stage_agent, input_data)
+        return await Runner.run(stage_agent, input_data)
+    
+    @staticmethod
+    async def _run_incremental(stage_agent: Agent, input_data: str) -> RunResult:
+        """
+        Run an agent whose output is a list of `issues` only on the instruction
+        blocks that have no cached issues, and merge in the cached ones.
+        """
+        cache = stage_agent.block_cache
+        blocks = split_blocks(input_data)
+        block_issues = [cache.get(block) for block in blocks]
+        changed = [i for i, issues in enumerate(block_issues) if issues is None]
+        unmatched: List[Dict[str, Any]] = []
+        set_attributes(blocks=len(blocks), blocks_changed=len(changed))
+        if changed:
+            # A first run sees the whole prompt; later runs only the blocks that changed
+            text = input_data if len(changed) == len(blocks) else CHANGED_BLOCKS_HEADER + "\n\n".join(blocks[i] for i in changed)
+            result = await Runner.run(stage_agent, text)
+            if result.error:
+                return result
+            assigned, unmatched = assign_issues([blocks[i] for i in changed], [issue.model_dump() for issue in result.output.issues])
+            for i, issues in zip(changed, assigned):
+                cache.put(blocks[i], issues)
+                block_issues[i] = issues
+        print(f"♻️ {stage_agent.name}: {len(blocks) - len(changed)}/{len(blocks)} instruction blocks from cache")
+        output = stage_agent.output_type.model_validate({"issues": [issue for issues in block_issues for issue in issues] + unmatched})
+        return RunResult(output.model_dump_json(), stage_agent.name, output=output, tokens=result.tokens if changed else 0)
+    
+    @staticmethod
+    def _stage_agents(agent: Agent, graph: Dict[str, List[str]]) -> Dict[str, Optional[Agent]]:
+        """The tool agent for each stage of the graph (None when the agent has no such tool)"""
+        return {
+            stage: next((tool["function"]["agent"] for tool in agent.tools if stage in tool["function"]["name"]), None)
+            for stage in graph
+        }
+    
+    @staticmethod
+    async def _run_stages(agent: Agent, input_data: str, on_stage: Optional[Callable[[str], None]],
+                          timings: Dict[str, Dict[str, float]], started: float,
+                          checkpoints: Optional[StageCheckpoints] = None) -> Dict[str, RunResult]:
+        """
+        Run the tool stages as a DAG: each stage starts as soon as the stages it
+        depends on have finished, so independent stages run concurrently.
+        Checkpointed stages are served from `checkpoints`; timings mark them "resumed"
+        and failed stages "error".
+        """
+        graph = agent.stage_dependencies or PIPELINE_DEPENDENCIES
+        stage_agents = Runner._stage_agents(agent, graph)
+        present = [stage for stage in graph if stage_agents[stage] or (stage == "search" and agent.known_facts)]
+        order = Runner._stage_order(graph, present)
+        tasks: Dict[str, "asyncio.Task[RunResult]"] = {}
+        
+        async def execute(stage: str) -> RunResult:
+            dependencies = [dep for dep in graph[stage] if dep in tasks]
+            dependency_results = dict(zip(dependencies, await asyncio.gather(*(tasks[dep] for dep in dependencies))))
+            stage_started = time.perf_counter()
+            cached = stage == "search" and bool(agent.known_facts)
+            resumed = Runner._resume_stage(stage_agents[stage], checkpoints.get(stage)) if checkpoints is not None and not cached else None
+            if resumed is not None:
+                Runner._notify(on_stage, f"{stage}_resumed")
+                timings[stage] = {"start": round(stage_started - started, 3), "seconds": 0.0, "resumed": True}
+                return resumed
+            with span(f"stage.{stage}", depends_on=list(dependency_results), cached=cached):
+                result = await Runner._run_stage(agent, stage, stage_agents[stage], input_data, dependency_results, on_stage)
+            timings[stage] = {"start": round(stage_started - started, 3), "seconds": round(time.perf_counter() - stage_started, 3)}
+            if result.error:
+                timings[stage]["error"] = True
+            elif result.skipped:
+                timings[stage]["skipped"] = True
+            elif checkpoints is not None and not cached:
+                checkpoints.put(stage, result.output.model_dump_json() if result.output is not None else result.content)
+            return result
+        
+        for stage in order:
+            tasks[stage] = asyncio.ensure_future(execute(stage))
+        try:
+            results = await asyncio.gather(*(tasks[stage] for stage in order))
+        finally:
+            for task in tasks.values():
+                task.cancel()
+        return dict(zip(order, results))
+    
+    @staticmethod
+    def _resume_stage(stage_agent: Agent, checkpoint: Optional[str]) -> Optional[RunResult]:
+        """Rebuild a stage result from its checkpoint (None if there is no usable one)"""
+        if checkpoint is None:
+            return None
+        if not stage_agent.output_type:
+            return RunResult(checkpoint, stage_agent.name)
+        try:
+            output = parse_output(stage_agent.output_type, checkpoint)
+        except StructuredOutputError:
+            return None
+        return RunResult(Runner._output_content(output), stage_agent.name, output=output)
+    
+    @staticmethod
+    def _format_timings(timings: Dict[str, Dict[str, float]]) -> str:
+        return ", ".join(f"{stage} {entry['seconds']:.1f}s@{entry['start']:.1f}s" for stage, entry in timings.items())
     
     @staticmethod
-    async def _run_with_tools(agent: Agent, input_data: str) -> RunResult:
+    async def _refine(agent: Agent, stage_results: Dict[str, RunResult], timings: Dict[str, Dict[str, float]],
+                      started: float, on_stage: Optional[Callable[[str], None]]) -> Tuple[RunResult, RunResult, Dict[str, Any]]:
+        """
+        Further critique/revise rounds on the revised prompt, up to agent.max_rounds.
+        Stops when critique finds nothing actionable or revise no longer changes the
+        prompt, and before a round that - judging by the previous one - would go over
+        agent.token_budget or agent.time_budget. Returns (revise, critique, summary).
+        """
+        stage_agents = Runner._stage_agents(agent, agent.stage_dependencies or PIPELINE_DEPENDENCIES)
+        revised, critique = stage_results["revise"], stage_results["critique"]
+        spent = sum(result.tokens for result in stage_results.values())
+        last_tokens, last_seconds = spent, time.perf_counter() - started
+        rounds, stop_reason = 1, "max_rounds"
+        while rounds < agent.max_rounds:
+            if agent.token_budget is not None and spent + last_tokens > agent.token_budget:
+                stop_reason = "token_budget"
+                break
+            if agent.time_budget is not None and time.perf_counter() - started + last_seconds > agent.time_budget:
+                stop_reason = "time_budget"
+                break
+            rounds += 1
+            round_started = time.perf_counter()
+            Runner._notify(on_stage, f"round_{rounds}")
+            with span("stage.round", round=rounds):
+                next_critique = await Runner._run_stage(agent, "critique", stage_agents["critique"], revised.content, {}, on_stage)
+                spent += next_critique.tokens
+                if next_critique.error:
+                    stop_reason = "error"
+                    break
+                critique = next_critique
+                if not Runner._actionable(critique):
+                    stop_reason = "converged"
+                    break
+                context = {"critique": critique}
+                if "search" in stage_results:
+                    context["search"] = stage_results["search"]
+                next_revised = await Runner._run_stage(agent, "revise", stage_agents["revise"], revised.content, context, on_stage)
+                spent += next_revised.tokens
+            if next_revised.error:
+                stop_reason = "error"
+                break
+            last_tokens = next_critique.tokens + next_revised.tokens
+            last_seconds = time.perf_counter() - round_started
+            timings[f"round_{rounds}"] = {"start": round(round_started - started, 3), "seconds": round(last_seconds, 3)}
+            unchanged = " ".join(next_revised.content.split()) == " ".join(revised.content.split())
+            revised = next_revised
+            if unchanged:
+                stop_reason = "converged"
+                break
+        print(f"🔁 {agent.name}: {rounds} round(s), stopped on {stop_reason}, {spent} tokens")
+        return revised, critique, {"rounds": rounds, "stop_reason": stop_reason, "tokens": spent}
+    
+    @staticmethod
+    async def _run_with_tools(agent: Agent, input_data: str, on_stage: Optional[Callable[[str], None]] = None,
+                              checkpoints: Optional[StageCheckpoints] = None) -> RunResult:
         """Run an agent that orchestrates other agents as tools"""
         try:
             print(f"🔧 {agent.name} orchestrating {len(agent.tools)} tools")
+            started = time.perf_counter()
+            timings: Dict[str, Dict[str, float]] = {}
             
-            # Simulate the 5-step process
-            results = []
-            
-            # Step 1: Search (if search_agent available)
-            search_tool = next((tool for tool in agent.tools if "search" in tool["function"]["name"]), None)
-            if search_tool:
-                search_result = await Runner.run(search_tool["function"]["agent"], f"Research information for: {input_data}")
-                results.append(f"🔍 Search Results: {search_result.content[:200]}...")
-            
-            # Step 2: Extract (if extract_agent available)  
-            extract_tool = next((tool for tool in agent.tools if "extract" in tool["function"]["name"]), None)
-            if extract_tool:
-                extract_result = await Runner.run(extract_tool["function"]["agent"], input_data)
-                results.append(f"📋 Extracted Instructions: {extract_result.content[:200]}...")
+            stage_results = await Runner._run_stages(agent, input_data, on_stage, timings, started, checkpoints)
+            artifacts = {}
+            if "search" in stage_results and not agent.known_facts and not timings["search"].get("resumed"):
+                artifacts["search"] = stage_results["search"].content
             
-            # Step 3: Critique (if critique_agent available)
-            critique_tool = next((tool for tool in agent.tools if "critique" in tool["function"]["name"]), None)
-            if critique_tool:
-                critique_result = await Runner.run(critique_tool["function"]["agent"], input_data)
-                results.append(f"🔍 Critique: {critique_result.content[:200]}...")
-            
-            # Step 4: Revise (if revise_agent available)
-            revise_tool = next((tool for tool in agent.tools if "revise" in tool["function"]["name"]), None)
-            if revise_tool:
-                revision_context = f"Original: {input_data}\n\nPrevious analysis:\n" + "\n".join(results)
-                revise_result = await Runner.run(revise_tool["function"]["agent"], revision_context)
-                results.append(f"✏️ Revision: {revise_result.content}")
-                
-                # Return the revised prompt as the final output
-                print(f"✅ {agent.name} orchestration completed")
-                return RunResult(revise_result.content, agent.name)
+            # Revise consumes the other stages - its output is the final prompt
+            if "revise" in stage_results:
+                revise_result = stage_results["revise"]
+                if revise_result.error:
+                    timings["total"] = {"start": 0.0, "seconds": round(time.perf_counter() - started, 3)}
+                    print(f"❌ {agent.name} revise stage failed ({Runner._format_timings(timings)})")
+                    return RunResult(revise_result.content, agent.name, artifacts, timings, error=True)
+                critique_result = stage_results.get("critique")
+                if agent.max_rounds > 1 and not revise_result.skipped and "critique" in stage_results:
+                    revise_result, critique_result, refinement = await Runner._refine(agent, stage_results, timings, started, on_stage)
+                else:
+                    # No further rounds: critique had nothing to act on, or only one round was asked for
+                    refinement = {"rounds": 1, "stop_reason": "no_issues" if revise_result.skipped else "not_requested",
+                                  "tokens": sum(result.tokens for result in stage_results.values())}
+                if critique_result is not None and not critique_result.error:
+                    artifacts["critique"] = critique_result.content
+                timings["total"] = {"start": 0.0, "seconds": round(time.perf_counter() - started, 3)}
+                if revise_result.skipped:
+                    print(f"✅ {agent.name}: critique found nothing to act on, revise skipped ({Runner._format_timings(timings)})")
+                else:
+                    print(f"✅ {agent.name} orchestration completed ({Runner._format_timings(timings)})")
+                return RunResult(revise_result.content, agent.name, artifacts, timings, output=revise_result.output,
+                                 skipped=revise_result.skipped,
+                                 tokens=refinement["tokens"],
+                                 refinement=refinement)
             
             # If no revise tool, use the main agent to synthesize results
+            Runner._notify(on_stage, "synthesis")
+            synthesis_started = time.perf_counter()
             synthesis_prompt = f"""
             Original prompt: {input_data}
             
             Analysis results:
-            {chr(10).join(results)}
+            {Runner._handoff(stage_results)}
             
             Based on this analysis, provide an improved version of the original prompt.
             """
             
-            client = get_client()
-            response = client.responses.create(
-                model=agent.model,
-                input=f"{agent.instructions}\n\nUser: {synthesis_prompt}",
-                tools=[{"type": "web_search_preview"}],
-                reasoning={"effort": agent.reasoning_effort}
-            )
+            with span("stage.synthesis", depends_on=list(stage_results)):
+                response = await acreate_response(
+                    endpoint="agent",
+                    model=agent.model,
+                    input=f"{agent.instructions}\n\nUser: {synthesis_prompt}",
+                    tools=[{"type": "web_search_preview"}] if agent.web_search else [],
+                    reasoning={"effort": agent.reasoning_effort},
+                    **({"text": text_format(agent.output_type)} if agent.output_type else {})
+                )
             
             final_content = response.output_text
-            print(f"✅ {agent.name} orchestration completed")
+            output = None
+            if agent.output_type:
+                with span("parse.output", output_type=agent.output_type.__name__):
+                    output = parse_output(agent.output_type, final_content)
+                final_content = Runner._output_content(output)
+            timings["synthesis"] = {"start": round(synthesis_started - started, 3), "seconds": round(time.perf_counter() - synthesis_started, 3)}
+            timings["total"] = {"start": 0.0, "seconds": round(time.perf_counter() - started, 3)}
+            print(f"✅ {agent.name} orchestration completed ({Runner._format_timings(timings)})")
             
-            return RunResult(final_content, agent.name)
+            return RunResult(final_content, agent.name, artifacts, timings, output=output)
             
         except Exception as e:
             print(f"❌ Error in orchestration {agent.name}: {e}")
-            return RunResult(f"Error: {str(e)}", agent.name)
+            return RunResult(f"Error: {str(e)}", agent.name, error=True)
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Benchmark for section_parser.py against the regex extraction it replaced
+
+The corpus is checked in: every prompt in sample_prompts/ (deployed system
+prompts of real products, 0.2k-40k chars) wrapped in the generate_prompt.md
+output format, a few built-in responses covering the other marker spellings,
+and any generation responses recorded as cassettes (PROPT_CASSETTE_DIR, see
+providers.py). Both extractions run over it and their sections are compared:
+
+    python bench_section_parser.py -n 20
+    python bench_section_parser.py --samples "" --scale 20 --json
+
+The extraction results are not identical by design. A "longer" result means
+the old patterns stopped at the first blank line (or at a bold "**Label**:"
+inside the prompt) and the parser kept the rest of the section - for most real
+prompts the old final_prompt was only the header line. The script exits with 1
+if any result differs in another way, or if parsing a response as stream
+deltas gives different sections.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from providers import DEFAULT_CASSETTE_DIR, SYNTHETIC_SYSTEM_PROMPT, CassetteStore
+from section_parser import NO_PLANNING, SectionParser, parse_response
+
+PROMPT_BODY = (
+    "## Role and Objective\nYou are a research assistant for {industry} analysts.\n\n"
+    "## Instructions\n- Cite the filing date for every figure.\n- Say so when data is missing.\n\n"
+    "## Output Format\nReturn a short summary, then a table of key metrics.\n"
+)
+
+DEFAULT_SAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sample_prompts")
+SAMPLE_EXTENSIONS = (".txt", ".md")
+
+SAMPLE_RESPONSES = [
+    "**planning**: - [SEC EDGAR](https://www.sec.gov/edgar) — filing structure and dates\n"
+    "- [CFA Institute](https://www.cfainstitute.org) — analyst reporting conventions\n\n"
+    "**final_prompt**: # System Prompt - Equity Research Assistant\n\n" + PROMPT_BODY.format(industry="equity"),
+    "**planning**: - [FDA guidance](https://www.fda.gov/guidance) — labelling rules used for the safety section\n\n"
+    "**final_prompt**: # System Prompt\n" + PROMPT_BODY.format(industry="healthcare").replace("\n\n", "\n"),
+    "planning: Sources used were the NIST AI RMF (https://www.nist.gov/itl/ai-risk-management-framework).\n\n"
+    "final_prompt: System Prompt - Compliance Reviewer\n\n" + PROMPT_BODY.format(industry="compliance"),
+    "# System Prompt - Support Agent\n\n" + PROMPT_BODY.format(industry="support"),
+    "**planning**: - [Synthetic source](https://example.com/synthetic) — canned planning section used for "
+    "offline load testing; no web search was performed.\n\n**final_prompt**: " + SYNTHETIC_SYSTEM_PROMPT,
+]
+
+
+# The extraction functions main_flask.py used before section_parser.py (debug prints removed)
+
+def legacy_final_prompt(response_text: str) -> str:
+    response_str = str(response_text)
+    patterns = [
+        r'\*\*final_prompt\*\*:\s*(.*?)(?=\n\n|$|(?:\*\*[a-zA-Z_]+\*\*:))',
+        r'final_prompt:\s*(.*?)(?=\n\n|$|(?:\*\*[a-zA-Z_]+\*\*:))',
+        r'(# System Prompt.*?)(?=\n\n(?:\*\*|planning|Context|Assumptions)|$)',
+    ]
+    for pattern in patterns:
+        match = re.search(pattern, response_str, re.DOTALL | re.IGNORECASE)
+        if match:
+            extracted = match.group(1).strip()
+            if not extracted.startswith('# System Prompt'):
+                if extracted.startswith('System Prompt'):
+                    extracted = '# ' + extracted
+                elif 'System Prompt' in extracted:
+                    system_prompt_match = re.search(r'(# System Prompt.*)', extracted, re.DOTALL)
+                    if system_prompt_match:
+                        extracted = system_prompt_match.group(1)
+            return extracted
+    return legacy_clean(response_str)
+
+
+def legacy_clean(response_text: str) -> str:
+    skip_sections = ['planning', 'context', 'assumptions', 'planned vs', 'sources used']
+    return '\n'.join(line for line in response_text.split('\n')
+                     if not any(skip in line.lower().strip() for skip in skip_sections)).strip()
+
+
+def legacy_planning(response_text: str) -> str:
+    patterns = [
+        r'\*\*planning\*\*:\s*(.*?)(?=\n\n|$|(?:\*\*[a-zA-Z_]+\*\*:))',
+        r'planning:\s*(.*?)(?=\n\n|$|(?:\*\*[a-zA-Z_]+\*\*:))',
+        r'planning — Sources used.*?\n(.*?)(?=\n\n|$|(?:final_prompt|Context))',
+    ]
+    for pattern in patterns:
+        planning_match = re.search(pattern, response_text, re.DOTALL | re.IGNORECASE)
+        if planning_match:
+            planning_content = planning_match.group(1).strip()
+            if len(planning_content) > 20:
+                return planning_content
+    return NO_PLANNING
+
+
+def legacy_parse(text: str) -> Dict[str, str]:
+    return {"final_prompt": legacy_final_prompt(text), "planning": legacy_planning(text)}
+
+
+def new_parse(text: str) -> Dict[str, str]:
+    parsed = parse_response(text)
+    return {"final_prompt": parsed.final_prompt, "planning": parsed.planning or NO_PLANNING}
+
+
+def sample_response(name: str, prompt: str) -> str:
+    """A sample_prompts/ prompt as the final_prompt of a generate_prompt.md response"""
+    return (f"**planning**: - [{name}](https://example.com/{name.replace(' ', '-').lower()}) — "
+            f"structure and tone of a deployed system prompt\n\n"
+            f"**final_prompt**: # System Prompt - {name}\n\n{prompt.strip()}\n")
+
+
+def load_samples(samples_dir: str) -> List[str]:
+    responses = []
+    for root, _, files in sorted(os.walk(samples_dir)):
+        for file in sorted(files):
+            if file.endswith(SAMPLE_EXTENSIONS):
+                with open(os.path.join(root, file), encoding="utf-8") as f:
+                    responses.append(sample_response(os.path.basename(root), f.read()))
+    return responses
+
+
+def load_corpus(cassette_dir: str, samples_dir: str, scale: int) -> Tuple[List[str], int]:
+    """Recorded generation responses (those with a section marker), sample_prompts/ responses and the built-in samples"""
+    recorded = []
+    for cassette in CassetteStore(cassette_dir).iter_cassettes():
+        text = (cassette.get("response") or {}).get("output_text") or ""
+        if "final_prompt" in text.lower() or "# System Prompt" in text:
+            recorded.append(text)
+    corpus = recorded + (load_samples(samples_dir) if samples_dir else []) + SAMPLE_RESPONSES
+    if scale > 1:
+        # Longer prompts: the same body repeated, as in prompts with many sections
+        corpus = [text + "\n" + PROMPT_BODY.format(industry="scaled") * (scale - 1) for text in corpus]
+    return corpus, len(recorded)
+
+
+def compare(old: str, new: str) -> str:
+    if old == new:
+        return "match"
+    if new.startswith(old):
+        return "longer"
+    return "differs"
+
+
+def stream_sections(text: str, chunk: int) -> Dict[Any, str]:
+    parser = SectionParser()
+    for index in range(0, len(text), chunk):
+        parser.feed(text[index:index + chunk])
+    parser.finish()
+    return parser.result().sections
+
+
+def time_per_response(parse: Callable[[str], Any], corpus: List[str], iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for text in corpus:
+            parse(text)
+    return (time.perf_counter() - started) / (iterations * len(corpus))
+
+
+def run(cassette_dir: str, samples_dir: str, iterations: int, scale: int, chunk: int) -> Dict[str, Any]:
+    corpus, recorded = load_corpus(cassette_dir, samples_dir, scale)
+    results: Dict[str, Dict[str, int]] = {"final_prompt": {}, "planning": {}}
+    differences = []
+    stream_mismatches = 0
+    for index, text in enumerate(corpus):
+        old, new = legacy_parse(text), new_parse(text)
+        for field, counts in results.items():
+            outcome = compare(old[field], new[field])
+            counts[outcome] = counts.get(outcome, 0) + 1
+            if outcome == "differs":
+                differences.append({"response": index, "field": field, "old": old[field][:120], "new": new[field][:120]})
+        if stream_sections(text, chunk) != parse_response(text).sections:
+            stream_mismatches += 1
+
+    legacy_s = time_per_response(legacy_parse, corpus, iterations)
+    parser_s = time_per_response(new_parse, corpus, iterations)
+    return {
+        "responses": len(corpus),
+        "recorded": recorded,
+        "mean_chars": round(sum(len(text) for text in corpus) / len(corpus)),
+        "max_chars": max(len(text) for text in corpus),
+        "iterations": iterations,
+        "legacy_us": round(legacy_s * 1e6, 1),
+        "parser_us": round(parser_s * 1e6, 1),
+        "speedup": round(legacy_s / parser_s, 2) if parser_s else 0.0,
+        "results": results,
+        "differences": differences,
+        "stream_mismatches": stream_mismatches,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the single-pass response section parser")
+    parser.add_argument("--cassettes", default=os.getenv("PROPT_CASSETTE_DIR", DEFAULT_CASSETTE_DIR))
+    parser.add_argument("--samples", default=DEFAULT_SAMPLES_DIR, help="prompt files to wrap as responses (\"\" to skip)")
+    parser.add_argument("-n", "--iterations", type=int, default=100)
+    parser.add_argument("--scale", type=int, default=1, help="repeat the prompt body to make longer responses")
+    parser.add_argument("--chunk", type=int, default=7, help="delta size for the streaming check")
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = parser.parse_args()
+
+    summary = run(args.cassettes, args.samples, max(args.iterations, 1), max(args.scale, 1), max(args.chunk, 1))
+    failed = bool(summary["differences"] or summary["stream_mismatches"])
+
+    if args.json:
+        print(json.dumps(summary, indent=2, ensure_ascii=False))
+        return 1 if failed else 0
+    print(f"🏁 {summary['responses']} responses ({summary['recorded']} recorded), {summary['mean_chars']} chars on average, "
+          f"{summary['max_chars']} at most")
+    print(f"   regex cascade {summary['legacy_us']}µs, section parser {summary['parser_us']}µs per response "
+          f"({summary['speedup']}x)")
+    for field, counts in summary["results"].items():
+        print(f"   {field}: {counts}")
+    for difference in summary["differences"]:
+        print(f"   ❌ response {difference['response']} {difference['field']}: {difference['old']!r} != {difference['new']!r}")
+    print(f"   streaming check: {summary['stream_mismatches']} mismatch(es) at {args.chunk}-char deltas")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,42 @@
+"""
+Stage checkpoints for resumable agent pipelines
+
+Each completed stage output of a /api/process-prompt run is stored against the
+run ID and a fingerprint of the run's inputs. A retry with the same run ID runs
+only the stages that have no checkpoint yet, so a failed revise doesn't repeat
+the search, extract and critique calls. Checkpoints expire after
+PROPT_CHECKPOINT_TTL seconds.
+"""
+import uuid
+from typing import Any, Optional
+
+from response_cache import ResponseCache, get_response_cache, make_cache_key
+
+DEFAULT_CHECKPOINT_TTL = 60 * 60   # long enough for client retries, short enough to bound storage
+
+
+def get_checkpoint_cache() -> ResponseCache:
+    """The checkpoint store (PROPT_CHECKPOINT_TTL / _MAX_MEMORY / _MAX_DISK / _DISK)"""
+    return get_response_cache("pipeline_checkpoints", "PROPT_CHECKPOINT", DEFAULT_CHECKPOINT_TTL)
+
+
+def new_run_id() -> str:
+    return uuid.uuid4().hex
+
+
+class PipelineCheckpoints:
+    """Stage outputs of one pipeline run; inputs are part of the key so a reused run ID can't mix runs"""
+
+    def __init__(self, run_id: str, *inputs: Any):
+        self.run_id = run_id
+        self._fingerprint = make_cache_key("pipeline_run", *inputs)
+        self._cache = get_checkpoint_cache()
+
+    def _key(self, stage: str) -> str:
+        return make_cache_key("pipeline_checkpoint", self.run_id, self._fingerprint, stage)
+
+    def get(self, stage: str) -> Optional[str]:
+        return self._cache.get(self._key(stage))
+
+    def put(self, stage: str, content: str) -> None:
+        self._cache.set(self._key(stage), content, {"run_id": self.run_id, "stage": stage})
@@ -0,0 +1,155 @@
+"""
+Per-model circuit breakers shared by every LLM call site
+
+After `failure_threshold` consecutive upstream failures a model's breaker opens
+and calls fail immediately with CircuitOpenError instead of waiting for the
+provider to time out. Once `recovery_timeout` has passed, a limited number of
+half-open probe calls are let through: a success closes the breaker, a failure
+re-opens it.
+"""
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from resilience import is_retryable
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RECOVERY_TIMEOUT = 30.0   # seconds before the first half-open probe
+DEFAULT_HALF_OPEN_PROBES = 1
+
+
+class CircuitOpenError(Exception):
+    """The model's breaker is open; retry after `retry_after` seconds"""
+
+    def __init__(self, model: str, retry_after: float):
+        self.model = model
+        self.retry_after = max(int(retry_after + 0.999), 1)
+        super().__init__(f"{model} is temporarily unavailable (circuit open), retry in {self.retry_after}s")
+
+
+def is_upstream_failure(error: BaseException) -> bool:
+    """Errors that say something about provider health (not bad requests or our own rejections)"""
+    return not isinstance(error, CircuitOpenError) and is_retryable(error)
+
+
+class CircuitBreaker:
+    def __init__(self, name: str,
+                 failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 recovery_timeout: float = DEFAULT_RECOVERY_TIMEOUT,
+                 half_open_probes: int = DEFAULT_HALF_OPEN_PROBES):
+        self.name = name
+        self.failure_threshold = max(failure_threshold, 1)
+        self.recovery_timeout = recovery_timeout
+        self.half_open_probes = max(half_open_probes, 1)
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._stats = {"successes": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    def _open(self) -> None:
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._probes_in_flight = 0
+        self._stats["opened"] += 1
+        print(f"🔌 Circuit opened for {self.name} after {self._consecutive_failures} consecutive failures")
+
+    def retry_after(self) -> float:
+        """Seconds until the breaker will accept calls again (0 when it accepts them now)"""
+        with self._lock:
+            if self._state == CLOSED:
+                return 0.0
+            if self._state == HALF_OPEN:
+                return 0.0 if self._probes_in_flight < self.half_open_probes else self.recovery_timeout
+            return max(self._opened_at + self.recovery_timeout - time.monotonic(), 0.0)
+
+    def before_call(self) -> None:
+        """Admit a call or raise CircuitOpenError"""
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+                self._state = HALF_OPEN
+                self._probes_in_flight = 0
+                print(f"🔌 Circuit half-open for {self.name}, probing")
+            if self._state == CLOSED:
+                return
+            if self._state == HALF_OPEN and self._probes_in_flight < self.half_open_probes:
+                self._probes_in_flight += 1
+                return
+            self._stats["rejected"] += 1
+            if self._state == OPEN:
+                retry_after = self._opened_at + self.recovery_timeout - time.monotonic()
+            else:
+                retry_after = self.recovery_timeout
+        raise CircuitOpenError(self.name, retry_after)
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._stats["successes"] += 1
+            self._consecutive_failures = 0
+            if self._state != CLOSED:
+                self._state = CLOSED
+                self._probes_in_flight = 0
+                print(f"🔌 Circuit closed for {self.name}")
+
+    def record_failure(self, error: BaseException) -> None:
+        if not is_upstream_failure(error):
+            # Not a health signal, but a half-open probe slot still has to be released
+            with self._lock:
+                if self._state == HALF_OPEN:
+                    self._probes_in_flight = max(self._probes_in_flight - 1, 0)
+            return
+        with self._lock:
+            self._stats["failures"] += 1
+            self._consecutive_failures += 1
+            if self._state == HALF_OPEN or (self._state == CLOSED and self._consecutive_failures >= self.failure_threshold):
+                self._open()
+
+    def stats(self) -> Dict[str, Any]:
+        retry_after = self.retry_after()
+        with self._lock:
+            return {
+                **self._stats,
+                "state": self._state,
+                "consecutive_failures": self._consecutive_failures,
+                "retry_after": round(retry_after, 1),
+            }
+
+
+# Global breakers, one per model
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(model: str) -> CircuitBreaker:
+    """Get or create the process-wide breaker for a model (configured from PROPT_CIRCUIT_* env vars)"""
+    with _breakers_lock:
+        breaker = _breakers.get(model)
+        if breaker is None:
+            breaker = _breakers[model] = CircuitBreaker(
+                model,
+                failure_threshold=int(os.getenv("PROPT_CIRCUIT_FAILURES", DEFAULT_FAILURE_THRESHOLD)),
+                recovery_timeout=float(os.getenv("PROPT_CIRCUIT_RECOVERY", DEFAULT_RECOVERY_TIMEOUT)),
+                half_open_probes=int(os.getenv("PROPT_CIRCUIT_PROBES", DEFAULT_HALF_OPEN_PROBES)),
+            )
+        return breaker
+
+
+def get_all_circuit_stats() -> Dict[str, Dict[str, Any]]:
+    with _breakers_lock:
+        breakers = dict(_breakers)
+    return {name: breaker.stats() for name, breaker in breakers.items()}
+
+
+def check_circuit(model: Optional[str]) -> None:
+    """Raise CircuitOpenError if the model's breaker is rejecting calls (doesn't take a probe slot)"""
+    if not model:
+        return
+    retry_after = get_circuit_breaker(model).retry_after()
+    if retry_after > 0:
+        raise CircuitOpenError(model, retry_after)
@@ -0,0 +1,51 @@
+"""
+Domain research shared across requests
+
+Web search is the slowest step of both the generation and the prompt-editing
+pipelines, and most traffic asks about the same few dozen industries. Research
+results are stored per normalized (industry, usecase, region) and, while they are
+fresh, injected into later requests in place of the web-search stage or tool.
+"""
+from typing import Optional
+
+from response_cache import ResponseCache, get_response_cache, make_cache_key, normalize_text
+
+DEFAULT_FACTS_TTL = 7 * 24 * 60 * 60   # domain standards change slowly, news does not - keep it to a week
+MIN_FACTS_CHARS = 80                   # shorter "research" is an error message or a placeholder
+
+FACTS_HEADER = (
+    "# DOMAIN RESEARCH (cached)\n"
+    "Web search is not available for this request. The following facts were gathered by an "
+    "earlier web search for the same industry, use case and region - treat them as the search "
+    "results and cite their sources where the instructions ask for sources.\n\n"
+)
+
+
+def get_facts_cache() -> ResponseCache:
+    """The domain facts store (PROPT_DOMAIN_FACTS_TTL / _MAX_MEMORY / _MAX_DISK / _DISK)"""
+    return get_response_cache("domain_facts", "PROPT_DOMAIN_FACTS", DEFAULT_FACTS_TTL)
+
+
+def domain_key(industry: str, usecase: str, region: str = "global") -> str:
+    return make_cache_key("domain_facts", *(normalize_text(value or "").lower() for value in (industry, usecase, region)))
+
+
+def get_domain_facts(industry: str, usecase: str, region: str = "global") -> Optional[str]:
+    """Fresh research for the domain, or None when it has to be searched again"""
+    return get_facts_cache().get(domain_key(industry, usecase, region))
+
+
+def store_domain_facts(industry: str, usecase: str, region: str, facts: str, source: str) -> bool:
+    """Keep research for later requests; returns False for empty or failed results"""
+    facts = (facts or "").strip()
+    if len(facts) < MIN_FACTS_CHARS or facts.startswith("Error:"):
+        return False
+    get_facts_cache().set(domain_key(industry, usecase, region), facts,
+                          {"industry": industry, "usecase": usecase, "region": region, "source": source})
+    print(f"📚 Stored domain research for {industry} - {usecase} ({region}) from {source}")
+    return True
+
+
+def format_facts(facts: str) -> str:
+    """The block injected into a prompt in place of web search"""
+    return FACTS_HEADER + facts.strip() + "\n"
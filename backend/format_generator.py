@@ -2,14 +2,21 @@
 Auto-generate appropriate JSON input/output formats based on industry and use case
 """
 import json
-import os
 from typing import Dict, Any, Tuple
-from openai import OpenAI
+from pydantic import BaseModel, Field
+from circuit_breaker import get_circuit_breaker
+from llm_client import create_response
+from response_cache import make_cache_key
+from singleflight import get_singleflight
+from structured_output import parse_output, text_format
 
+FORMAT_MODEL = "gpt-5-mini-2025-08-07"
 
-def get_format_generation_client():
-    """Get OpenAI client for format generation"""
-    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+class GeneratedFormats(BaseModel):
+    """Structured output of the format generation call"""
+    input_format: Dict[str, Any] = Field(description="Example JSON document for the input data")
+    output_format: Dict[str, Any] = Field(description="Example JSON document for the output data")
 
 
 def generate_json_formats(industry: str, usecase: str, tasks: list = None, reasoning_effort: str = "medium") -> Tuple[Dict[str, Any], Dict[str, Any]]:
@@ -25,10 +32,21 @@ def generate_json_formats(industry: str, usecase: str, tasks: list = None, reaso
     Returns:
         Tuple of (input_format_dict, output_format_dict)
     """
-    
+    # Concurrent identical requests share one upstream call
+    flight_key = make_cache_key("generate_formats", industry.lower(), usecase.lower(), tasks or [], reasoning_effort)
+    formats, _ = get_singleflight("generate_formats").do(
+        flight_key, _generate_json_formats, industry, usecase, tasks, reasoning_effort
+    )
+    return formats
+
+
+def _generate_json_formats(industry: str, usecase: str, tasks: list = None, reasoning_effort: str = "medium") -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Single upstream format-generation call (see generate_json_formats)"""
+    if get_circuit_breaker(FORMAT_MODEL).retry_after() > 0:
+        # Provider is unhealthy - don't wait for a call that's going to fail
+        print(f"🔌 Circuit open for {FORMAT_MODEL}, using fallback formats for {industry} - {usecase}")
+        return get_fallback_formats(industry, usecase)
     try:
-        client = get_format_generation_client()
-        
         # Create a detailed prompt for format generation
         tasks_text = ""
         if tasks and len(tasks) > 0:
@@ -57,41 +75,22 @@ def generate_json_formats(industry: str, usecase: str, tasks: list = None, reaso
         - Legal: Include case references, legal citations, compliance requirements
         - Education: Include learning objectives, assessment criteria, student data
         
-        Return ONLY a JSON object with exactly this structure:
-        {{
-            "input_format": {{
-                // Complete JSON schema for input data
-            }},
-            "output_format": {{
-                // Complete JSON schema for output data  
-            }}
-        }}
+        Put the complete input format in "input_format" and the complete output format in "output_format".
         
         Make the formats comprehensive but practical for {industry} professionals working on {usecase}.
         """
         
-        response = client.responses.create(
-            model="gpt-5-mini-2025-08-07",
+        # The formats are free-form documents, so the schema can't be strict
+        response = create_response(
+            endpoint="generate_formats",
+            model=FORMAT_MODEL,
             input=format_generation_prompt,
-            reasoning={"effort": reasoning_effort}
+            reasoning={"effort": reasoning_effort},
+            text=text_format(GeneratedFormats, strict=False)
         )
         
-        # Parse the response to extract JSON formats
-        response_text = response.output_text.strip()
-        
-        # Find JSON in the response
-        import re
-        json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-        if json_match:
-            formats_data = json.loads(json_match.group())
-            
-            input_format = formats_data.get('input_format', {})
-            output_format = formats_data.get('output_format', {})
-            
-            return input_format, output_format
-        else:
-            # Fallback to basic formats if parsing fails
-            return get_fallback_formats(industry, usecase)
+        formats = parse_output(GeneratedFormats, response.output_text)
+        return formats.input_format, formats.output_format
             
     except Exception as e:
         print(f"⚠️ Error generating JSON formats: {e}")
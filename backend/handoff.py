@@ -0,0 +1,73 @@
+"""
+Compact stage-to-stage hand-off for the agent pipeline
+
+Later stages (revise, synthesis) used to get the first 200 characters of each
+earlier stage's output, which cut critiques off mid-issue. Each stage output is
+now rendered from its parsed form - one line per extracted instruction, one per
+critique issue, a bullet digest of the search results - and kept within a token
+budget, least important detail first: explanations go before suggestions do.
+"""
+import re
+from typing import Any, List, Optional
+
+from token_budget import estimate_tokens, trim_text
+
+MAX_BULLET_WORDS = 40
+
+_BULLET_PREFIX = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s+")
+_MARKDOWN_NOISE = re.compile(r"[*_`#>]+")
+
+
+def _take(lines: List[str], budget: int) -> List[str]:
+    """Leading lines that fit in the budget, with a note on how many were left out"""
+    kept, used = [], 0
+    for line in lines:
+        cost = estimate_tokens(line) + 1
+        if used + cost > budget:
+            kept.append(f"(+{len(lines) - len(kept)} more omitted)")
+            break
+        kept.append(line)
+        used += cost
+    return kept
+
+
+def _words(text: str, limit: int = MAX_BULLET_WORDS) -> str:
+    words = str(text).split()
+    return " ".join(words[:limit]) + (" …" if len(words) > limit else "")
+
+
+def bullet_digest(text: str, budget: int) -> List[str]:
+    """Distinct bullets of a free-text result (one per line or paragraph, shortened)"""
+    bullets, seen = [], set()
+    for line in text.splitlines():
+        line = _MARKDOWN_NOISE.sub("", _BULLET_PREFIX.sub("", line)).strip()
+        key = line.lower()
+        if len(line) < 12 or key in seen:
+            continue
+        seen.add(key)
+        bullets.append(f"- {_words(line)}")
+    return _take(bullets, budget)
+
+
+def instruction_lines(output: Any, budget: int) -> List[str]:
+    return _take([f"{i}. {_words(item.instruction_title)}" for i, item in enumerate(output.instructions, 1)], budget)
+
+
+def issue_lines(output: Any, budget: int) -> List[str]:
+    """Issues with snippet, suggestion and - if they all fit - explanation"""
+    full = [f'- {item.issue}: "{_words(item.snippet, 25)}" → {_words(item.suggestion)} ({_words(item.explanation, 25)})'
+            for item in output.issues]
+    if sum(estimate_tokens(line) + 1 for line in full) <= budget:
+        return full
+    return _take([f'- {item.issue}: "{_words(item.snippet, 25)}" → {_words(item.suggestion)}' for item in output.issues], budget)
+
+
+def handoff_lines(content: str, output: Optional[Any], budget: int) -> List[str]:
+    """A stage result as compact lines for the stages that consume it"""
+    if output is not None and hasattr(output, "issues"):
+        return issue_lines(output, budget) if output.issues else ["- No issues found."]
+    if output is not None and hasattr(output, "instructions"):
+        return instruction_lines(output, budget)
+    if output is not None and hasattr(output, "value"):
+        return [trim_text(output.value, budget)]
+    return bullet_digest(content, budget) or [trim_text(content, budget)]
@@ -0,0 +1,98 @@
+"""
+Instruction blocks and the per-block critique cache
+
+Users refine the same prompt over and over, usually changing a paragraph at a
+time. The prompt is split into instruction blocks (paragraphs, with a heading
+kept together with its body) and each critique issue is filed under the block
+its snippet comes from. On the next run only blocks without cached issues go
+to the critique agent; issues whose snippet can't be found in any block are
+returned for that run but not cached. Entries are keyed by the critique agent's
+instructions, model and effort, so a template change starts a fresh cache.
+"""
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from response_cache import ResponseCache, get_response_cache, make_cache_key, normalize_text
+
+DEFAULT_CRITIQUE_TTL = 24 * 60 * 60
+MIN_BLOCK_CHARS = 40   # shorter paragraphs (labels, separators) are merged into the previous block
+
+CHANGED_BLOCKS_HEADER = (
+    "The following instruction blocks were added or changed in a longer prompt. "
+    "Critique only these blocks and quote snippets exactly from them.\n\n"
+)
+
+_SNIPPET_TRIM = re.compile(r"^[\s\"'`.…]+|[\s\"'`.…]+$")
+
+
+def get_critique_cache() -> ResponseCache:
+    """The block critique store (PROPT_CRITIQUE_CACHE_TTL / _MAX_MEMORY / _MAX_DISK / _DISK)"""
+    return get_response_cache("critique_blocks", "PROPT_CRITIQUE_CACHE", DEFAULT_CRITIQUE_TTL)
+
+
+def split_blocks(prompt: str) -> List[str]:
+    """Split a prompt into instruction blocks at blank lines outside code fences"""
+    blocks: List[str] = []
+    current: List[str] = []
+    in_fence = False
+    for line in prompt.splitlines():
+        if line.lstrip().startswith("```"):
+            in_fence = not in_fence
+        if not line.strip() and not in_fence:
+            if current:
+                blocks.append("\n".join(current))
+                current = []
+            continue
+        current.append(line)
+    if current:
+        blocks.append("\n".join(current))
+
+    merged: List[str] = []
+    for block in blocks:
+        heading_only = merged and "\n" not in merged[-1] and merged[-1].lstrip().startswith("#")
+        if merged and (heading_only or len(block) < MIN_BLOCK_CHARS):
+            merged[-1] = f"{merged[-1]}\n\n{block}"
+        else:
+            merged.append(block)
+    return merged
+
+
+def _match_text(text: str) -> str:
+    return normalize_text(text).lower()
+
+
+def assign_issues(blocks: List[str], issues: List[Dict[str, Any]]) -> Tuple[List[List[Dict[str, Any]]], List[Dict[str, Any]]]:
+    """File each issue under the block containing its snippet; returns (per-block issues, unmatched)"""
+    texts = [_match_text(block) for block in blocks]
+    assigned: List[List[Dict[str, Any]]] = [[] for _ in blocks]
+    unmatched = []
+    for issue in issues:
+        snippet = _match_text(_SNIPPET_TRIM.sub("", str(issue.get("snippet", ""))))
+        index = next((i for i, text in enumerate(texts) if snippet and snippet in text), None)
+        if index is None and len(snippet) > 40:
+            # Long excerpts are sometimes shortened by the model - match on their start
+            index = next((i for i, text in enumerate(texts) if snippet[:40] in text), None)
+        if index is None:
+            unmatched.append(issue)
+        else:
+            assigned[index].append(issue)
+    return assigned, unmatched
+
+
+class CritiqueBlockCache:
+    """Critique issues per instruction block for one critique agent configuration"""
+
+    def __init__(self, instructions: str, model: str, reasoning_effort: str):
+        self._scope = make_cache_key("critique_scope", instructions, model, reasoning_effort)
+        self._cache = get_critique_cache()
+
+    def _key(self, block: str) -> str:
+        return make_cache_key("critique_block", self._scope, block)
+
+    def get(self, block: str) -> Optional[List[Dict[str, Any]]]:
+        cached = self._cache.get(self._key(block))
+        return json.loads(cached) if cached is not None else None
+
+    def put(self, block: str, issues: List[Dict[str, Any]]) -> None:
+        self._cache.set(self._key(block), json.dumps(issues, ensure_ascii=False), {"issues": len(issues)})
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Dedicated worker process for /api/jobs
+
+Runs queued generations and refinements without serving HTTP, so request intake
+and LLM execution can be scaled separately:
+
+    PROPT_JOB_WORKERS=0 gunicorn main_flask:app      # web processes only queue jobs
+    python job_worker.py --workers 4                  # workers execute them
+
+Both sides must use the same PROPT_JOBS_DB file.
+"""
+import argparse
+import os
+import sys
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run Propt background job workers")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("PROPT_JOB_WORKERS", 2)))
+    args = parser.parse_args()
+    if args.workers <= 0:
+        parser.error("--workers must be at least 1")
+
+    os.environ["PROPT_JOB_WORKERS"] = str(args.workers)
+    # Importing the app registers the job handlers and starts the workers
+    import main_flask
+    if main_flask.job_queue is None:
+        print("❌ Job queue is not available, check PROPT_JOBS_DB")
+        return 1
+
+    try:
+        while True:
+            time.sleep(60)
+            print(f"👷 {main_flask.job_queue.stats()}")
+    except KeyboardInterrupt:
+        main_flask.job_queue.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,325 @@
+"""
+Persistent background jobs for long generations
+
+Jobs live in a SQLite database so they survive restarts and can be executed by
+worker threads in this process or in a separate worker process pointed at the
+same file. Workers claim the oldest queued job atomically, report the pipeline
+stage as it progresses and store the result. A running job whose worker stops
+sending heartbeats (crash, restart) is put back in the queue. A claim is the
+(worker, attempt) pair; updates made under an older claim of a requeued job
+are ignored, so a slow worker can't overwrite its successor's result.
+"""
+import contextlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(__file__), "jobs", "jobs.db")
+DEFAULT_WORKERS = 2
+DEFAULT_POLL_INTERVAL = 1.0      # seconds between queue polls when idle
+DEFAULT_HEARTBEAT_INTERVAL = 10.0
+DEFAULT_STALE_AFTER = 60.0       # a running job without heartbeats for this long is requeued
+DEFAULT_MAX_ATTEMPTS = 3
+
+# A handler gets the job params and a set_stage(stage) callback and returns a JSON-serializable result
+JobHandler = Callable[[Dict[str, Any], Callable[[str], None]], Any]
+
+
+class JobStore:
+    """SQLite-backed job table (one connection per operation, safe across threads and processes)"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    stage TEXT,
+                    params TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    worker TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    heartbeat_at REAL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @contextlib.contextmanager
+    def _connection(self):
+        conn = self._connect()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def create(self, kind: str, params: Dict[str, Any]) -> str:
+        job_id = uuid.uuid4().hex
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, params, created_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, kind, QUEUED, json.dumps(params), time.time()),
+            )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connection() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            job = dict(row)
+            if job["status"] == QUEUED:
+                ahead = conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = ? AND created_at < ?", (QUEUED, job["created_at"])
+                ).fetchone()[0]
+                job["queue_position"] = ahead + 1
+            else:
+                job["queue_position"] = None
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def claim(self, worker: str) -> Optional[Dict[str, Any]]:
+        """Atomically move the oldest queued job to running and return it"""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            now = time.time()
+            conn.execute(
+                "UPDATE jobs SET status = ?, stage = ?, worker = ?, started_at = ?, heartbeat_at = ?, attempts = attempts + 1 WHERE id = ?",
+                (RUNNING, "starting", worker, now, now, row["id"]),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return self.get(row["id"])
+
+    def set_stage(self, job_id: str, stage: str, worker: str, attempt: int) -> None:
+        with self._connection() as conn:
+            conn.execute(
+                "UPDATE jobs SET stage = ?, heartbeat_at = ? WHERE id = ? AND status = ? AND worker = ? AND attempts = ?",
+                (stage, time.time(), job_id, RUNNING, worker, attempt),
+            )
+
+    def heartbeat(self, claims: List[Tuple[str, int]], worker: str) -> None:
+        """Refresh the (job id, attempt) claims this worker still holds"""
+        if not claims:
+            return
+        with self._connection() as conn:
+            conn.executemany(
+                "UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND status = ? AND worker = ? AND attempts = ?",
+                [(time.time(), job_id, RUNNING, worker, attempt) for job_id, attempt in claims],
+            )
+
+    def finish(self, job_id: str, worker: str, attempt: int, result: Any = None, error: Optional[str] = None) -> bool:
+        """Store the outcome of a claim; False if the job was requeued or claimed again since"""
+        with self._connection() as conn:
+            return conn.execute(
+                "UPDATE jobs SET status = ?, stage = ?, result = ?, error = ?, finished_at = ? "
+                "WHERE id = ? AND status = ? AND worker = ? AND attempts = ?",
+                (FAILED if error else SUCCEEDED, None, None if error else json.dumps(result), error, time.time(),
+                 job_id, RUNNING, worker, attempt),
+            ).rowcount == 1
+
+    def requeue_stale(self, stale_after: float, max_attempts: int) -> int:
+        """Requeue running jobs whose worker went silent; fail those out of attempts"""
+        cutoff = time.time() - stale_after
+        with self._connection() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE status = ? AND heartbeat_at < ? AND attempts >= ?",
+                (FAILED, "Job was interrupted too many times", time.time(), RUNNING, cutoff, max_attempts),
+            )
+            return conn.execute(
+                "UPDATE jobs SET status = ?, stage = NULL, worker = NULL WHERE status = ? AND heartbeat_at < ?",
+                (QUEUED, RUNNING, cutoff),
+            ).rowcount
+
+    def counts(self) -> Dict[str, int]:
+        with self._connection() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = {QUEUED: 0, RUNNING: 0, SUCCEEDED: 0, FAILED: 0}
+        counts.update({status: count for status, count in rows})
+        return counts
+
+    def oldest_queued_age(self) -> Optional[float]:
+        with self._connection() as conn:
+            row = conn.execute("SELECT MIN(created_at) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()
+        return time.time() - row[0] if row and row[0] else None
+
+
+class JobQueue:
+    """Worker threads that execute jobs from a JobStore"""
+
+    def __init__(self, store: JobStore, workers: int = DEFAULT_WORKERS,
+                 poll_interval: float = DEFAULT_POLL_INTERVAL,
+                 stale_after: float = DEFAULT_STALE_AFTER,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self.store = store
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+        self._handlers: Dict[str, JobHandler] = {}
+        self._running: Dict[str, int] = {}   # job id -> attempt of this worker's claim
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def register(self, kind: str, handler: JobHandler) -> None:
+        self._handlers[kind] = handler
+
+    @property
+    def kinds(self) -> List[str]:
+        return sorted(self._handlers)
+
+    def submit(self, kind: str, params: Dict[str, Any]) -> str:
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job type: {kind}")
+        job_id = self.store.create(kind, params)
+        self._wakeup.set()
+        return job_id
+
+    def start(self) -> None:
+        """Start the worker and heartbeat threads (no-op if already started or workers == 0)"""
+        if self._threads or self.workers <= 0:
+            return
+        requeued = self.store.requeue_stale(self.stale_after, self.max_attempts)
+        if requeued:
+            print(f"♻️ Requeued {requeued} interrupted job(s)")
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        heartbeat = threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True)
+        heartbeat.start()
+        self._threads.append(heartbeat)
+        print(f"👷 Started {self.workers} job worker(s) on {self.store.db_path}")
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wakeup.set()
+
+    def _heartbeat(self) -> None:
+        interval = min(DEFAULT_HEARTBEAT_INTERVAL, self.stale_after / 3)
+        while not self._stop.wait(interval):
+            with self._lock:
+                running = list(self._running.items())
+            try:
+                self.store.heartbeat(running, self.worker_id)
+                self.store.requeue_stale(self.stale_after, self.max_attempts)
+            except sqlite3.Error as e:
+                print(f"⚠️ Job heartbeat failed: {e}")
+
+    def _work(self) -> None:
+        while not self._stop.is_set():
+            try:
+                job = self.store.claim(self.worker_id)
+            except sqlite3.Error as e:
+                print(f"⚠️ Could not claim job: {e}")
+                job = None
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            self._execute(job)
+
+    def _execute(self, job: Dict[str, Any]) -> None:
+        job_id, attempt = job["id"], job["attempts"]
+        with self._lock:
+            self._running[job_id] = attempt
+        print(f"👷 Running job {job_id} ({job['kind']}, attempt {attempt})")
+        try:
+            handler = self._handlers.get(job["kind"])
+            if handler is None:
+                raise ValueError(f"No handler registered for job type {job['kind']}")
+            result = handler(job["params"], lambda stage: self.store.set_stage(job_id, stage, self.worker_id, attempt))
+            stored = self.store.finish(job_id, self.worker_id, attempt, result=result)
+            print(f"✅ Job {job_id} finished")
+        except Exception as e:
+            print(f"❌ Job {job_id} failed: {e}")
+            stored = self.store.finish(job_id, self.worker_id, attempt, error=str(e))
+        finally:
+            with self._lock:
+                self._running.pop(job_id, None)
+        if not stored:
+            print(f"⚠️ Job {job_id} was requeued during attempt {attempt}, its outcome is discarded")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            running_here = len(self._running)
+        return {
+            "workers": self.workers if self._threads else 0,
+            "running_here": running_here,
+            "jobs": self.store.counts(),
+            "oldest_queued_age": self.store.oldest_queued_age(),
+        }
+
+
+# Global job queue instance
+_job_queue: Optional[JobQueue] = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """Get or create the process-wide job queue (configured from PROPT_JOB* env vars)"""
+    global _job_queue
+    if _job_queue is None:
+        with _job_queue_lock:
+            if _job_queue is None:
+                _job_queue = JobQueue(
+                    JobStore(os.getenv("PROPT_JOBS_DB", DEFAULT_DB_PATH)),
+                    workers=int(os.getenv("PROPT_JOB_WORKERS", DEFAULT_WORKERS)),
+                    poll_interval=float(os.getenv("PROPT_JOB_POLL_INTERVAL", DEFAULT_POLL_INTERVAL)),
+                    stale_after=float(os.getenv("PROPT_JOB_STALE_AFTER", DEFAULT_STALE_AFTER)),
+                )
+    return _job_queue
+
+
+def job_to_dict(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Public view of a job for the API"""
+    return {
+        "job_id": job["id"],
+        "type": job["kind"],
+        "status": job["status"],
+        "stage": job["stage"],
+        "queue_position": job["queue_position"],
+        "attempts": job["attempts"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "result": job["result"],
+        "error": job["error"],
+    }
@@ -0,0 +1,228 @@
+"""
+Latency-SLO-driven selection of model and reasoning effort
+
+Every LLM call reports its latency - including calls that failed or timed out,
+which are the SLO breaches that matter most - keyed on (call kind, model,
+reasoning effort, web search on/off); the call kind is the endpoint label the
+call was made under, so agent-stage calls and generation calls don't share
+samples. Before an endpoint starts work it asks the controller for a
+configuration: if the rolling p95 of the requested one would break the
+endpoint's SLO, a cheaper effort level or model is chosen instead and the
+applied degradation is returned so it can be reported in the response.
+"""
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+# Cheapest last - degradation walks down these ladders
+EFFORT_LADDER = ["high", "medium", "low", "minimal"]
+# The web_search_preview tool is rejected with minimal reasoning
+WEB_SEARCH_EFFORTS = ["high", "medium", "low"]
+DEFAULT_MODEL_LADDER = ["gpt-5-2025-08-07", "gpt-5-mini-2025-08-07", "gpt-5-nano-2025-08-07"]
+
+# Per-endpoint latency targets in seconds (override with PROPT_SLO_<ENDPOINT>)
+DEFAULT_SLOS = {
+    "generate_prompt": 90.0,
+    "process_prompt": 120.0,
+}
+
+DEFAULT_WINDOW_SIZE = 50          # samples kept per configuration
+DEFAULT_WINDOW_SECONDS = 600.0    # samples older than this are ignored
+DEFAULT_MIN_SAMPLES = 5           # don't judge a configuration on fewer samples
+
+LatencyKey = Tuple[str, str, str, bool]
+
+
+def request_latency_key(kind: str, request: Dict[str, Any]) -> LatencyKey:
+    """(kind, model, effort, web_search) for a Responses API request made under endpoint label `kind`"""
+    effort = (request.get("reasoning") or {}).get("effort", "none")
+    web_search = any(str(tool.get("type", "")).startswith("web_search") for tool in request.get("tools") or [])
+    return kind, request.get("model", ""), effort, web_search
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(int(round(pct / 100.0 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+class LatencyTracker:
+    """Rolling latency samples per (kind, model, effort, web_search)"""
+
+    def __init__(self, window_size: int = DEFAULT_WINDOW_SIZE, window_seconds: float = DEFAULT_WINDOW_SECONDS):
+        self.window_size = window_size
+        self.window_seconds = window_seconds
+        self._samples: Dict[LatencyKey, Deque[Tuple[float, float, bool]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, key: LatencyKey, seconds: float, failed: bool = False) -> None:
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=self.window_size)
+            samples.append((time.time(), seconds, failed))
+
+    def _recent(self, key: LatencyKey) -> List[Tuple[float, bool]]:
+        cutoff = time.time() - self.window_seconds
+        return [(seconds, failed) for observed_at, seconds, failed in self._samples.get(key, ()) if observed_at >= cutoff]
+
+    def summary(self, key: LatencyKey) -> Dict[str, Any]:
+        with self._lock:
+            recent = self._recent(key)
+        if not recent:
+            return {"count": 0, "failures": 0, "p50": None, "p95": None}
+        latencies = [seconds for seconds, _ in recent]
+        return {
+            "count": len(recent),
+            "failures": sum(1 for _, failed in recent if failed),
+            "p50": _percentile(latencies, 50),
+            "p95": _percentile(latencies, 95),
+        }
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            keys = list(self._samples)
+        return {
+            f"{kind}|{model}|{effort}|{'web' if web_search else 'noweb'}": self.summary((kind, model, effort, web_search))
+            for kind, model, effort, web_search in keys
+        }
+
+
+class AdaptiveController:
+    """Chooses the model/effort for a call so an endpoint stays inside its SLO"""
+
+    def __init__(self,
+                 tracker: LatencyTracker,
+                 slos: Optional[Dict[str, float]] = None,
+                 model_ladder: Optional[List[str]] = None,
+                 min_samples: int = DEFAULT_MIN_SAMPLES,
+                 enabled: bool = True):
+        self.tracker = tracker
+        self.slos = dict(slos or DEFAULT_SLOS)
+        self.model_ladder = list(model_ladder or DEFAULT_MODEL_LADDER)
+        self.min_samples = min_samples
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._degradations: Dict[str, int] = {}
+
+    def slo_for(self, endpoint: str) -> Optional[float]:
+        return self.slos.get(endpoint)
+
+    def _candidates(self, model: str, effort: str, web_search: bool, degrade_model: bool = True) -> List[Tuple[str, str]]:
+        """Cheaper configurations in preference order: lower effort first, then smaller models"""
+        ladder = WEB_SEARCH_EFFORTS if web_search else EFFORT_LADDER
+        efforts = ladder[ladder.index(effort):] if effort in ladder else [effort]
+        models = self.model_ladder[self.model_ladder.index(model):] if degrade_model and model in self.model_ladder else [model]
+        candidates = []
+        for candidate_model in models:
+            for candidate_effort in efforts:
+                if (candidate_model, candidate_effort) != (model, effort):
+                    candidates.append((candidate_model, candidate_effort))
+        return candidates
+
+    def _predicted(self, kind: str, model: str, effort: str, web_search: bool, sequential_calls: int) -> Tuple[Optional[float], int]:
+        summary = self.tracker.summary((kind, model, effort, web_search))
+        if summary["count"] < self.min_samples:
+            return None, summary["count"]
+        return summary["p95"] * sequential_calls, summary["count"]
+
+    def choose(self, endpoint: str, model: str, effort: str, web_search: bool = True, sequential_calls: int = 1,
+               kind: Optional[str] = None, degrade_model: bool = True) -> Dict[str, Any]:
+        """
+        Return the configuration to use:
+        {"model", "reasoning_effort", "degraded", "requested", "reason", "predicted_p95", "slo"}
+        `kind` is the endpoint label of the calls the endpoint makes (the endpoint
+        itself by default); `degrade_model=False` only lowers the effort.
+        """
+        kind = kind or endpoint
+        decision = {
+            "model": model,
+            "reasoning_effort": effort,
+            "degraded": False,
+            "requested": {"model": model, "reasoning_effort": effort},
+            "reason": None,
+            "predicted_p95": None,
+            "slo": self.slo_for(endpoint),
+        }
+        slo = decision["slo"]
+        if not self.enabled or slo is None:
+            return decision
+
+        predicted, _ = self._predicted(kind, model, effort, web_search, sequential_calls)
+        decision["predicted_p95"] = predicted
+        if predicted is None or predicted <= slo:
+            return decision
+
+        chosen = None
+        for candidate_model, candidate_effort in self._candidates(model, effort, web_search, degrade_model):
+            candidate_predicted, _ = self._predicted(kind, candidate_model, candidate_effort, web_search, sequential_calls)
+            # Untried cheaper configurations are assumed to be faster
+            if candidate_predicted is None or candidate_predicted <= slo:
+                chosen = (candidate_model, candidate_effort, candidate_predicted)
+                break
+            chosen = (candidate_model, candidate_effort, candidate_predicted)  # fall through to the cheapest
+        if chosen is None:
+            return decision
+
+        decision.update({
+            "model": chosen[0],
+            "reasoning_effort": chosen[1],
+            "degraded": True,
+            "predicted_p95": chosen[2],
+            "reason": f"p95 {predicted:.1f}s for {model}/{effort} exceeds the {slo:.0f}s SLO for {endpoint}",
+        })
+        with self._lock:
+            self._degradations[endpoint] = self._degradations.get(endpoint, 0) + 1
+        print(f"📉 Degrading {endpoint}: {model}/{effort} → {chosen[0]}/{chosen[1]} ({decision['reason']})")
+        return decision
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            degradations = dict(self._degradations)
+        return {
+            "enabled": self.enabled,
+            "slos": self.slos,
+            "degradations": degradations,
+            "latency": self.tracker.snapshot(),
+        }
+
+
+def _slos_from_env() -> Dict[str, float]:
+    slos = dict(DEFAULT_SLOS)
+    for endpoint in DEFAULT_SLOS:
+        value = os.getenv(f"PROPT_SLO_{endpoint.upper()}")
+        if value:
+            slos[endpoint] = float(value)
+    return slos
+
+
+# Global controller instance
+_controller: Optional[AdaptiveController] = None
+_controller_lock = threading.Lock()
+
+
+def get_latency_controller() -> AdaptiveController:
+    """Get or create the process-wide controller (configured from PROPT_* env vars)"""
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                ladder = os.getenv("PROPT_MODEL_LADDER")
+                _controller = AdaptiveController(
+                    LatencyTracker(
+                        window_size=int(os.getenv("PROPT_LATENCY_WINDOW", DEFAULT_WINDOW_SIZE)),
+                        window_seconds=float(os.getenv("PROPT_LATENCY_WINDOW_SECONDS", DEFAULT_WINDOW_SECONDS)),
+                    ),
+                    slos=_slos_from_env(),
+                    model_ladder=[m.strip() for m in ladder.split(",")] if ladder else None,
+                    min_samples=int(os.getenv("PROPT_LATENCY_MIN_SAMPLES", DEFAULT_MIN_SAMPLES)),
+                    enabled=os.getenv("PROPT_ADAPTIVE", "1").lower() not in ("0", "false", "no"),
+                )
+    return _controller
+
+
+def record_latency(kind: str, request: Dict[str, Any], seconds: float, failed: bool = False) -> None:
+    """Report how long an LLM call made under endpoint label `kind` took, whether or not it succeeded"""
+    get_latency_controller().tracker.observe(request_latency_key(kind, request), seconds, failed)
@@ -0,0 +1,293 @@
+"""
+Process-wide OpenAI client registry with pooled keep-alive connections
+"""
+import asyncio
+import os
+import threading
+import time
+import weakref
+from typing import Any, Dict, Iterator, Optional
+
+import httpx
+from openai import OpenAI, AsyncOpenAI
+
+from circuit_breaker import get_circuit_breaker
+from latency_controller import record_latency
+from providers import get_provider, needs_api_key
+from resilience import acall_with_resilience, call_with_resilience, stream_with_resilience
+from token_budget import cached_tokens, record_usage
+from tracing import span, start_span
+
+# Pool settings (override with environment variables)
+DEFAULT_MAX_CONNECTIONS = 100
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 20
+DEFAULT_KEEPALIVE_EXPIRY = 120.0   # seconds an idle connection is kept open
+DEFAULT_CONNECT_TIMEOUT = 10.0
+DEFAULT_READ_TIMEOUT = 600.0       # GPT-5 with web search can take minutes
+DEFAULT_PREWARM_CONNECTIONS = 2
+SDK_MAX_RETRIES = 0                # resilience.py owns retries, within the retry budget and deadline
+
+_lock = threading.Lock()
+_sync_client: Optional[OpenAI] = None
+# One async client per event loop - httpx connections are bound to the loop that opened them
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = weakref.WeakKeyDictionary()
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        print(f"⚠️ Invalid value for {name}, using default {default}")
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        print(f"⚠️ Invalid value for {name}, using default {default}")
+        return default
+
+
+def get_pool_limits() -> httpx.Limits:
+    """Connection pool limits shared by the sync and async clients"""
+    return httpx.Limits(
+        max_connections=_env_int("OPENAI_MAX_CONNECTIONS", DEFAULT_MAX_CONNECTIONS),
+        max_keepalive_connections=_env_int("OPENAI_MAX_KEEPALIVE_CONNECTIONS", DEFAULT_MAX_KEEPALIVE_CONNECTIONS),
+        keepalive_expiry=_env_float("OPENAI_KEEPALIVE_EXPIRY", DEFAULT_KEEPALIVE_EXPIRY),
+    )
+
+
+def get_timeout() -> httpx.Timeout:
+    """Default HTTP timeout for LLM calls"""
+    return httpx.Timeout(
+        _env_float("OPENAI_READ_TIMEOUT", DEFAULT_READ_TIMEOUT),
+        connect=_env_float("OPENAI_CONNECT_TIMEOUT", DEFAULT_CONNECT_TIMEOUT),
+    )
+
+
+def get_client() -> OpenAI:
+    """Get the shared synchronous OpenAI client (created lazily, thread-safe)"""
+    global _sync_client
+    if _sync_client is None:
+        with _lock:
+            if _sync_client is None:
+                http_client = httpx.Client(limits=get_pool_limits(), timeout=get_timeout())
+                _sync_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=http_client,
+                                      max_retries=SDK_MAX_RETRIES)
+    return _sync_client
+
+
+def get_async_client() -> AsyncOpenAI:
+    """Get the shared AsyncOpenAI client for the running event loop"""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        async_client = _async_clients.get(loop)
+        if async_client is None:
+            http_client = httpx.AsyncClient(limits=get_pool_limits(), timeout=get_timeout())
+            async_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=http_client,
+                                       max_retries=SDK_MAX_RETRIES)
+            _async_clients[loop] = async_client
+    return async_client
+
+
+def _call_attributes(endpoint: str, request: Dict[str, Any]) -> Dict[str, Any]:
+    """Trace attributes describing a Responses API request"""
+    return {
+        "endpoint": endpoint,
+        "model": request.get("model", ""),
+        "reasoning_effort": (request.get("reasoning") or {}).get("effort"),
+        "web_search": any(tool.get("type", "").startswith("web_search") for tool in request.get("tools") or []),
+        "prefix_layout": bool(request.get("instructions")),
+        "output_schema": ((request.get("text") or {}).get("format") or {}).get("name"),
+    }
+
+
+def _usage_attributes(usage: Any) -> Dict[str, Any]:
+    if usage is None:
+        return {}
+    return {
+        "input_tokens": getattr(usage, "input_tokens", None),
+        "cached_tokens": cached_tokens(usage),
+        "output_tokens": getattr(usage, "output_tokens", None),
+    }
+
+
+def _create_once(request: Dict[str, Any]) -> Any:
+    breaker = get_circuit_breaker(request.get("model", ""))
+    breaker.before_call()
+    with span("llm.attempt", timeout=request.get("timeout")) as attempt:
+        try:
+            response = get_provider().create(**request)
+        except BaseException as e:
+            breaker.record_failure(e)
+            raise
+        attempt.set(**_usage_attributes(getattr(response, "usage", None)))
+    breaker.record_success()
+    record_usage(request.get("model", ""), getattr(response, "usage", None))
+    return response
+
+
+async def _acreate_once(request: Dict[str, Any]) -> Any:
+    breaker = get_circuit_breaker(request.get("model", ""))
+    breaker.before_call()
+    with span("llm.attempt", timeout=request.get("timeout")) as attempt:
+        try:
+            response = await get_provider().acreate(**request)
+        except BaseException as e:
+            breaker.record_failure(e)
+            raise
+        attempt.set(**_usage_attributes(getattr(response, "usage", None)))
+    breaker.record_success()
+    record_usage(request.get("model", ""), getattr(response, "usage", None))
+    return response
+
+
+def _stream_once(request: Dict[str, Any]) -> Iterator[Any]:
+    breaker = get_circuit_breaker(request.get("model", ""))
+    breaker.before_call()
+    try:
+        for event in get_provider().stream(**request):
+            if event.type == "response.completed":
+                record_usage(request.get("model", ""), getattr(event.response, "usage", None))
+            yield event
+    except BaseException as e:
+        breaker.record_failure(e)
+        raise
+    breaker.record_success()
+
+
+def create_response(endpoint: str = "default", **kwargs) -> Any:
+    """
+    Call the Responses API through the configured provider (shared sync client when live).
+    `endpoint` selects the deadline/retry/hedging policy in resilience.py.
+    Latency is recorded for the whole call - retries included, and also when it fails.
+    """
+    started = time.perf_counter()
+    with span("llm.call", **_call_attributes(endpoint, kwargs)) as call:
+        try:
+            response = call_with_resilience(endpoint, _create_once, kwargs)
+        except BaseException:
+            record_latency(endpoint, kwargs, time.perf_counter() - started, failed=True)
+            raise
+        record_latency(endpoint, kwargs, time.perf_counter() - started)
+        call.set(**_usage_attributes(getattr(response, "usage", None)))
+        return response
+
+
+async def acreate_response(endpoint: str = "default", **kwargs) -> Any:
+    """Call the Responses API through the configured provider (shared async client when live)"""
+    started = time.perf_counter()
+    with span("llm.call", **_call_attributes(endpoint, kwargs)) as call:
+        try:
+            response = await acall_with_resilience(endpoint, _acreate_once, kwargs)
+        except BaseException:
+            # Includes cancellation by a pipeline timeout
+            record_latency(endpoint, kwargs, time.perf_counter() - started, failed=True)
+            raise
+        record_latency(endpoint, kwargs, time.perf_counter() - started)
+        call.set(**_usage_attributes(getattr(response, "usage", None)))
+        return response
+
+
+def stream_response(endpoint: str = "default", **kwargs) -> Iterator[Any]:
+    """Stream Responses API events through the configured provider (latency is recorded when the stream ends)"""
+    started = time.perf_counter()
+    # Not made current: the consumer runs between yields
+    call = start_span("llm.stream", **_call_attributes(endpoint, kwargs))
+    first_token = True
+    try:
+        for event in stream_with_resilience(endpoint, _stream_once, kwargs):
+            if event.type == "response.output_text.delta" and first_token:
+                first_token = False
+                call.set(first_token_ms=round((time.perf_counter() - started) * 1000, 1))
+            elif event.type == "response.completed":
+                call.set(**_usage_attributes(getattr(event.response, "usage", None)))
+            yield event
+    except BaseException as e:
+        call.end(e)
+        if not isinstance(e, GeneratorExit):   # the consumer stopping early isn't a slow call
+            record_latency(endpoint, kwargs, time.perf_counter() - started, failed=True)
+        raise
+    call.end()
+    record_latency(endpoint, kwargs, time.perf_counter() - started)
+
+
+def prewarm_clients(connections: Optional[int] = None, background: bool = True) -> None:
+    """
+    Open keep-alive connections ahead of the first request so it doesn't pay
+    for DNS and the TLS handshake. Runs in a daemon thread by default.
+    """
+    if not os.getenv("OPENAI_API_KEY") or not needs_api_key():
+        return
+    count = connections if connections is not None else _env_int("OPENAI_PREWARM_CONNECTIONS", DEFAULT_PREWARM_CONNECTIONS)
+    if count <= 0:
+        return
+
+    def _warm():
+        client = get_client()
+        threads = [threading.Thread(target=_warm_one, args=(client,), daemon=True) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        print(f"🔥 Pre-warmed {count} OpenAI connection(s)")
+
+    if background:
+        threading.Thread(target=_warm, name="openai-prewarm", daemon=True).start()
+    else:
+        _warm()
+
+
+def _warm_one(client: OpenAI) -> None:
+    try:
+        client.with_options(timeout=DEFAULT_CONNECT_TIMEOUT, max_retries=0).models.list()
+    except Exception as e:
+        print(f"⚠️ Connection pre-warm failed: {e}")
+
+
+async def aprewarm_clients(connections: Optional[int] = None) -> None:
+    """Pre-warm the async client bound to the running event loop"""
+    if not os.getenv("OPENAI_API_KEY") or not needs_api_key():
+        return
+    count = connections if connections is not None else _env_int("OPENAI_PREWARM_CONNECTIONS", DEFAULT_PREWARM_CONNECTIONS)
+    client = get_async_client().with_options(timeout=DEFAULT_CONNECT_TIMEOUT, max_retries=0)
+
+    async def _warm_one_async():
+        try:
+            await client.models.list()
+        except Exception as e:
+            print(f"⚠️ Async connection pre-warm failed: {e}")
+
+    await asyncio.gather(*(_warm_one_async() for _ in range(max(count, 0))))
+
+
+async def aclose_async_client() -> None:
+    """Close the async client bound to the running event loop, if one was created"""
+    with _lock:
+        async_client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if async_client is not None:
+        await async_client.close()
+
+
+def close_clients(timeout: float = 5.0) -> None:
+    """
+    Close the shared sync client and the async clients of event loops that are
+    still running (each is closed on its own loop). Clients of loops that have
+    already stopped are dropped and left to garbage collection.
+    """
+    global _sync_client
+    with _lock:
+        if _sync_client is not None:
+            _sync_client.close()
+            _sync_client = None
+        loops = list(_async_clients.keys())
+    for loop in loops:
+        if not loop.is_running():
+            continue
+        try:
+            asyncio.run_coroutine_threadsafe(aclose_async_client(), loop).result(timeout)
+        except Exception as e:
+            print(f"⚠️ Could not close async OpenAI client: {e}")
+    with _lock:
+        _async_clients.clear()
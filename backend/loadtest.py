@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Offline load test for the generation endpoints
+
+Runs in-process against the Flask app with the synthetic (or replay) provider,
+so no network or OpenAI quota is used:
+
+    PROPT_SYNTHETIC_LATENCY=lognormal:0.0,0.5 python loadtest.py --endpoint generate-prompt -n 100 -c 16
+    PROPT_PROVIDER=replay python loadtest.py --endpoint process-prompt -n 20 -c 4
+
+Pass --url to drive a running server instead, and --json to get a
+machine-readable summary for comparing throughput across changes.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+ENDPOINTS = {
+    "generate-prompt": "/api/generate-prompt",
+    "process-prompt": "/api/process-prompt",
+    "generate-formats": "/api/generate-formats",
+}
+
+SAMPLE_PROMPT = """# System Prompt
+You are a financial research assistant.
+- Summarize the latest filings for the requested ticker.
+- Always cite the filing date.
+"""
+
+
+def build_payload(endpoint: str, index: int, distinct: int, no_cache: bool) -> Dict[str, Any]:
+    """Request body for one call; `distinct` controls how many unique requests there are"""
+    variant = index % distinct
+    if endpoint == "process-prompt":
+        return {"content": f"{SAMPLE_PROMPT}\n<!-- variant {variant} -->", "industry": "Finance", "use_case": "Stock Research"}
+    payload = {"industry": f"Industry {variant}", "use_case": "Load testing", "tasks": ["task a", "task b"]}
+    if no_cache:
+        payload["no_cache"] = True
+    return payload
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(int(round(pct / 100.0 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def make_sender(url: str):
+    """Return send(path, payload, headers) -> status for in-process or HTTP mode"""
+    if url:
+        import requests
+        session = requests.Session()
+
+        def send(path, payload, headers):
+            return session.post(url.rstrip("/") + path, json=payload, headers=headers, timeout=600).status_code
+        return send
+
+    os.environ.setdefault("PROPT_PROVIDER", "synthetic")
+    os.environ.setdefault("PROPT_CACHE_DISK", "0")
+    with contextlib.redirect_stdout(io.StringIO()):
+        from main_flask import app
+    import logging
+    logging.disable(logging.ERROR)  # per-request model logs would drown the summary
+    local = threading.local()
+
+    def send(path, payload, headers):
+        if not hasattr(local, "client"):
+            local.client = app.test_client()
+        return local.client.post(path, json=payload, headers=headers).status_code
+    return send
+
+
+def run(endpoint: str, requests_count: int, concurrency: int, distinct: int, no_cache: bool, url: str) -> Dict[str, Any]:
+    send = make_sender(url)
+    path = ENDPOINTS[endpoint]
+
+    def one(index: int) -> Tuple[int, float]:
+        # A distinct client IP per request keeps the per-IP rate limiter out of the measurement
+        headers = {"X-Forwarded-For": f"10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}"}
+        start = time.perf_counter()
+        try:
+            status = send(path, build_payload(endpoint, index, distinct, no_cache), headers)
+        except Exception:
+            status = 0
+        return status, time.perf_counter() - start
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(requests_count)))
+    wall_time = time.perf_counter() - started
+
+    latencies = [latency for status, latency in results if status == 200]
+    statuses: Dict[str, int] = {}
+    for status, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    return {
+        "endpoint": path,
+        "provider": os.getenv("PROPT_PROVIDER", "live") if not url else "remote",
+        "requests": requests_count,
+        "concurrency": concurrency,
+        "distinct_requests": distinct,
+        "ok": len(latencies),
+        "errors": requests_count - len(latencies),
+        "status_codes": statuses,
+        "wall_time_s": round(wall_time, 3),
+        "throughput_rps": round(requests_count / wall_time, 2) if wall_time else 0.0,
+        "latency_s": {
+            "p50": round(percentile(latencies, 50), 4),
+            "p95": round(percentile(latencies, 95), 4),
+            "p99": round(percentile(latencies, 99), 4),
+            "max": round(max(latencies), 4) if latencies else 0.0,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test for the Propt API")
+    parser.add_argument("--endpoint", choices=sorted(ENDPOINTS), default="generate-prompt")
+    parser.add_argument("-n", "--requests", type=int, default=50)
+    parser.add_argument("-c", "--concurrency", type=int, default=8)
+    parser.add_argument("--distinct", type=int, default=10, help="number of unique request bodies")
+    parser.add_argument("--no-cache", action="store_true", help="bypass the response cache")
+    parser.add_argument("--url", default="", help="target a running server instead of the in-process app")
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    parser.add_argument("--verbose", action="store_true", help="keep the app's console output")
+    args = parser.parse_args()
+
+    output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with output:
+        summary = run(args.endpoint, args.requests, args.concurrency, max(args.distinct, 1), args.no_cache, args.url)
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+    print(f"🏁 {summary['endpoint']} via {summary['provider']} provider")
+    print(f"   {summary['requests']} requests, concurrency {summary['concurrency']}, {summary['distinct_requests']} distinct")
+    print(f"   ok={summary['ok']} errors={summary['errors']} status={summary['status_codes']}")
+    print(f"   wall={summary['wall_time_s']}s throughput={summary['throughput_rps']} req/s")
+    latency = summary["latency_s"]
+    print(f"   latency p50={latency['p50']}s p95={latency['p95']}s p99={latency['p99']}s max={latency['max']}s")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""
+Long-lived event loops for running coroutines from Flask handlers
+
+asyncio.run() per request builds and tears down an event loop every time, and
+with it the loop-bound AsyncOpenAI client and its connection pool. The loops
+here are started once per process, each in a daemon thread, and sync code
+hands coroutines to them with run_async(), which waits with a deadline and
+cancels the coroutine if the deadline passes. The caller's context variables
+(the current trace span) travel with the coroutine.
+"""
+import asyncio
+import concurrent.futures
+import contextvars
+import os
+import threading
+from typing import Any, Coroutine, Dict, List, Optional
+
+from llm_client import aclose_async_client
+
+DEFAULT_LOOPS = 1   # one loop multiplexes many pipelines; more only helps when loop-side CPU work is heavy
+
+
+class LoopWorker:
+    """An event loop running forever in its own daemon thread"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._lock = threading.Lock()
+        self.inflight = 0
+        self.completed = 0
+        self._thread.start()
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro: Coroutine, context: Optional[contextvars.Context] = None) -> concurrent.futures.Future:
+        """Schedule a coroutine on this loop; cancelling the returned future cancels it"""
+        context = context if context is not None else contextvars.copy_context()
+
+        async def _in_context():
+            # Tasks copy the context that is current when they are created
+            return await context.run(self.loop.create_task, coro)
+
+        with self._lock:
+            self.inflight += 1
+        future = asyncio.run_coroutine_threadsafe(_in_context(), self.loop)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future: concurrent.futures.Future) -> None:
+        with self._lock:
+            self.inflight -= 1
+            self.completed += 1
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Close this loop's OpenAI client (its connection pool) and stop the loop"""
+        try:
+            asyncio.run_coroutine_threadsafe(aclose_async_client(), self.loop).result(timeout)
+        except Exception as e:
+            print(f"⚠️ Could not close the OpenAI client of {self.name}: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+
+
+class LoopPool:
+    """A fixed set of loop workers; each coroutine goes to the least busy one"""
+
+    def __init__(self, size: int):
+        self.pid = os.getpid()
+        self.workers: List[LoopWorker] = [LoopWorker(f"event-loop-{i}") for i in range(max(size, 1))]
+
+    def submit(self, coro: Coroutine) -> concurrent.futures.Future:
+        return min(self.workers, key=lambda worker: worker.inflight).submit(coro)
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        """
+        Run a coroutine on the pool and block until it finishes. Raises TimeoutError
+        after `timeout` seconds; the coroutine is cancelled then, and also when the
+        waiting thread is interrupted.
+        """
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise TimeoutError(f"Coroutine did not finish within {timeout:g}s") from None
+        except BaseException:
+            future.cancel()
+            raise
+
+    def stop(self) -> None:
+        for worker in self.workers:
+            worker.stop()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "loops": len(self.workers),
+            "inflight": [worker.inflight for worker in self.workers],
+            "completed": sum(worker.completed for worker in self.workers),
+        }
+
+
+# Global pool instance, created on first use in each process (loops don't survive a fork)
+_pool: Optional[LoopPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_loop_pool() -> LoopPool:
+    """Get or create the process-wide loop pool (PROPT_EVENT_LOOPS loops)"""
+    global _pool
+    if _pool is None or _pool.pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool.pid != os.getpid():
+                _pool = LoopPool(int(os.getenv("PROPT_EVENT_LOOPS", DEFAULT_LOOPS)))
+    return _pool
+
+
+def run_async(coro: Coroutine, timeout: Optional[float] = None) -> Any:
+    """Run a coroutine on the shared loops from sync code (see LoopPool.run)"""
+    return get_loop_pool().run(coro, timeout)
+
+
+def get_loop_stats() -> Dict[str, Any]:
+    return get_loop_pool().stats() if _pool is not None else {"loops": 0, "inflight": [], "completed": 0}
@@ -5,6 +5,7 @@ from pydantic import BaseModel, Field
 from typing import List, Dict, Any
 from openai import OpenAI
 from agents import Agent, Runner
+from templates import render_prompt
 
 
 load_dotenv()
@@ -51,26 +52,16 @@ def list_prompts(tool_name, base_path="sample_prompts"):
     tool_path = os.path.join(base_path, tool_name)
     return [f for f in os.listdir(tool_path) if os.path.isfile(os.path.join(tool_path, f))]
 
-def load_prompt(tool_name, prompt_file=None, base_path="sample_prompts", **kwargs):
-    if prompt_file is None:
-        path = tool_name
-    else:
-        path = os.path.join(base_path, tool_name, prompt_file)
-    with open(path, "r") as f:
-        content = f.read()
-    if kwargs:
-        try:
-            content = content.format(**kwargs)
-        except Exception:
-            pass
-    return content
+def load_prompt(tool_name, prompt_file, base_path="sample_prompts"):
+    with open(os.path.join(base_path, tool_name, prompt_file), "r") as f:
+        return f.read()
 
 
 def make_prompt_agent(industry, usecase):
     
     # Load the prompt generation template with placeholders filled
-    generate_prompt_template = load_prompt("prompts/generate_prompt.md")
-    filled_prompt = generate_prompt_template.format(industry=industry, usecase=usecase)
+    filled_prompt = render_prompt("generate_prompt.md", industry=industry, usecase=usecase, region="global",
+                                  tasks="", links="", document="", input_format="", output_format="")
     
     response = client.responses.create(
         model="gpt-5",
@@ -88,11 +79,10 @@ def make_prompt_agent(industry, usecase):
 
 def make_prompt_editing_agent(industry, usecase):
     # Load prompt templates with templating
-    extraction_prompt = load_prompt("prompts/extraction_prompt.md", industry=industry, usecase=usecase)
-    critique_prompt   = load_prompt("prompts/critique_system.md", industry=industry, usecase=usecase)
-    critique_user     = load_prompt("prompts/critique_user.md", industry=industry, usecase=usecase)
-    revise_prompt     = load_prompt("prompts/revise_prompt.md", industry=industry, usecase=usecase)
-    main_prompt       = load_prompt("prompts/main_prompt.md", industry=industry, usecase=usecase)
+    extraction_prompt = render_prompt("extraction_prompt.md", industry=industry, usecase=usecase)
+    critique_prompt   = render_prompt("critique_system.md", industry=industry, usecase=usecase)
+    revise_prompt     = render_prompt("revise_prompt.md", industry=industry, usecase=usecase)
+    main_prompt       = render_prompt("main_prompt.md", industry=industry, usecase=usecase)
 
     MODEL = "gpt-5-mini-2025-08-07"
 
@@ -151,7 +141,7 @@ def make_prompt_editing_agent(industry, usecase):
     return prmopt_editing_agent
 
 async def main():
-    original_prompt   = load_prompt("prompts/original_prompt.md") 
+    original_prompt   = render_prompt("original_prompt.md")
     make_prompt = make_prompt_agent("healthcare", "patient_engagement")
     main_agent = make_prompt_editing_agent("healthcare", "patient_engagement")
     result = await Runner.run(main_agent, original_prompt)
@@ -1,12 +1,37 @@
-import asyncio
+import atexit
+import contextvars
+import copy
+import json
 import os
+import sqlite3
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from types import SimpleNamespace
 from dotenv import load_dotenv
 from pydantic import BaseModel, Field
 from typing import List, Dict, Any
-from openai import OpenAI
-from agents import Agent, Runner, get_client
-from flask import Flask, request, jsonify, send_file
+from agents import Agent, Runner
+from checkpoints import PipelineCheckpoints, new_run_id
+from circuit_breaker import CircuitOpenError, check_circuit, get_all_circuit_stats
+from latency_controller import get_latency_controller
+from jobs import get_job_queue, job_to_dict
+from llm_client import aprewarm_clients, close_clients, get_client, create_response, stream_response, prewarm_clients
+from loop_worker import get_loop_pool, get_loop_stats, run_async
+from providers import get_provider_mode, needs_api_key
+from resilience import get_resilience_stats
+from response_cache import get_response_cache, get_all_cache_stats, make_cache_key
+from singleflight import get_singleflight, get_all_singleflight_stats
+from instruction_blocks import CritiqueBlockCache
+from domain_facts import format_facts, get_domain_facts, store_domain_facts
+from prompt_layout import INLINE, LAYOUTS, PREFIX, default_layout, request_block, static_instructions
+from section_parser import NO_PLANNING, SectionParser, parse_response
+from templates import get_template_registry
+from token_budget import Section, cached_tokens, estimate_tokens, fit_document, fit_sections, format_report, get_usage_stats
+from tracing import begin_trace, end_trace, get_tracing_stats, set_attributes, span, trace, traced
+from structured_output import StructuredOutputError, parse_output, text_format
+from streaming import DEFAULT_HEARTBEAT_INTERVAL, HEARTBEAT, format_sse, iter_call, iter_with_heartbeat, sse_comment
+from flask import Flask, Response, g, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
 # Optional enhanced features - fallback to basic functionality if not available
 try:
@@ -73,7 +98,7 @@ CORS(app, resources={
         "origins": "*",
         "methods": ["GET", "POST", "OPTIONS"],
         "allow_headers": ["Content-Type", "Authorization", "Accept"],
-        "expose_headers": ["Content-Type", "Authorization"]
+        "expose_headers": ["Content-Type", "Authorization", "Retry-After", "X-Trace-Id"]
     }
 })
 
@@ -98,6 +123,19 @@ def internal_error(error):
     logger.error(f"500 Error: {error}")
     return jsonify({"error": "Internal server error", "details": str(error)}), 500
 
+@app.errorhandler(CircuitOpenError)
+def circuit_open_error(error):
+    logger.warning(f"503 Circuit open: {error}")
+    response = jsonify({
+        "success": False,
+        "error": str(error),
+        "error_type": "provider_unavailable",
+        "retry_after": error.retry_after
+    })
+    response.status_code = 503
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
 # Simple in-memory tracking for demo (use Redis/DB for production)
 attempt_tracker = {}
 
@@ -144,18 +182,37 @@ def log_request_info():
     if request.is_json:
         logger.debug("Request JSON: %s", request.get_json())
 
-# Initialize OpenAI client
+# Every request runs in its own trace; the ID is returned in X-Trace-Id
+@app.before_request
+def start_request_trace():
+    if request.method == 'OPTIONS':
+        return
+    g.trace = begin_trace(f"{request.method} {request.path}", request.headers.get('X-Trace-Id'), path=request.path)
+
+@app.after_request
+def attach_trace_id(response):
+    root, token = g.pop('trace', (None, None))
+    if root is None:
+        return response
+    if root.trace_id:
+        response.headers['X-Trace-Id'] = root.trace_id
+    root.set(status=response.status_code)
+    # Streamed bodies are still being generated - end the trace when the response closes
+    response.call_on_close(lambda: end_trace(root, token))
+    return response
+
+# Initialize the shared OpenAI client (pooled keep-alive connections)
 api_key = os.getenv("OPENAI_API_KEY")
-if not api_key:
+if not api_key and needs_api_key():
     raise ValueError("OPENAI_API_KEY environment variable is not set")
-try:
-    # Try new OpenAI client initialization
-    client = OpenAI(api_key=api_key)
-except TypeError:
-    # Fallback for older versions
-    client = OpenAI(
-        api_key=api_key
-    )
+# Offline provider modes (replay/synthetic) never touch the OpenAI client
+client = get_client() if needs_api_key() else None
+prewarm_clients()
+if api_key and needs_api_key():
+    # The pipelines' async client lives on the shared event loop - warm its pool too
+    get_loop_pool().submit(aprewarm_clients())
+# Close the pooled connections (sync client and each event loop's async client) on shutdown
+atexit.register(close_clients)
 
 # -----------------------------------
 # Pydantic models (output schemas)
@@ -185,50 +242,17 @@ class RevisedPromptOutput(BaseModel):
 class GenereatedPrompt(BaseModel):
     planning:str
     final_prompt: str
+
+class DocumentAnalysis(BaseModel):
+    industry: str = Field(description="The primary industry the document belongs to.")
+    usecase: str = Field(description="The specific use case or purpose of the document.")
 # -----------------------------------
 # Utility Functions
 # -----------------------------------
-def load_prompt(tool_name, prompt_file=None, base_path="sample_prompts", **kwargs):
-    try:
-        if prompt_file is None:
-            path = tool_name
-        else:
-            # Try multiple possible paths
-            possible_paths = [
-                os.path.join(os.path.dirname(__file__), base_path, tool_name, prompt_file),  # Local development
-                os.path.join("/var/task/backend", base_path, tool_name, prompt_file),  # Vercel
-                os.path.join(base_path, tool_name, prompt_file)  # Relative path
-            ]
-            
-            path = None
-            for p in possible_paths:
-                if os.path.exists(p):
-                    path = p
-                    break
-            
-            if path is None:
-                print(f"❌ Could not find prompt file. Tried paths: {possible_paths}")
-                return "Error: Prompt file not found"
-        
-        print(f"📂 Loading prompt from: {path}")
-        with open(path, "r", encoding='utf-8') as f:
-            content = f.read()
-        
-        if kwargs:
-            try:
-                content = content.format(**kwargs)
-            except Exception as e:
-                print(f"⚠️ Error formatting prompt: {e}")
-                pass
-        
-        return content
-    except Exception as e:
-        print(f"❌ Error loading prompt: {e}")
-        return f"Error loading prompt: {str(e)}"
-
 # -----------------------------------
 # Core Agent Functions
 # -----------------------------------
+@traced("summarize_document")
 def summarize_document(document_content, reasoning_effort="medium"):
     """Summarize document content using GPT-5"""
     try:
@@ -236,7 +260,7 @@ def summarize_document(document_content, reasoning_effort="medium"):
         Please provide a concise summary of the key points from this document that would be relevant for prompt engineering:
 
         Document Content:
-        {document_content[:3000]}...
+        {fit_document("gpt-5-mini-2025-08-07", document_content)}
 
         Focus on:
         - Domain-specific requirements
@@ -248,8 +272,9 @@ def summarize_document(document_content, reasoning_effort="medium"):
         Provide a structured summary in 3-5 bullet points.
         """
         
-        # Use the same client for consistency
-        response = client.responses.create(
+        # Use the shared pooled client
+        response = create_response(
+            endpoint="summarize_document",
             model="gpt-5-mini-2025-08-07",
             input=summarization_prompt,
             reasoning={"effort": reasoning_effort}
@@ -260,24 +285,36 @@ def summarize_document(document_content, reasoning_effort="medium"):
         print(f"⚠️ Error summarizing document: {e}")
         return f"Document provided (summary unavailable): {document_content[:200]}..."
 
-def make_prompt_agent(industry, usecase, region="global", tasks=[], links=[], document="", input_format="", output_format="", model_provider="openai", model="gpt-5-mini-2025-08-07", reasoning_effort="medium", auto_generate_formats=False):
+@traced("prompt.build")
+def build_generation_request(industry, usecase, region="global", tasks=[], links=[], document="", input_format="", output_format="", model_provider="openai", model="gpt-5-mini-2025-08-07", reasoning_effort="medium", auto_generate_formats=False, token_report=None, layout=INLINE, domain_facts=None):
+    """
+    Build the Responses API `instructions`/`input`/`tools` for a generation.
+    
+    The "inline" layout fills the values into the template (instructions is None).
+    The "prefix" layout sends the template as static instructions and the values
+    as a separate request block, so the provider can cache the shared prefix.
+    With cached `domain_facts` the research is appended to the input and the web
+    search tool is left out; `request_input` is the input without it.
+    Sections are trimmed to the model's input token budget; pass a dict as
+    `token_report` to receive the per-section token breakdown.
+    """
     
     # Choose the appropriate prompt template based on the model
     if model_provider == "openai" and model == "gpt-5-mini-2025-08-07":
         # Use the specialized GPT-5 prompt from generate_prompt.md
-        generate_prompt_template = load_prompt(os.path.join(os.path.dirname(__file__), "prompts", "generate_prompt.md"))
+        generate_prompt_template = get_template_registry().get("generate_prompt.md")
         print(f"📝 Using generate_prompt.md for GPT-5")
     elif model_provider == "openai" and model == "gpt-4.1":
         # Use the specialized GPT-4.1 prompt from generate_prompt_gpt4.md
-        generate_prompt_template = load_prompt(os.path.join(os.path.dirname(__file__), "prompts", "generate_prompt_gpt4.md"))
+        generate_prompt_template = get_template_registry().get("generate_prompt_gpt4.md")
         print(f"📝 Using generate_prompt_gpt4.md for GPT-4.1")
     elif model_provider == "claude":
         # Use main prompt for Claude models
-        generate_prompt_template = load_prompt(os.path.join(os.path.dirname(__file__), "prompts", "main_prompt.md"))
+        generate_prompt_template = get_template_registry().get("main_prompt.md")
         print(f"📝 Using main_prompt.md for Claude")
     else:
         # Default fallback to GPT-5 prompt
-        generate_prompt_template = load_prompt(os.path.join(os.path.dirname(__file__), "prompts", "generate_prompt.md"))
+        generate_prompt_template = get_template_registry().get("generate_prompt.md")
         print(f"📝 Using generate_prompt.md as fallback")
     
     try:
@@ -303,7 +340,8 @@ def make_prompt_agent(industry, usecase, region="global", tasks=[], links=[], do
         if ENHANCED_FEATURES_AVAILABLE and auto_generate_formats and (not input_format or not output_format):
             try:
                 print(f"🎯 Auto-generating JSON formats for {industry} - {usecase}")
-                auto_input_format, auto_output_format = generate_json_formats(industry, usecase, tasks, reasoning_effort)
+                with span("generate_formats", industry=industry, usecase=usecase):
+                    auto_input_format, auto_output_format = generate_json_formats(industry, usecase, tasks, reasoning_effort)
                 
                 # Use auto-generated if not provided by user
                 if not input_format:
@@ -328,219 +366,372 @@ def make_prompt_agent(industry, usecase, region="global", tasks=[], links=[], do
         else:
             output_format_text = "No specific output format specified"
         
-        # Fill the template with new parameter structure using safe string replacement
-        filled_prompt = generate_prompt_template
-        
-        # Replace placeholders one by one to avoid formatting conflicts
-        replacements = {
-            '{industry}': industry,
-            '{usecase}': usecase,
-            '{region}': region,
-            '{tasks}': tasks_formatted,
-            '{links}': links_formatted,
-            '{document}': document if document else "No document provided",
-            '{input_format}': input_format_text,
-            '{output_format}': output_format_text
-        }
-        
-        for placeholder, value in replacements.items():
-            filled_prompt = filled_prompt.replace(placeholder, str(value))
-        
-        # Choose the model to use based on provider and model selection
-        api_model = model if model_provider == "openai" else model
+        # Measure each section and trim the lowest-priority ones (links first, tasks last) to fit the budget
+        placeholders = generate_prompt_template.counts
+        if layout == PREFIX:
+            # Every referenced value appears once, in the request block
+            instructions = static_instructions(generate_prompt_template)
+            occurrences = {name: 1 for name in placeholders}
+            fixed_text = instructions + request_block([(name, value) for name, value in (('industry', industry), ('usecase', usecase), ('region', region)) if name in placeholders])
+        else:
+            instructions = None
+            occurrences = placeholders
+            fixed_text = generate_prompt_template.render(industry=industry, usecase=usecase, region=region,
+                                                         tasks="", links="", document="", input_format="", output_format="")
+        fitted = fit_sections(model, fixed_text, [
+            Section("tasks", tasks_formatted, priority=1, min_tokens=200, occurrences=occurrences.get('tasks', 0)),
+            Section("output_format", output_format_text, priority=2, min_tokens=200, occurrences=occurrences.get('output_format', 0)),
+            Section("input_format", input_format_text, priority=3, min_tokens=200, occurrences=occurrences.get('input_format', 0)),
+            Section("document", document if document else "No document provided", priority=4, min_tokens=300, occurrences=occurrences.get('document', 0)),
+            Section("links", links_formatted, priority=5, min_tokens=100, occurrences=occurrences.get('links', 0)),
+            Section("domain_facts", format_facts(domain_facts) if domain_facts else "", priority=6, min_tokens=300, occurrences=1 if domain_facts else 0),
+        ])
+        fitted["report"]["layout"] = layout
+        set_attributes(layout=layout, total_tokens=fitted["report"]["total_tokens"], template_tokens=fitted["report"]["template_tokens"],
+                       trimmed=[name for name, entry in fitted["report"]["sections"].items() if entry["trimmed"]])
+        print(f"🧮 Prompt tokens ({layout}): {format_report(fitted['report'])}")
+        if token_report is not None:
+            token_report.update(fitted["report"])
+        
+        tools = [] if domain_facts else [{"type": "web_search_preview"}]
+        research = "\n\n" + fitted["texts"]["domain_facts"] if domain_facts else ""
+        
+        if layout == PREFIX:
+            values = [
+                ('industry', industry),
+                ('usecase', usecase),
+                ('region', region),
+                ('tasks', fitted["texts"]["tasks"]),
+                ('links', fitted["texts"]["links"]),
+                ('document', fitted["texts"]["document"]),
+                ('input_format', fitted["texts"]["input_format"]),
+                ('output_format', fitted["texts"]["output_format"]),
+            ]
+            request_input = request_block([(name, str(value)) for name, value in values if name in placeholders])
+            return {"instructions": instructions, "input": request_input + research, "request_input": request_input, "tools": tools}
         
-        # Ensure we have a valid client
-        if not client:
-            raise ValueError("OpenAI client is not initialized")
-            
-        # Log the model request
-        log_model_request(
-            model=api_model,
-            prompt=filled_prompt,
-            reasoning_effort=reasoning_effort,
+        # Fill the precompiled template in a single pass
+        filled_prompt = generate_prompt_template.render(
             industry=industry,
             usecase=usecase,
-            model_provider=model_provider
+            region=region,
+            tasks=fitted["texts"]["tasks"],
+            links=fitted["texts"]["links"],
+            document=fitted["texts"]["document"],
+            input_format=fitted["texts"]["input_format"],
+            output_format=fitted["texts"]["output_format"]
         )
         
-        # Make the API call
-        start_time = time.time()
-        try:
-            response = client.responses.create(
-                model=api_model,
-                input=filled_prompt,
-                tools=[{"type": "web_search_preview"}],
-                reasoning={"effort": reasoning_effort}
-            )
-            processing_time = time.time() - start_time
-            
-            # Log the successful response
-            log_model_response(
-                model=api_model,
-                response=response.output_text,
-                processing_time=processing_time,
-                industry=industry,
-                usecase=usecase
-            )
-            
-            # Debug: log what the AI actually returned
-            print(f"🤖 AI RESPONSE DEBUG:")
-            print(f"Response object type: {type(response)}")
-            print(f"Output text type: {type(response.output_text)}")
-            print(f"Output text length: {len(response.output_text)}")
-            print(f"Output text content: {repr(response.output_text[:500])}")
-            print("="*60)
-        except Exception as api_error:
-            processing_time = time.time() - start_time
-            log_model_error(
-                model=api_model,
-                error=str(api_error),
-                processing_time=processing_time,
-                industry=industry,
-                usecase=usecase
-            )
-            raise api_error
-        
-        # Validate response
-        if not response or not hasattr(response, 'output_text'):
-            raise ValueError("Invalid response from OpenAI API - missing output_text")
-            
-        # Return the response text directly - frontend will handle parsing
-        return response.output_text
+        return {"instructions": None, "input": filled_prompt + research, "request_input": filled_prompt, "tools": tools}
         
     except Exception as e:
-        print(f"❌ Error in make_prompt_agent: {str(e)}")
-        raise Exception(f"Failed to generate prompt: {str(e)}")
+        print(f"❌ Error building generation prompt: {str(e)}")
+        raise Exception(f"Failed to build generation prompt: {str(e)}")
 
-def extract_final_prompt_from_response(response_text):
-    """Extract only the clean system prompt section from the structured response"""
-    try:
-        import re
-        
-        # Convert to string if it's not already
-        response_str = str(response_text)
-        
-        print(f"🔍 Parsing response (first 500 chars): {response_str[:500]}")
-        print(f"🔍 Response starts with: {repr(response_str[:50])}")
-        
-        # Look for the final_prompt section and extract only the clean system prompt
-        patterns = [
-            # Pattern for **final_prompt**: content
-            r'\*\*final_prompt\*\*:\s*(.*?)(?=\n\n|$|(?:\*\*[a-zA-Z_]+\*\*:))',
-            # Pattern for final_prompt: content  
-            r'final_prompt:\s*(.*?)(?=\n\n|$|(?:\*\*[a-zA-Z_]+\*\*:))',
-            # Pattern for # System Prompt directly
-            r'(# System Prompt.*?)(?=\n\n(?:\*\*|planning|Context|Assumptions)|$)',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, response_str, re.DOTALL | re.IGNORECASE)
-            if match:
-                extracted = match.group(1).strip()
-                print(f"✅ Extracted final_prompt using pattern: {pattern[:50]}...")
-                print(f"📝 Extracted content (first 200 chars): {extracted[:200]}")
-                
-                # Clean up the extracted content
-                # Remove any leading/trailing whitespace and ensure it starts with # System Prompt
-                if not extracted.startswith('# System Prompt'):
-                    # If it doesn't start with the header, add it
-                    if extracted.startswith('System Prompt'):
-                        extracted = '# ' + extracted
-                    elif 'System Prompt' in extracted:
-                        # Find the System Prompt section
-                        system_prompt_match = re.search(r'(# System Prompt.*)', extracted, re.DOTALL)
-                        if system_prompt_match:
-                            extracted = system_prompt_match.group(1)
-                
-                return extracted
-        
-        # If no pattern matches, return the whole response but try to clean it
-        print("⚠️ No specific pattern matched, returning cleaned full response")
-        return clean_response_for_prompt(response_str)
-        
-    except Exception as e:
-        print(f"❌ Error extracting final prompt: {e}")
-        return str(response_text)
+def generation_cache_key(generation_request, model_provider, model, reasoning_effort, auto_generate_formats=False):
+    """
+    Content-addressed key for a generation. `generation_request` holds the template
+    and the user-supplied values, so it covers industry, usecase, region, tasks,
+    links, document summary and input/output formats. Cached domain research is
+    left out, so a repeat of a request that stored research gets the same key.
+    """
+    return make_cache_key("generate_prompt", generation_request["instructions"] or "", generation_request["request_input"], model_provider, model, reasoning_effort, bool(auto_generate_formats))
+
+def generation_call_args(generation_request):
+    """Responses API arguments for a generation request (instructions only in the prefix layout)"""
+    call_args = {"input": generation_request["input"], "tools": generation_request["tools"]}
+    if generation_request["instructions"]:
+        call_args["instructions"] = generation_request["instructions"]
+    return call_args
 
-def clean_response_for_prompt(response_text):
-    """Clean the response to make it suitable as a system prompt"""
+def lookup_domain_facts(industry, usecase, region, use_cache=True, meta=None):
+    """Fresh cached research for the domain (None when it must be searched), noting the outcome in meta"""
+    domain_facts = get_domain_facts(industry, usecase, region) if use_cache else None
+    if meta is not None:
+        meta["domain_research"] = "cached" if domain_facts else "searched"
+    if domain_facts:
+        print(f"📚 Using cached domain research for {industry} - {usecase} ({region}), skipping web search")
+    return domain_facts
+
+def usage_summary(usage):
+    """Input/cached/output token counts from a response.usage object, for logs and API responses"""
+    if usage is None:
+        return None
+    input_tokens = getattr(usage, "input_tokens", 0) or 0
+    cached = cached_tokens(usage)
+    return {
+        "input_tokens": input_tokens,
+        "cached_tokens": cached,
+        "output_tokens": getattr(usage, "output_tokens", 0) or 0,
+        "cached_ratio": round(cached / input_tokens, 3) if input_tokens else 0.0,
+    }
+
+def make_prompt_agent(industry, usecase, region="global", tasks=[], links=[], document="", input_format="", output_format="", model_provider="openai", model="gpt-5-mini-2025-08-07", reasoning_effort="medium", auto_generate_formats=False, use_cache=True, meta=None, layout=None):
+    """
+    Generate a prompt with the selected model. Identical requests are served from
+    the response cache; pass a dict as `meta` to learn whether the cache was hit,
+    the prompt's token breakdown and the provider's token usage. `layout` is
+    "inline" or "prefix" (see prompt_layout.py), PROPT_PROMPT_LAYOUT by default.
+    """
+    if meta is None:
+        meta = {}
+    layout = layout or default_layout()
+    
     try:
-        # Remove common non-prompt content
-        lines = response_text.split('\n')
-        cleaned_lines = []
-        skip_sections = ['planning', 'context', 'assumptions', 'planned vs', 'sources used']
-        
-        for line in lines:
-            line_lower = line.lower().strip()
-            if any(skip in line_lower for skip in skip_sections):
-                continue
-            if line.startswith('**') and line.endswith('**') and any(skip in line_lower for skip in skip_sections):
-                continue
-            cleaned_lines.append(line)
-        
-        return '\n'.join(cleaned_lines).strip()
+        # Auto-generated formats differ on every call, so the key uses the user-supplied ones
+        meta["tokens"] = {}
+        domain_facts = lookup_domain_facts(industry, usecase, region, use_cache, meta)
+        generation_request = build_generation_request(industry, usecase, region, tasks, links, document, input_format, output_format, model_provider, model, reasoning_effort, token_report=meta["tokens"], layout=layout, domain_facts=domain_facts)
+        
+        cache_key = generation_cache_key(generation_request, model_provider, model, reasoning_effort, auto_generate_formats)
+        cache = get_response_cache() if use_cache else None
+        if cache is not None:
+            cached_response = cache.get(cache_key)
+            if cached_response is not None:
+                print(f"⚡ Cache hit for {industry} - {usecase} ({cache_key[:12]})")
+                meta["cache"] = "hit"
+                return cached_response
+        meta["cache"] = "miss" if cache is not None else "bypass"
+        
+        # Identical requests already in flight wait for that call instead of starting their own
+        output_text, shared = get_singleflight("generate_prompt").do(
+            cache_key, _run_prompt_generation,
+            generation_request, industry, usecase, region, tasks, links, document, input_format, output_format,
+            model_provider, model, reasoning_effort, auto_generate_formats, cache, cache_key, layout, meta, domain_facts
+        )
+        if shared:
+            print(f"🔗 Coalesced with in-flight generation for {industry} - {usecase}")
+            meta["cache"] = "coalesced"
+        return output_text
         
+    except CircuitOpenError:
+        raise
     except Exception as e:
-        print(f"❌ Error cleaning response: {e}")
-        return response_text
+        print(f"❌ Error in make_prompt_agent: {str(e)}")
+        raise Exception(f"Failed to generate prompt: {str(e)}")
 
-def extract_planning_from_response(response_text):
-    """Extract planning section from the structured response"""
+def _run_prompt_generation(generation_request, industry, usecase, region, tasks, links, document, input_format, output_format, model_provider, model, reasoning_effort, auto_generate_formats, cache, cache_key, layout=INLINE, meta=None, domain_facts=None):
+    """The upstream part of make_prompt_agent - runs once per in-flight request key"""
+    if auto_generate_formats:
+        generation_request = build_generation_request(industry, usecase, region, tasks, links, document, input_format, output_format, model_provider, model, reasoning_effort, auto_generate_formats, layout=layout, domain_facts=domain_facts)
+    
+    # Choose the model to use based on provider and model selection
+    api_model = model if model_provider == "openai" else model
+    
+    # Ensure we have a valid client
+    if not client and needs_api_key():
+        raise ValueError("OpenAI client is not initialized")
+        
+    # Log the model request
+    log_model_request(
+        model=api_model,
+        prompt=generation_request["input"],
+        reasoning_effort=reasoning_effort,
+        input_tokens=estimate_tokens(generation_request["instructions"] or "") + estimate_tokens(generation_request["input"]),
+        industry=industry,
+        usecase=usecase,
+        model_provider=model_provider,
+        prompt_layout=layout
+    )
+    
+    # Make the API call
+    start_time = time.time()
     try:
-        import re
-        
-        # Look for different planning patterns
-        patterns = [
-            # Pattern for **planning**: content
-            r'\*\*planning\*\*:\s*(.*?)(?=\n\n|$|(?:\*\*[a-zA-Z_]+\*\*:))',
-            # Pattern for planning: content
-            r'planning:\s*(.*?)(?=\n\n|$|(?:\*\*[a-zA-Z_]+\*\*:))',
-            # Pattern for sources used section
-            r'planning — Sources used.*?\n(.*?)(?=\n\n|$|(?:final_prompt|Context))',
-        ]
+        response = create_response(
+            endpoint="generate_prompt",
+            model=api_model,
+            reasoning={"effort": reasoning_effort},
+            **generation_call_args(generation_request)
+        )
+        processing_time = time.time() - start_time
+        usage = usage_summary(getattr(response, "usage", None))
+        if meta is not None:
+            meta["usage"] = usage
         
-        for pattern in patterns:
-            planning_match = re.search(pattern, response_text, re.DOTALL | re.IGNORECASE)
-            if planning_match:
-                planning_content = planning_match.group(1).strip()
-                if len(planning_content) > 20:  # Only return if substantial
-                    return planning_content
+        # Log the successful response
+        log_model_response(
+            model=api_model,
+            response=response.output_text,
+            processing_time=processing_time,
+            industry=industry,
+            usecase=usecase,
+            usage=usage
+        )
+    except Exception as api_error:
+        processing_time = time.time() - start_time
+        log_model_error(
+            model=api_model,
+            error=str(api_error),
+            processing_time=processing_time,
+            industry=industry,
+            usecase=usecase
+        )
+        raise api_error
+    
+    # Validate response
+    if not response or not hasattr(response, 'output_text'):
+        raise ValueError("Invalid response from OpenAI API - missing output_text")
         
-        return "No planning information available."
+    if cache is not None and response.output_text.strip():
+        cache.set(cache_key, response.output_text, {"industry": industry, "usecase": usecase, "model": api_model})
+    if not domain_facts:
+        store_generation_research(industry, usecase, region, response.output_text)
         
-    except Exception as e:
-        print(f"⚠️ Error extracting planning: {e}")
-        return "Planning information could not be extracted."
+    # Return the response text directly - frontend will handle parsing
+    return response.output_text
 
-def extract_considerations_from_response(response_text):
-    """Extract considerations section from the structured response"""
+def stream_prompt_agent(industry, usecase, region="global", tasks=[], links=[], document="", input_format="", output_format="", model_provider="openai", model="gpt-5-mini-2025-08-07", reasoning_effort="medium", auto_generate_formats=False, use_cache=True, meta=None, layout=None):
+    """Streaming variant of make_prompt_agent - yields Responses API stream events"""
+    if meta is None:
+        meta = {}
+    layout = layout or default_layout()
+    meta["tokens"] = {}
+    domain_facts = lookup_domain_facts(industry, usecase, region, use_cache, meta)
+    generation_request = build_generation_request(industry, usecase, region, tasks, links, document, input_format, output_format, model_provider, model, reasoning_effort, token_report=meta["tokens"], layout=layout, domain_facts=domain_facts)
+    
+    cache = get_response_cache() if use_cache else None
+    cache_key = None
+    if cache is not None:
+        cache_key = generation_cache_key(generation_request, model_provider, model, reasoning_effort, auto_generate_formats)
+        cached_response = cache.get(cache_key)
+        if cached_response is not None:
+            print(f"⚡ Cache hit for {industry} - {usecase} ({cache_key[:12]})")
+            meta["cache"] = "hit"
+            # Replay the cached text as a single delta event
+            yield SimpleNamespace(type="response.output_text.delta", delta=cached_response)
+            return
+    meta["cache"] = "miss" if cache is not None else "bypass"
+    
+    if auto_generate_formats:
+        generation_request = build_generation_request(industry, usecase, region, tasks, links, document, input_format, output_format, model_provider, model, reasoning_effort, auto_generate_formats, meta["tokens"], layout, domain_facts)
+    
+    log_model_request(
+        model=model,
+        prompt=generation_request["input"],
+        reasoning_effort=reasoning_effort,
+        input_tokens=estimate_tokens(generation_request["instructions"] or "") + estimate_tokens(generation_request["input"]),
+        industry=industry,
+        usecase=usecase,
+        model_provider=model_provider,
+        prompt_layout=layout,
+        stream=True
+    )
+    
+    start_time = time.time()
+    output_parts = []
     try:
-        import re
-        
-        # Look for considerations: """ content """
-        considerations_match = re.search(r'considerations:\s*"""(.*?)"""', response_text, re.DOTALL)
-        if considerations_match:
-            return considerations_match.group(1).strip()
-        
-        return "No considerations information available."
-        
-    except Exception as e:
-        print(f"⚠️ Error extracting considerations: {e}")
-        return "Considerations information could not be extracted."
+        for event in stream_response(
+            endpoint="generate_prompt",
+            model=model,
+            reasoning={"effort": reasoning_effort},
+            **generation_call_args(generation_request)
+        ):
+            if event.type == "response.output_text.delta":
+                output_parts.append(event.delta)
+            elif event.type == "response.completed":
+                meta["usage"] = usage_summary(getattr(event.response, "usage", None))
+            yield event
+    except Exception as api_error:
+        log_model_error(
+            model=model,
+            error=str(api_error),
+            processing_time=time.time() - start_time,
+            industry=industry,
+            usecase=usecase
+        )
+        raise
+    
+    output_text = "".join(output_parts)
+    log_model_response(
+        model=model,
+        response=output_text,
+        processing_time=time.time() - start_time,
+        industry=industry,
+        usecase=usecase,
+        usage=meta.get("usage"),
+        stream=True
+    )
+    
+    if cache is not None and output_text.strip():
+        cache.set(cache_key, output_text, {"industry": industry, "usecase": usecase, "model": model})
+    if not domain_facts:
+        store_generation_research(industry, usecase, region, output_text)
+
+def store_generation_research(industry, usecase, region, response_text):
+    """Keep the sources a generation found with web search (its planning section) for later requests"""
+    planning_content = parse_response(response_text).planning
+    if not planning_content:
+        return
+    store_domain_facts(industry, usecase, region, planning_content, "generate_prompt")
+
+PROMPT_EDITING_MODEL = "gpt-5-mini-2025-08-07"
+# Whole-pipeline limit in seconds - two sequential agent calls at their per-call deadline
+PROMPT_EDITING_TIMEOUT = float(os.getenv("PROPT_PIPELINE_TIMEOUT", 360))
+# How long a handler waits for the pipeline coroutine - a backstop behind the pipeline's own timeout
+PIPELINE_WAIT_TIMEOUT = PROMPT_EDITING_TIMEOUT + 30
+# Agent calls that run one after another (extract, critique, revise), for the latency SLO
+PIPELINE_SEQUENTIAL_CALLS = 3
 
+# Opt-in multi-round critique/revise: request values are capped by these server limits
+REFINE_MAX_ROUNDS = int(os.getenv("PROPT_REFINE_MAX_ROUNDS", 3))
+REFINE_TOKEN_BUDGET = int(os.getenv("PROPT_REFINE_TOKEN_BUDGET", 60000))
+REFINE_TIME_BUDGET = float(os.getenv("PROPT_REFINE_TIME_BUDGET", 240))
 
+# Agent graphs are memoized per (industry, usecase, effort) and template version
+AGENT_GRAPH_CACHE_SIZE = int(os.getenv("PROPT_AGENT_GRAPH_CACHE_SIZE", 128))
+PROMPT_EDITING_TEMPLATES = ("extraction_prompt.md", "critique_system.md", "revise_prompt.md", "main_prompt.md")
+GENERATION_PLACEHOLDERS = ("industry", "usecase", "region", "tasks", "links", "document", "input_format", "output_format")
 
+# Templates may only use placeholders their callers fill in - a typo fails at startup, not mid-request
+get_template_registry().validate({
+    "generate_prompt.md": GENERATION_PLACEHOLDERS,
+    "generate_prompt_gpt4.md": GENERATION_PLACEHOLDERS,
+    **{name: ("industry", "usecase") for name in PROMPT_EDITING_TEMPLATES},
+})
+
+def prompt_templates_version():
+    """File versions of the prompt-editing templates (re-checked by the registry at most every few seconds)"""
+    return get_template_registry().version(PROMPT_EDITING_TEMPLATES)
+
+def refinement_options(data):
+    """max_rounds / token_budget / time_budget of a request, clamped to the server limits (ValueError if malformed)"""
+    return {
+        "max_rounds": max(1, min(int(data.get('max_rounds') or 1), REFINE_MAX_ROUNDS)),
+        "token_budget": min(int(data.get('token_budget') or REFINE_TOKEN_BUDGET), REFINE_TOKEN_BUDGET),
+        "time_budget": min(float(data.get('time_budget') or REFINE_TIME_BUDGET), REFINE_TIME_BUDGET),
+    }
 
-def make_prompt_editing_agent(industry, usecase, reasoning_effort="medium"):
-    # Load prompt templates with templating
-    original_prompt   = load_prompt(os.path.join(os.path.dirname(__file__), "prompts", "original_prompt.md"), industry=industry, usecase=usecase)
-    extraction_prompt = load_prompt(os.path.join(os.path.dirname(__file__), "prompts", "extraction_prompt.md"), industry=industry, usecase=usecase)
-    critique_prompt   = load_prompt(os.path.join(os.path.dirname(__file__), "prompts", "critique_system.md"), industry=industry, usecase=usecase)
-    critique_user     = load_prompt(os.path.join(os.path.dirname(__file__), "prompts", "critique_user.md"), industry=industry, usecase=usecase)
-    revise_prompt     = load_prompt(os.path.join(os.path.dirname(__file__), "prompts", "revise_prompt.md"), industry=industry, usecase=usecase)
-    main_prompt       = load_prompt(os.path.join(os.path.dirname(__file__), "prompts", "main_prompt.md"), industry=industry, usecase=usecase)
+def make_prompt_editing_agent(industry, usecase, reasoning_effort="medium", domain_facts=None, refine=None):
+    """
+    Get the prompt-editing agent graph from the LRU cache (rebuilt when a
+    template changes). With cached `domain_facts` the search stage is skipped
+    and no agent attaches the web search tool. `refine` (see refinement_options)
+    enables further critique/revise rounds.
+    """
+    agent = _build_prompt_editing_agent(industry, usecase, reasoning_effort, not domain_facts, prompt_templates_version())
+    multi_round = refine is not None and refine["max_rounds"] > 1
+    if domain_facts or multi_round:
+        # Cached graphs are shared between requests - never mutate them
+        agent = copy.copy(agent)
+        if domain_facts:
+            agent.known_facts = domain_facts
+        if multi_round:
+            agent.max_rounds = refine["max_rounds"]
+            agent.token_budget = refine["token_budget"]
+            agent.time_budget = refine["time_budget"]
+    return agent
 
-    MODEL = "gpt-5-mini-2025-08-07"
+@lru_cache(maxsize=AGENT_GRAPH_CACHE_SIZE)
+def _build_prompt_editing_agent(industry, usecase, reasoning_effort, web_search, templates_version):
+    """Build the agent graph; `templates_version` only takes part in the cache key"""
+    # Render the precompiled prompt templates
+    templates = get_template_registry()
+    extraction_prompt = templates.render("extraction_prompt.md", industry=industry, usecase=usecase)
+    critique_prompt   = templates.render("critique_system.md", industry=industry, usecase=usecase)
+    revise_prompt     = templates.render("revise_prompt.md", industry=industry, usecase=usecase)
+    main_prompt       = templates.render("main_prompt.md", industry=industry, usecase=usecase)
+
+    MODEL = PROMPT_EDITING_MODEL
 
     search_agent = Agent(
         name="search_agent",
@@ -558,21 +749,26 @@ def make_prompt_editing_agent(industry, usecase, reasoning_effort="medium"):
         model=MODEL,
         instructions=revise_prompt,
         output_type=RevisedPromptOutput,
-        reasoning_effort=reasoning_effort
+        reasoning_effort=reasoning_effort,
+        web_search=web_search
     )
     critique_agent = Agent(
         name="critique_agent",
         model=MODEL,
         instructions=critique_prompt,
         output_type=CritiqueIssues,
-        reasoning_effort=reasoning_effort
+        reasoning_effort=reasoning_effort,
+        web_search=web_search,
+        # Unchanged instruction blocks reuse their issues from earlier refinements
+        block_cache=CritiqueBlockCache(critique_prompt, MODEL, reasoning_effort)
     )
     extract_agent = Agent(
         name="extract_agent",
         model=MODEL,
         instructions=extraction_prompt,
         output_type=InstructionList,
-        reasoning_effort=reasoning_effort
+        reasoning_effort=reasoning_effort,
+        web_search=web_search
     )
     prmopt_editing_agent = Agent(
         name="prmopt_editing_agent",
@@ -580,6 +776,7 @@ def make_prompt_editing_agent(industry, usecase, reasoning_effort="medium"):
         instructions=main_prompt,
         output_type=RevisedPromptOutput,
         reasoning_effort=reasoning_effort,
+        web_search=web_search,
         tools=[
             search_agent.as_tool(
                 tool_name="search_agent",
@@ -601,8 +798,23 @@ def make_prompt_editing_agent(industry, usecase, reasoning_effort="medium"):
     )
     return prmopt_editing_agent
 
-async def process_prompt_with_agent_thinking(prompt_content: str, industry: str, usecase: str, reasoning_effort: str = "medium"):
-    """Process prompt using the 5-step agent pipeline with sequential thinking"""
+async def process_prompt_with_agent_thinking(prompt_content: str, industry: str, usecase: str, reasoning_effort: str = "medium", on_stage=None, run_id=None, refine=None):
+    """
+    Process prompt using the 5-step agent pipeline with sequential thinking.
+    Concurrent identical requests share a single pipeline run. Passing the
+    run_id of a failed run resumes it from its checkpointed stages.
+    """
+    flight_key = make_cache_key("process_prompt", prompt_content, industry, usecase, reasoning_effort, refine)
+    result, shared = await get_singleflight("process_prompt").do_async(
+        flight_key, _run_agent_pipeline, prompt_content, industry, usecase, reasoning_effort, on_stage, run_id or new_run_id(), refine
+    )
+    if shared:
+        print(f"🔗 Coalesced with in-flight pipeline run for {industry} - {usecase}")
+        return {**result, "coalesced": True}
+    return result
+
+async def _run_agent_pipeline(prompt_content: str, industry: str, usecase: str, reasoning_effort: str, on_stage, run_id: str, refine=None):
+    """Run the agent pipeline once (called through the process_prompt single-flight group)"""
     try:
         print(f"🚀 Starting 5-step agent pipeline with sequential thinking for {industry} - {usecase}")
         
@@ -611,11 +823,38 @@ async def process_prompt_with_agent_thinking(prompt_content: str, industry: str,
         
         start_time = time.time()
         
-        # Create the main agent with industry and usecase context
-        main_agent = make_prompt_editing_agent(industry, usecase, reasoning_effort)
+        # Reuse fresh domain research instead of running the search stage
+        domain_facts = get_domain_facts(industry, usecase)
+        if domain_facts:
+            print(f"📚 Using cached domain research for {industry} - {usecase}, skipping search_agent")
         
-        # Execute the main agent with sequential thinking
-        result = await Runner.run(main_agent, prompt_content)
+        # Create the main agent with industry and usecase context
+        main_agent = make_prompt_editing_agent(industry, usecase, reasoning_effort, domain_facts, refine)
+        
+        # Execute the main agent with sequential thinking, checkpointing each stage under the run ID.
+        # The effort is left out of the fingerprint: the latency controller may lower it on a retry.
+        checkpoints = PipelineCheckpoints(run_id, prompt_content, industry, usecase)
+        with span("agent_pipeline", industry=industry, usecase=usecase, run_id=run_id,
+                  domain_research="cached" if domain_facts else "searched"):
+            result = await Runner.run(main_agent, prompt_content, on_stage, timeout=PROMPT_EDITING_TIMEOUT, checkpoints=checkpoints)
+        if "search" in result.artifacts:
+            store_domain_facts(industry, usecase, "global", result.artifacts["search"], "search_agent")
+        resumed_stages = [stage for stage, timing in result.timings.items() if timing.get("resumed")]
+        
+        if result.error:
+            completed_stages = [stage for stage, timing in result.timings.items() if stage != "total" and not timing.get("error")]
+            log_agent_pipeline_end("prompt_editing_agent", False, time.time() - start_time)
+            print(f"❌ Agent pipeline failed, retry with run_id {run_id} to resume")
+            return {
+                "success": False,
+                "error": result.content,
+                "run_id": run_id,
+                "resumable": True,
+                "completed_stages": completed_stages,
+                "original_prompt": prompt_content,
+                "industry": industry,
+                "usecase": usecase
+            }
         
         # Extract the final processed prompt from the result
         if hasattr(result, 'final_output'):
@@ -637,7 +876,15 @@ async def process_prompt_with_agent_thinking(prompt_content: str, industry: str,
             "result": final_prompt,  # Fallback for compatibility
             "industry": industry,
             "usecase": usecase,
-            "method": "5-step agent pipeline with sequential thinking"
+            "method": "5-step agent pipeline with sequential thinking",
+            "domain_research": "cached" if domain_facts else "searched",
+            "stage_timings": result.timings,
+            # revised is False when critique found nothing to act on and the prompt came back unchanged
+            "revised": not result.skipped,
+            "critique": json.loads(result.artifacts["critique"])["issues"] if "critique" in result.artifacts else [],
+            "refinement": result.refinement,
+            "run_id": run_id,
+            "resumed_stages": resumed_stages
         }
         
     except Exception as e:
@@ -648,11 +895,124 @@ async def process_prompt_with_agent_thinking(prompt_content: str, industry: str,
         return {
             "success": False,
             "error": str(e),
+            "run_id": run_id,
             "original_prompt": prompt_content,
             "industry": industry,
             "usecase": usecase
         }
 
+# Batch generation limits (override with PROPT_BATCH_MAX_ITEMS / PROPT_BATCH_CONCURRENCY)
+BATCH_MAX_ITEMS = 100
+BATCH_CONCURRENCY = 4
+
+def parse_generation_spec(data):
+    """Read the generation parameters from a request body, applying the API defaults"""
+    return {
+        "industry": data.get('industry', 'Finance'),
+        "usecase": data.get('use_case', 'ex: Stock Research'),
+        "region": data.get('region', 'global'),
+        "context": data.get('context', ''),
+        "document_content": data.get('document_content', ''),  # New: document content
+        "tasks": data.get('tasks', []),  # Array of tasks
+        "links": data.get('links', []),  # Array of links/sources
+        "input_format": data.get('input_format', ''),  # JSON input format
+        "output_format": data.get('output_format', ''),  # JSON output format
+        "model_provider": data.get('model_provider', 'openai'),
+        "model": data.get('model', 'gpt-5-mini-2025-08-07'),
+        "reasoning_effort": data.get('reasoning_effort', 'medium'),
+        "auto_generate_formats": data.get('auto_generate_formats', False),  # Optional enhanced feature
+        "use_cache": not data.get('no_cache', False),  # Set no_cache to force a fresh generation
+        "adaptive": data.get('adaptive', True),  # Set adaptive to false to pin the requested model/effort
+        "prompt_layout": data.get('prompt_layout') if data.get('prompt_layout') in LAYOUTS else default_layout(),  # "prefix" enables provider prompt caching
+    }
+
+def apply_latency_slo(spec, endpoint="generate_prompt"):
+    """
+    Swap in a cheaper model/effort when the requested one would miss the endpoint's
+    latency SLO. Updates spec in place and returns the applied degradation (or None).
+    """
+    if not spec.get('adaptive', True) or spec['model_provider'] != 'openai':
+        return None
+    web_search = not (spec['use_cache'] and get_domain_facts(spec['industry'], spec['usecase'], spec['region']))
+    decision = get_latency_controller().choose(endpoint, spec['model'], spec['reasoning_effort'], web_search=web_search)
+    if not decision["degraded"]:
+        return None
+    spec['model'] = decision["model"]
+    spec['reasoning_effort'] = decision["reasoning_effort"]
+    return decision
+
+def pipeline_latency_slo(data, industry, usecase):
+    """
+    Lower the reasoning effort of a refinement when the agent calls at the requested
+    effort would miss the process_prompt SLO (the graph's model stays fixed).
+    Returns (effort to use, the applied degradation or None).
+    """
+    effort = data.get('reasoning_effort', 'medium')
+    if not data.get('adaptive', True):
+        return effort, None
+    web_search = not get_domain_facts(industry, usecase)
+    decision = get_latency_controller().choose(
+        "process_prompt", PROMPT_EDITING_MODEL, effort, web_search=web_search,
+        sequential_calls=PIPELINE_SEQUENTIAL_CALLS, kind="agent", degrade_model=False
+    )
+    return decision["reasoning_effort"], decision if decision["degraded"] else None
+
+def run_generation(spec, degradation=None, on_stage=None):
+    """
+    Generate one prompt from a parsed spec and return the /api/generate-prompt
+    response body. Raises on failure (CircuitOpenError while the provider is down).
+    `on_stage` is called with the name of each step as it starts.
+    """
+    if on_stage is None:
+        on_stage = lambda stage: None
+    
+    # Fail fast while the provider is known to be down
+    check_circuit(spec['model'])
+    
+    # Summarize document if provided
+    document_summary = ""
+    if spec['document_content']:
+        on_stage("summarizing_document")
+        document_summary = summarize_document(spec['document_content'], spec['reasoning_effort'])
+    
+    # Generate prompt using the selected model and provider
+    on_stage("generating")
+    generation_meta = {}
+    with span("generate", model=spec['model'], reasoning_effort=spec['reasoning_effort'], layout=spec['prompt_layout']) as generate_span:
+        generated_response = make_prompt_agent(
+            spec['industry'], spec['usecase'], spec['region'], spec['tasks'], spec['links'],
+            document_summary, spec['input_format'], spec['output_format'],
+            spec['model_provider'], spec['model'], spec['reasoning_effort'], spec['auto_generate_formats'],
+            spec['use_cache'], generation_meta, spec['prompt_layout']
+        )
+        generate_span.set(cache=generation_meta.get("cache"), domain_research=generation_meta.get("domain_research"))
+    
+    # Split the response into its planning and final_prompt sections
+    on_stage("extracting")
+    parsed = parse_response(generated_response)
+    print(f"📋 Response: {len(str(generated_response))} chars, final prompt {len(parsed.final_prompt)}, planning {len(parsed.planning)}, {len(parsed.sources)} source(s)")
+
+    # Include planning_content in the API response
+    return {
+        "success": True,
+        "final_prompt": parsed.final_prompt,
+        "planning_content": parsed.planning or NO_PLANNING,
+        "sources": parsed.sources,
+        "generated_prompt": parsed.final_prompt,  # Fallback for compatibility
+        "industry": spec['industry'],
+        "usecase": spec['usecase'],
+        "context": spec['context'],
+        "model_provider": spec['model_provider'],
+        "model": spec['model'],
+        "method": f"{spec['model']} with sequential thinking",
+        "cached": generation_meta.get("cache") == "hit",
+        "coalesced": generation_meta.get("cache") == "coalesced",
+        "degradation": degradation,
+        "tokens": generation_meta.get("tokens"),
+        "usage": generation_meta.get("usage"),
+        "domain_research": generation_meta.get("domain_research")
+    }
+
 # -----------------------------------
 # API Routes
 # -----------------------------------
@@ -698,19 +1058,22 @@ def generate_prompt_api():
                 "attempts_used": current_attempts
             }), 429
             
-        industry = data.get('industry', 'Finance')
-        usecase = data.get('use_case', 'ex: Stock Research')
-        region = data.get('region', 'global')
-        user_context = data.get('context', '')
-        document_content = data.get('document_content', '')  # New: document content
-        tasks = data.get('tasks', [])  # Array of tasks
-        links = data.get('links', [])  # Array of links/sources
-        input_format = data.get('input_format', '')  # JSON input format
-        output_format = data.get('output_format', '')  # JSON output format
-        model_provider = data.get('model_provider', 'openai')
-        model = data.get('model', 'gpt-5-mini-2025-08-07')
-        reasoning_effort = data.get('reasoning_effort', 'medium')
-        auto_generate_formats = data.get('auto_generate_formats', False)  # Optional enhanced feature
+        spec = parse_generation_spec(data)
+        degradation = apply_latency_slo(spec)
+        industry = spec['industry']
+        usecase = spec['usecase']
+        region = spec['region']
+        user_context = spec['context']
+        document_content = spec['document_content']
+        tasks = spec['tasks']
+        links = spec['links']
+        input_format = spec['input_format']
+        output_format = spec['output_format']
+        model_provider = spec['model_provider']
+        model = spec['model']
+        reasoning_effort = spec['reasoning_effort']
+        auto_generate_formats = spec['auto_generate_formats']
+        use_cache = spec['use_cache']
         
         print(f"🎨 Generating prompt for {industry} - {usecase} using {model_provider}/{model} with {reasoning_effort} reasoning")
         print(f"⏱️ Expected processing time: 60-90 seconds (GPT-5 with web search)")
@@ -722,43 +1085,9 @@ def generate_prompt_api():
         }
         
         try:
-            # Summarize document if provided
-            document_summary = ""
-            if document_content:
-                document_summary = summarize_document(document_content, reasoning_effort)
-            
-            # Generate prompt using the selected model and provider
-            generated_response = make_prompt_agent(industry, usecase, region, tasks, links, document_summary, input_format, output_format, model_provider, model, reasoning_effort, auto_generate_formats)
-            
-            # Debug: log the response to understand its structure
-            print(f"📋 FULL AI RESPONSE:")
-            print("="*50)
-            print(str(generated_response))
-            print("="*50)
-            print(f"📋 Response type: {type(generated_response)}")
-            print(f"📋 Response length: {len(str(generated_response))}")
-            
-            # Extract the clean final prompt from the response
-            final_prompt_only = extract_final_prompt_from_response(str(generated_response))
-            
-            # Extract planning_content from the final generated_response
-            planning_content = extract_planning_from_response(str(generated_response))
-
-            # Include planning_content in the API response
-            return jsonify({
-                "success": True,
-                "final_prompt": final_prompt_only,
-                "planning_content": planning_content,
-                # Remove considerations_content if not defined
-                # "considerations_content": considerations_content,
-                "generated_prompt": final_prompt_only,  # Fallback for compatibility
-                "industry": industry,
-                "usecase": usecase,
-                "context": user_context,
-                "model_provider": model_provider,
-                "model": model,
-                "method": f"{model} with sequential thinking"
-            })
+            return jsonify(run_generation(spec, degradation))
+        except CircuitOpenError:
+            raise
         except Exception as agent_error:
             print(f"❌ Error in make_prompt_agent: {agent_error}")
             return jsonify({
@@ -769,30 +1098,307 @@ def generate_prompt_api():
                 "usecase": usecase
             }), 500
         
-    except Exception as parse_error:
-            print(f"⚠️ Could not parse structured response: {parse_error}")
-            print(f"🔍 FULL RESPONSE FOR DEBUGGING:")
-            print(f"Response type: {type(generated_response)}")
-            print(f"Response length: {len(str(generated_response)) if generated_response else 0}")
-            print(f"Response content: {repr(str(generated_response)[:1000])}")
-            print("="*80)
-            return jsonify({
-                "success": True,
-                "generated_prompt": str(generated_response) if generated_response else "Error generating prompt",
-                "industry": industry,
-                "usecase": usecase,
-                "context": user_context,
-                "model_provider": model_provider,
-                "model": model,
-                "method": f"{model} (fallback)"
-            })
-        
+    except CircuitOpenError:
+        raise
     except Exception as e:
         return jsonify({
             "success": False,
             "error": f"API error: {str(e)}"
         }), 500
 
+@app.route('/api/generate-prompt/stream', methods=['POST', 'OPTIONS'])
+def generate_prompt_stream_api():
+    """
+    Streaming variant of /api/generate-prompt using Server-Sent Events.
+    
+    Events: `start`, `status`, `delta` ({section, text}) as the model writes,
+    then `done` with the same fields as the non-streaming response, or `error`.
+    Keep-alive comments are sent while the model is searching the web.
+    """
+    if request.method == 'OPTIONS':
+        response = app.make_default_options_response()
+        response.headers['Access-Control-Allow-Methods'] = 'POST'
+        response.headers['Access-Control-Allow-Headers'] = 'Content-Type'
+        response.headers['Access-Control-Allow-Origin'] = '*'
+        return response
+
+    if not request.is_json:
+        return jsonify({"error": "Request must be JSON"}), 400
+    data = request.get_json()
+    if not data:
+        return jsonify({"error": "No JSON data provided"}), 400
+
+    can_proceed, current_attempts = check_rate_limit("generate")
+    if not can_proceed:
+        return jsonify({
+            "success": False,
+            "error": "Rate limit exceeded. You have used your 2 free attempts for today. Please try again tomorrow or sign up for unlimited access.",
+            "rate_limited": True,
+            "attempts_used": current_attempts
+        }), 429
+
+    spec = parse_generation_spec(data)
+    degradation = apply_latency_slo(spec)
+    check_circuit(spec['model'])  # Fail fast with 503 before opening the stream
+    heartbeat_interval = float(os.getenv("PROPT_SSE_HEARTBEAT", DEFAULT_HEARTBEAT_INTERVAL))
+    print(f"🌊 Streaming prompt generation for {spec['industry']} - {spec['usecase']} using {spec['model_provider']}/{spec['model']}")
+
+    def generate_events():
+        yield format_sse({"industry": spec['industry'], "usecase": spec['usecase'], "model": spec['model'], "degradation": degradation}, event="start")
+        try:
+            document_summary = ""
+            if spec['document_content']:
+                yield format_sse({"stage": "summarizing_document"}, event="status")
+                # Summarize on the producer thread so keep-alives go out while it runs
+                summary = iter_call(summarize_document, spec['document_content'], spec['reasoning_effort'])
+                for item in iter_with_heartbeat(summary, heartbeat_interval):
+                    if item is HEARTBEAT:
+                        yield sse_comment()
+                    else:
+                        document_summary = item
+
+            generation_meta = {}
+            events = stream_prompt_agent(
+                spec['industry'], spec['usecase'], spec['region'], spec['tasks'], spec['links'],
+                document_summary, spec['input_format'], spec['output_format'],
+                spec['model_provider'], spec['model'], spec['reasoning_effort'], spec['auto_generate_formats'],
+                spec['use_cache'], generation_meta, spec['prompt_layout']
+            )
+            yield format_sse({"stage": "generating"}, event="status")
+
+            parser = SectionParser()
+            for event in iter_with_heartbeat(events, heartbeat_interval):
+                if event is HEARTBEAT:
+                    yield sse_comment()
+                    continue
+                if event.type == "response.web_search_call.in_progress":
+                    yield format_sse({"stage": "web_search"}, event="status")
+                elif event.type == "response.output_text.delta":
+                    for section, text in parser.feed(event.delta):
+                        yield format_sse({"section": section, "text": text}, event="delta")
+            for section, text in parser.finish():
+                yield format_sse({"section": section, "text": text}, event="delta")
+
+            # The sections were parsed as they streamed - no second pass over the text
+            parsed = parser.result()
+            yield format_sse({
+                "success": True,
+                "final_prompt": parsed.final_prompt,
+                "planning_content": parsed.planning or NO_PLANNING,
+                "sources": parsed.sources,
+                "generated_prompt": parsed.final_prompt,
+                "industry": spec['industry'],
+                "usecase": spec['usecase'],
+                "context": spec['context'],
+                "model_provider": spec['model_provider'],
+                "model": spec['model'],
+                "method": f"{spec['model']} with sequential thinking (streamed)",
+                "cached": generation_meta.get("cache") == "hit",
+                "degradation": degradation,
+                "tokens": generation_meta.get("tokens"),
+                "usage": generation_meta.get("usage"),
+                "domain_research": generation_meta.get("domain_research")
+            }, event="done")
+        except CircuitOpenError as e:
+            print(f"🔌 Stream aborted, circuit open: {e}")
+            yield format_sse({"success": False, "error": str(e), "error_type": "provider_unavailable", "retry_after": e.retry_after}, event="error")
+        except Exception as e:
+            print(f"❌ Error streaming prompt generation: {e}")
+            yield format_sse({"success": False, "error": str(e), "error_type": "agent_error"}, event="error")
+
+    response = Response(stream_with_context(generate_events()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Disable proxy buffering (nginx)
+    return response
+
+@app.route('/api/generate-prompt/batch', methods=['POST', 'OPTIONS'])
+def generate_prompt_batch_api():
+    """
+    Generate prompts for many specs at once, streamed back as newline-delimited JSON.
+    
+    Body: {"items": [spec, ...], "defaults": {...}, "concurrency": N}. Each item uses
+    the /api/generate-prompt fields, on top of `defaults`. One `result` line is
+    written per item as soon as it finishes (with its `index` in the request), a
+    failed item doesn't stop the others, and a final `done` line has the totals.
+    """
+    if request.method == 'OPTIONS':
+        response = app.make_default_options_response()
+        response.headers['Access-Control-Allow-Methods'] = 'POST'
+        response.headers['Access-Control-Allow-Headers'] = 'Content-Type'
+        response.headers['Access-Control-Allow-Origin'] = '*'
+        return response
+
+    if not request.is_json:
+        return jsonify({"error": "Request must be JSON"}), 400
+    data = request.get_json()
+    items = data.get('items') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "items must be a non-empty list of generation specs"}), 400
+    max_items = int(os.getenv("PROPT_BATCH_MAX_ITEMS", BATCH_MAX_ITEMS))
+    if len(items) > max_items:
+        return jsonify({"error": f"A batch can contain at most {max_items} items"}), 400
+    max_concurrency = int(os.getenv("PROPT_BATCH_CONCURRENCY", BATCH_CONCURRENCY))
+    try:
+        requested_concurrency = int(data['concurrency']) if data.get('concurrency') is not None else max_concurrency
+    except (TypeError, ValueError):
+        return jsonify({"error": "concurrency must be a number"}), 400
+
+    can_proceed, current_attempts = check_rate_limit("generate")
+    if not can_proceed:
+        return jsonify({
+            "success": False,
+            "error": "Rate limit exceeded. You have used your 2 free attempts for today. Please try again tomorrow or sign up for unlimited access.",
+            "rate_limited": True,
+            "attempts_used": current_attempts
+        }), 429
+
+    defaults = data.get('defaults') or {}
+    specs = [parse_generation_spec({**defaults, **item}) if isinstance(item, dict) else None for item in items]
+    concurrency = max(1, min(requested_concurrency, max_concurrency, len(specs)))
+    heartbeat_interval = float(os.getenv("PROPT_SSE_HEARTBEAT", DEFAULT_HEARTBEAT_INTERVAL))
+    print(f"📦 Batch generation of {len(specs)} prompts with concurrency {concurrency}")
+
+    def run_item(index, spec):
+        if spec is None:
+            return {"event": "result", "index": index, "success": False, "error": "Each item must be a JSON object", "error_type": "invalid_item"}
+        started = time.time()
+        try:
+            with span("batch.item", index=index):
+                result = run_generation(spec, apply_latency_slo(spec))
+        except CircuitOpenError as e:
+            result = {"success": False, "error": str(e), "error_type": "provider_unavailable", "retry_after": e.retry_after}
+        except Exception as e:
+            print(f"❌ Batch item {index} failed: {e}")
+            result = {"success": False, "error": str(e), "error_type": "agent_error",
+                      "industry": spec['industry'], "usecase": spec['usecase']}
+        return {"event": "result", "index": index, "duration": round(time.time() - started, 3), **result}
+
+    def generate_lines():
+        started = time.time()
+        succeeded = 0
+        pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch")
+        try:
+            # Each item runs in a copy of the request context so its spans join the request's trace
+            futures = [pool.submit(contextvars.copy_context().run, run_item, index, spec) for index, spec in enumerate(specs)]
+            for item in iter_with_heartbeat((future.result() for future in as_completed(futures)), heartbeat_interval):
+                if item is HEARTBEAT:
+                    yield json.dumps({"event": "heartbeat"}) + "\n"
+                    continue
+                succeeded += 1 if item["success"] else 0
+                yield json.dumps(item) + "\n"
+            yield json.dumps({
+                "event": "done",
+                "total": len(specs),
+                "succeeded": succeeded,
+                "failed": len(specs) - succeeded,
+                "concurrency": concurrency,
+                "wall_time": round(time.time() - started, 3)
+            }) + "\n"
+        finally:
+            # Client went away or we're done - don't start items nobody will read
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    response = Response(stream_with_context(generate_lines()), mimetype='application/x-ndjson')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Disable proxy buffering (nginx)
+    return response
+
+# -----------------------------------
+# Background jobs
+# -----------------------------------
+def run_generation_job(params, set_stage):
+    """Job handler for `generate_prompt` - same fields as /api/generate-prompt"""
+    with trace("job generate_prompt") as root:
+        spec = parse_generation_spec(params)
+        return {**run_generation(spec, apply_latency_slo(spec), on_stage=set_stage), "trace_id": root.trace_id}
+
+def run_refinement_job(params, set_stage):
+    """Job handler for `process_prompt` - same fields as /api/process-prompt"""
+    with trace("job process_prompt") as root:
+        set_stage("agent_pipeline")
+        industry = params.get('industry', 'Finance')
+        usecase = params.get('use_case', 'ex: Stock Research')
+        reasoning_effort, degradation = pipeline_latency_slo(params, industry, usecase)
+        result = run_async(process_prompt_with_agent_thinking(
+            params['content'],
+            industry,
+            usecase,
+            reasoning_effort,
+            on_stage=set_stage,
+            run_id=params.get('run_id'),
+            refine=refinement_options(params)
+        ), timeout=PIPELINE_WAIT_TIMEOUT)
+        if not result.get("success"):
+            # Fail the job like a failed generation; a requeued attempt resumes from params['run_id']
+            raise RuntimeError(result.get("error") or "Agent pipeline failed")
+        return {**result, "degradation": degradation, "trace_id": root.trace_id}
+
+try:
+    job_queue = get_job_queue()
+    job_queue.register("generate_prompt", run_generation_job)
+    job_queue.register("process_prompt", run_refinement_job)
+    job_queue.start()
+except (OSError, sqlite3.Error) as e:
+    # e.g. read-only filesystem on serverless hosts - point PROPT_JOBS_DB at a writable path
+    print(f"⚠️ Job queue unavailable: {e}")
+    job_queue = None
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """
+    Queue a generation (`generate_prompt`) or refinement (`process_prompt`) to run
+    in the background. Body: {"type": ..., "params": {...}}. Returns 202 with the
+    job ID; poll /api/jobs/<id> for its stage and result.
+    """
+    if job_queue is None:
+        return jsonify({"success": False, "error": "Job queue is not available"}), 503
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({"error": "No JSON data provided"}), 400
+    
+    job_type = data.get('type')
+    params = data.get('params') or {}
+    if job_type not in job_queue.kinds:
+        return jsonify({"error": f"type must be one of {job_queue.kinds}"}), 400
+    if job_type == "process_prompt" and not str(params.get('content', '')).strip():
+        return jsonify({"error": "Prompt content is required"}), 400
+    if job_type == "process_prompt":
+        try:
+            refinement_options(params)
+        except (TypeError, ValueError):
+            return jsonify({"error": "max_rounds, token_budget and time_budget must be numbers"}), 400
+        # A requeued job resumes from the stages its earlier attempt checkpointed
+        params.setdefault('run_id', new_run_id())
+    
+    can_proceed, current_attempts = check_rate_limit("generate")
+    if not can_proceed:
+        return jsonify({
+            "success": False,
+            "error": "Rate limit exceeded. You have used your 2 free attempts for today. Please try again tomorrow or sign up for unlimited access.",
+            "rate_limited": True,
+            "attempts_used": current_attempts
+        }), 429
+    
+    job_id = job_queue.submit(job_type, params)
+    print(f"📥 Queued {job_type} job {job_id}")
+    response = jsonify({"success": True, **job_to_dict(job_queue.store.get(job_id)), "status_url": f"/api/jobs/{job_id}"})
+    response.status_code = 202
+    response.headers['Location'] = f"/api/jobs/{job_id}"
+    return response
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    Current state of a job: status, pipeline stage, queue position and, once
+    finished, the result (same shape as the synchronous endpoint) or the error
+    """
+    if job_queue is None:
+        return jsonify({"success": False, "error": "Job queue is not available"}), 503
+    job = job_queue.store.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found", "job_id": job_id}), 404
+    return jsonify({"success": True, **job_to_dict(job)})
+
 @app.route('/api/process-prompt', methods=['POST'])
 def process_prompt_api():
     """
@@ -813,12 +1419,27 @@ def process_prompt_api():
             
         print(f"🔄 Processing prompt through 5-step pipeline for {industry} - {usecase}")
         
+        # Fail fast while the provider is known to be down
+        check_circuit(PROMPT_EDITING_MODEL)
+        
         # Run the async processing function with sequential thinking
-        reasoning_effort = data.get('reasoning_effort', 'medium')
-        result = asyncio.run(process_prompt_with_agent_thinking(prompt_content, industry, usecase, reasoning_effort))
+        reasoning_effort, degradation = pipeline_latency_slo(data, industry, usecase)
+        try:
+            refine = refinement_options(data)
+        except (TypeError, ValueError):
+            return jsonify({"error": "max_rounds, token_budget and time_budget must be numbers"}), 400
+        # The pipeline runs on the shared event loop; cancelled if it outlives the wait
+        result = run_async(
+            process_prompt_with_agent_thinking(prompt_content, industry, usecase, reasoning_effort, run_id=data.get('run_id'), refine=refine),
+            timeout=PIPELINE_WAIT_TIMEOUT
+        )
         
-        return jsonify(result)
+        return jsonify({**result, "degradation": degradation})
         
+    except CircuitOpenError:
+        raise
+    except TimeoutError as e:
+        return jsonify({"success": False, "error": str(e)}), 504
     except Exception as e:
         return jsonify({
             "success": False,
@@ -1016,6 +1637,9 @@ def list_all_prompts():
     except Exception as e:
         return jsonify({"error": f"Error listing prompts: {str(e)}"}), 500
 
+# Industry/use case detection needs far less of the document than summarization
+ANALYSIS_DOCUMENT_TOKEN_BUDGET = 1500
+
 @app.route('/api/analyze-document', methods=['POST'])
 def analyze_document():
     """
@@ -1043,60 +1667,46 @@ def analyze_document():
         1. Identify the PRIMARY industry this document belongs to (e.g., finance, healthcare, technology, retail, etc.)
         2. Determine the SPECIFIC use case or purpose (e.g., report generation, data analysis, customer communication, etc.)
         3. Be precise and specific rather than generic
-        4. Return ONLY a JSON object with "industry" and "usecase" fields
         
         Document content:
-        {document_content[:2000]}
-        
-        Respond with ONLY this JSON format:
-        {{"industry": "specific_industry", "usecase": "specific_use_case"}}
+        {fit_document("gpt-5-mini-2025-08-07", document_content, ANALYSIS_DOCUMENT_TOKEN_BUDGET)}
         """
         
-        # Call GPT-5 for analysis
-        client = get_client()
-        response = client.responses.create(
+        # Call GPT-5 for analysis (fails fast while the provider is known to be down)
+        check_circuit("gpt-5-mini-2025-08-07")
+        response = create_response(
+            endpoint="analyze_document",
             model="gpt-5-mini-2025-08-07",
             input=analysis_prompt,
-            reasoning={"effort": reasoning_effort}
+            reasoning={"effort": reasoning_effort},
+            text=text_format(DocumentAnalysis)
         )
         
-        # Parse the response
         analysis_result = response.output_text.strip()
-        
         try:
-            # Try to extract JSON from the response
-            import json
-            import re
-            
-            # Look for JSON in the response
-            json_match = re.search(r'\{.*\}', analysis_result, re.DOTALL)
-            if json_match:
-                parsed_result = json.loads(json_match.group())
-                industry = parsed_result.get('industry', '').lower()
-                usecase = parsed_result.get('usecase', '').lower()
-                
-                if industry and usecase:
-                    return jsonify({
-                        "success": True,
-                        "industry": industry,
-                        "usecase": usecase,
-                        "analysis": analysis_result
-                    })
-            
-            # Fallback if JSON parsing fails
+            analysis = parse_output(DocumentAnalysis, analysis_result)
+        except StructuredOutputError as e:
             return jsonify({
                 "success": False,
-                "error": "Could not parse industry and use case from document",
+                "error": str(e),
                 "raw_response": analysis_result
             })
-            
-        except json.JSONDecodeError:
+        
+        if not (analysis.industry.strip() and analysis.usecase.strip()):
             return jsonify({
                 "success": False,
-                "error": "Invalid JSON response from analysis",
+                "error": "Could not determine industry and use case from document",
                 "raw_response": analysis_result
             })
+        return jsonify({
+            "success": True,
+            "industry": analysis.industry.lower(),
+            "usecase": analysis.usecase.lower(),
+            "analysis": analysis_result
+        })
         
+    except CircuitOpenError:
+        raise
     except Exception as e:
         print(f"❌ Error analyzing document: {e}")
         return jsonify({
@@ -1196,15 +1806,44 @@ def view_logs():
             "error": f"Error retrieving logs: {str(e)}"
         }), 500
 
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """
+    Runtime metrics for the performance features (cache hit rates, etc.)
+    """
+    return jsonify({
+        "provider_mode": get_provider_mode(),
+        "caches": get_all_cache_stats(),
+        "agent_graphs": _build_prompt_editing_agent.cache_info()._asdict(),
+        "singleflight": get_all_singleflight_stats(),
+        "latency": get_latency_controller().stats(),
+        "resilience": get_resilience_stats(),
+        "circuits": get_all_circuit_stats(),
+        "usage": get_usage_stats(),
+        "tracing": get_tracing_stats(),
+        "event_loops": get_loop_stats(),
+        "templates": get_template_registry().stats(),
+        "timestamp": time.time()
+    })
+
 @app.route('/api/status', methods=['GET'])
 def status_check():
     """
-    Status endpoint for long-running operations
+    Status endpoint for long-running operations: what the job workers are doing
+    and how much work is in flight
     """
+    jobs = job_queue.stats() if job_queue is not None else None
+    in_flight = sum(group["in_flight"] for group in get_all_singleflight_stats().values())
+    busy = in_flight > 0 or (jobs is not None and (jobs["jobs"]["queued"] or jobs["jobs"]["running"]))
+    if jobs is not None:
+        message = f"{jobs['jobs']['running']} job(s) running, {jobs['jobs']['queued']} queued"
+    else:
+        message = "Job queue is not available"
     return jsonify({
-        "status": "processing",
-        "message": "API is processing your request. GPT-5 with web search typically takes 60-90 seconds.",
-        "estimated_time": "60-90 seconds",
+        "status": "processing" if busy else "idle",
+        "message": message,
+        "in_flight_generations": in_flight,
+        "jobs": jobs,
         "timestamp": time.time()
     })
 
@@ -1228,7 +1867,7 @@ def health_check():
 
 if __name__ == '__main__':
     # Check if OpenAI API key is set
-    if not os.getenv("OPENAI_API_KEY"):
+    if not os.getenv("OPENAI_API_KEY") and needs_api_key():
         print("❌ Please set your OPENAI_API_KEY in the .env file")
         exit(1)
     
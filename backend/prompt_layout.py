@@ -0,0 +1,44 @@
+"""
+Cache-friendly prompt layout for the generation templates
+
+The templates mention request values ({industry}, {tasks}, ...) all through the
+text, so filling them in place makes every request's prompt different from the
+first line on and the provider can never reuse a cached prefix. In the "prefix"
+layout the template becomes a static instruction block in which each
+placeholder is replaced by a stable <name> reference, and the values travel in
+a separate request block that refers to the same names.
+"""
+import os
+from functools import lru_cache
+from typing import List, Tuple
+
+from templates import Template
+
+INLINE = "inline"
+PREFIX = "prefix"
+LAYOUTS = (INLINE, PREFIX)
+
+STATIC_PREAMBLE = (
+    "Names in angle brackets such as <industry>, <usecase> or <tasks> refer to the "
+    "values of the same name in the REQUEST block of the user input. Read them from "
+    "there and use them wherever the instructions below mention them.\n\n"
+)
+
+
+def default_layout() -> str:
+    layout = os.getenv("PROPT_PROMPT_LAYOUT", INLINE).lower()
+    return layout if layout in LAYOUTS else INLINE
+
+
+@lru_cache(maxsize=32)
+def static_instructions(template: Template) -> str:
+    """The template with every placeholder replaced by <name> - identical for every request"""
+    return STATIC_PREAMBLE + template.references
+
+
+def request_block(values: List[Tuple[str, str]]) -> str:
+    """The per-request values, tagged with the names the static block refers to"""
+    parts = ["# REQUEST\n"]
+    for name, value in values:
+        parts.append(f"<{name}>\n{value}\n</{name}>\n")
+    return "\n".join(parts)
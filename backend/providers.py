@@ -0,0 +1,437 @@
+"""
+Pluggable LLM provider backends for the Responses API calls
+
+PROPT_PROVIDER selects the backend:
+- live      (default) call OpenAI through the shared pooled client
+- record    call OpenAI and save each request/response pair as a cassette file
+- replay    serve responses from cassette files, no network
+- synthetic return canned responses with configurable latency and error rate
+
+Replay and synthetic modes let /api/generate-prompt and /api/process-prompt be
+load-tested offline and deterministically.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+PROVIDER_MODES = ("live", "record", "replay", "synthetic")
+DEFAULT_CASSETTE_DIR = os.path.join(os.path.dirname(__file__), "cassettes")
+STREAM_CHUNK_CHARS = 40
+CACHE_MIN_PREFIX_TOKENS = 1024   # synthetic prefix caching mirrors the provider thresholds
+CACHE_BLOCK_TOKENS = 128
+
+SYNTHETIC_SYSTEM_PROMPT = (
+    "# System Prompt\n\n"
+    "## Role and Objective\nYou are a synthetic assistant used to exercise the Propt pipeline.\n\n"
+    "## Instructions\n- Follow the user's instructions exactly.\n- Respond concisely.\n"
+)
+# Field values for synthetic structured outputs, by property name; other strings get a placeholder
+SYNTHETIC_FIELDS: Dict[str, Any] = {
+    "industry": "technology",
+    "usecase": "synthetic load testing",
+    "value": SYNTHETIC_SYSTEM_PROMPT,
+    "input_format": {"request_id": "string", "query": "string", "context": "object"},
+    "output_format": {"result": "string", "confidence": "number", "sources": ["string"]},
+}
+
+
+class ProviderError(Exception):
+    """Base class for errors raised by non-live providers"""
+
+
+class CassetteNotFoundError(ProviderError, LookupError):
+    """Replay mode has no recorded response for this request"""
+
+
+class SyntheticTimeoutError(ProviderError, TimeoutError):
+    """Raised when a synthetic call's latency exceeds the request timeout"""
+
+
+class SyntheticProviderError(ProviderError):
+    """Injected failure from the synthetic provider"""
+
+
+class ProviderResponse:
+    """Minimal stand-in for an OpenAI Response object"""
+
+    def __init__(self, output_text: str, model: str = "", usage: Optional[Dict[str, Any]] = None, response_id: str = ""):
+        self.output_text = output_text
+        self.model = model
+        self.id = response_id
+        self.status = "completed"
+        self.usage = _to_namespace(usage) if usage else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "model": self.model,
+            "output_text": self.output_text,
+            "usage": _usage_to_dict(self.usage),
+        }
+
+
+def _to_namespace(value: Any) -> Any:
+    if isinstance(value, dict):
+        return SimpleNamespace(**{k: _to_namespace(v) for k, v in value.items()})
+    return value
+
+
+def _usage_to_dict(usage: Any) -> Optional[Dict[str, Any]]:
+    if usage is None:
+        return None
+    if hasattr(usage, "model_dump"):
+        return usage.model_dump()
+    if isinstance(usage, SimpleNamespace):
+        return {k: _usage_to_dict(v) if isinstance(v, SimpleNamespace) else v for k, v in vars(usage).items()}
+    return usage
+
+
+def _text_delta(delta: str) -> SimpleNamespace:
+    return SimpleNamespace(type="response.output_text.delta", delta=delta)
+
+
+def _chunks(text: str, size: int = STREAM_CHUNK_CHARS) -> Iterator[str]:
+    for index in range(0, len(text), size):
+        yield text[index:index + size]
+
+
+def request_fingerprint(request: Dict[str, Any]) -> str:
+    """Stable hash of a Responses API request, used as the cassette name"""
+    payload = {k: v for k, v in request.items() if k not in ("stream", "timeout")}
+    encoded = json.dumps(payload, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class LiveProvider:
+    """Calls OpenAI through the shared pooled clients in llm_client"""
+
+    mode = "live"
+
+    def create(self, **kwargs) -> Any:
+        from llm_client import get_client
+        return get_client().responses.create(**kwargs)
+
+    async def acreate(self, **kwargs) -> Any:
+        from llm_client import get_async_client
+        return await get_async_client().responses.create(**kwargs)
+
+    def stream(self, **kwargs) -> Iterator[Any]:
+        from llm_client import get_client
+        with get_client().responses.create(stream=True, **kwargs) as stream:
+            for event in stream:
+                yield event
+
+
+class CassetteStore:
+    """One JSON file per recorded request/response pair"""
+
+    def __init__(self, cassette_dir: str):
+        self.cassette_dir = cassette_dir
+
+    def path(self, fingerprint: str) -> str:
+        return os.path.join(self.cassette_dir, f"{fingerprint}.json")
+
+    def save(self, request: Dict[str, Any], response: Dict[str, Any]) -> None:
+        os.makedirs(self.cassette_dir, exist_ok=True)
+        fingerprint = request_fingerprint(request)
+        cassette = {
+            "fingerprint": fingerprint,
+            "recorded_at": time.time(),
+            "request": {k: v for k, v in request.items() if k not in ("stream", "timeout")},
+            "response": response,
+        }
+        with open(self.path(fingerprint), "w", encoding="utf-8") as f:
+            json.dump(cassette, f, ensure_ascii=False, indent=2, default=str)
+
+    def load(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        fingerprint = request_fingerprint(request)
+        try:
+            with open(self.path(fingerprint), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise CassetteNotFoundError(
+                f"No cassette for request {fingerprint[:12]} (model={request.get('model')}) in {self.cassette_dir}"
+            )
+
+    def iter_cassettes(self) -> Iterator[Dict[str, Any]]:
+        if not os.path.isdir(self.cassette_dir):
+            return
+        for file_name in sorted(os.listdir(self.cassette_dir)):
+            if file_name.endswith(".json"):
+                with open(os.path.join(self.cassette_dir, file_name), "r", encoding="utf-8") as f:
+                    yield json.load(f)
+
+
+class RecordingProvider(LiveProvider):
+    """Live calls whose request/response pairs are saved for later replay"""
+
+    mode = "record"
+
+    def __init__(self, store: CassetteStore):
+        self.store = store
+
+    def _record(self, request: Dict[str, Any], response: Any) -> None:
+        try:
+            self.store.save(request, {
+                "id": getattr(response, "id", ""),
+                "model": getattr(response, "model", request.get("model", "")),
+                "output_text": response.output_text,
+                "usage": _usage_to_dict(getattr(response, "usage", None)),
+            })
+        except (OSError, TypeError) as e:
+            print(f"⚠️ Failed to record cassette: {e}")
+
+    def create(self, **kwargs) -> Any:
+        response = super().create(**kwargs)
+        self._record(kwargs, response)
+        return response
+
+    async def acreate(self, **kwargs) -> Any:
+        response = await super().acreate(**kwargs)
+        self._record(kwargs, response)
+        return response
+
+    def stream(self, **kwargs) -> Iterator[Any]:
+        parts: List[str] = []
+        for event in super().stream(**kwargs):
+            if event.type == "response.output_text.delta":
+                parts.append(event.delta)
+            yield event
+        self._record(kwargs, ProviderResponse("".join(parts), kwargs.get("model", "")))
+
+
+class ReplayProvider:
+    """Serves recorded responses; raises CassetteNotFoundError for unknown requests"""
+
+    mode = "replay"
+
+    def __init__(self, store: CassetteStore):
+        self.store = store
+
+    def _response(self, kwargs: Dict[str, Any]) -> ProviderResponse:
+        recorded = self.store.load(kwargs)["response"]
+        return ProviderResponse(recorded["output_text"], recorded.get("model", ""), recorded.get("usage"), recorded.get("id", ""))
+
+    def create(self, **kwargs) -> ProviderResponse:
+        return self._response(kwargs)
+
+    async def acreate(self, **kwargs) -> ProviderResponse:
+        return self._response(kwargs)
+
+    def stream(self, **kwargs) -> Iterator[Any]:
+        for chunk in _chunks(self._response(kwargs).output_text):
+            yield _text_delta(chunk)
+
+
+class LatencyDistribution:
+    """
+    Parsed from specs such as "fixed:1.5", "uniform:0.5,3", "normal:2,0.5",
+    "lognormal:0.5,0.4" (mu, sigma of the underlying normal) or "exponential:2" (mean).
+    Values are in seconds and never negative.
+    """
+
+    def __init__(self, spec: str = "fixed:0", rng: Optional[random.Random] = None):
+        self.spec = spec
+        self.rng = rng or random.Random()
+        kind, _, params = spec.partition(":")
+        self.kind = kind.strip().lower()
+        self.params = [float(p) for p in params.split(",") if p.strip()] if params else []
+        if self.kind not in ("fixed", "uniform", "normal", "lognormal", "exponential"):
+            raise ValueError(f"Unknown latency distribution: {spec}")
+
+    def sample(self) -> float:
+        p = self.params
+        if self.kind == "fixed":
+            value = p[0] if p else 0.0
+        elif self.kind == "uniform":
+            value = self.rng.uniform(p[0], p[1])
+        elif self.kind == "normal":
+            value = self.rng.gauss(p[0], p[1])
+        elif self.kind == "lognormal":
+            value = self.rng.lognormvariate(p[0], p[1])
+        else:
+            value = self.rng.expovariate(1.0 / p[0]) if p[0] > 0 else 0.0
+        return max(value, 0.0)
+
+
+def synthetic_instance(schema: Dict[str, Any], root: Dict[str, Any], name: str = "") -> Any:
+    """A value matching a structured-output JSON schema (one item per array)"""
+    if "$ref" in schema:
+        schema = root.get("$defs", {})[schema["$ref"].rsplit("/", 1)[-1]]
+    if "anyOf" in schema:
+        schema = schema["anyOf"][0]
+    kind = schema.get("type")
+    if kind == "object":
+        if "properties" not in schema:
+            return SYNTHETIC_FIELDS.get(name, {})
+        return {key: synthetic_instance(value, root, key) for key, value in schema["properties"].items()}
+    if kind == "array":
+        return [synthetic_instance(schema.get("items", {}), root, name)]
+    if kind in ("number", "integer"):
+        return 0
+    if kind == "boolean":
+        return True
+    return SYNTHETIC_FIELDS.get(name, f"Synthetic {name or 'value'}")
+
+
+class SyntheticProvider:
+    """Canned responses shaped like the real ones, with injected latency and errors"""
+
+    mode = "synthetic"
+
+    def __init__(self, latency: LatencyDistribution, error_rate: float = 0.0, seed: Optional[int] = None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._seen_prefixes = set()
+        if seed is not None:
+            self.latency.rng = random.Random(seed + 1)
+
+    def _plan(self) -> Tuple[float, bool]:
+        """Sample the latency and decide whether to inject a failure for one call"""
+        with self._rng_lock:
+            return self.latency.sample(), self._rng.random() < self.error_rate
+
+    def _fail(self, kwargs: Dict[str, Any]) -> None:
+        raise SyntheticProviderError(f"Synthetic upstream error for model {kwargs.get('model')}")
+
+    def _timeout(self, kwargs: Dict[str, Any], delay: float) -> Optional[float]:
+        """The request timeout if the sampled delay would exceed it"""
+        timeout = kwargs.get("timeout")
+        return timeout if timeout is not None and delay > timeout else None
+
+    def render(self, kwargs: Dict[str, Any]) -> str:
+        """Pick a canned body that the calling code can parse"""
+        output_format = (kwargs.get("text") or {}).get("format") or {}
+        if output_format.get("type") == "json_schema":
+            schema = output_format["schema"]
+            return json.dumps(synthetic_instance(schema, schema))
+        return (
+            "**planning**: - [Synthetic source](https://example.com/synthetic) — canned planning "
+            "section used for offline load testing; no web search was performed.\n\n"
+            "**final_prompt**: " + SYNTHETIC_SYSTEM_PROMPT
+        )
+
+    def _cached_tokens(self, instructions: str) -> int:
+        """Mimic provider prefix caching: repeated instructions of 1024+ tokens hit in 128-token blocks"""
+        tokens = len(instructions) // 4
+        if tokens < CACHE_MIN_PREFIX_TOKENS:
+            return 0
+        key = hashlib.sha256(instructions.encode("utf-8")).hexdigest()
+        with self._rng_lock:
+            seen = key in self._seen_prefixes
+            self._seen_prefixes.add(key)
+        return tokens // CACHE_BLOCK_TOKENS * CACHE_BLOCK_TOKENS if seen else 0
+
+    def _usage(self, kwargs: Dict[str, Any], output_text: str) -> Dict[str, Any]:
+        instructions = str(kwargs.get("instructions") or "")
+        input_tokens = (len(instructions) + len(str(kwargs.get("input", "")))) // 4
+        output_tokens = len(output_text) // 4
+        return {"input_tokens": input_tokens, "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+                "input_tokens_details": {"cached_tokens": self._cached_tokens(instructions)}}
+
+    def _response(self, kwargs: Dict[str, Any]) -> ProviderResponse:
+        text = self.render(kwargs)
+        return ProviderResponse(text, kwargs.get("model", ""), self._usage(kwargs, text), "synthetic")
+
+    def create(self, **kwargs) -> ProviderResponse:
+        delay, fail = self._plan()
+        timeout = self._timeout(kwargs, delay)
+        if timeout is not None:
+            time.sleep(timeout)
+            raise SyntheticTimeoutError(f"Synthetic request timed out after {timeout:.1f}s")
+        time.sleep(delay)
+        if fail:
+            self._fail(kwargs)
+        return self._response(kwargs)
+
+    async def acreate(self, **kwargs) -> ProviderResponse:
+        delay, fail = self._plan()
+        timeout = self._timeout(kwargs, delay)
+        if timeout is not None:
+            await asyncio.sleep(timeout)
+            raise SyntheticTimeoutError(f"Synthetic request timed out after {timeout:.1f}s")
+        await asyncio.sleep(delay)
+        if fail:
+            self._fail(kwargs)
+        return self._response(kwargs)
+
+    def stream(self, **kwargs) -> Iterator[Any]:
+        delay, fail = self._plan()
+        if any(tool.get("type", "").startswith("web_search") for tool in kwargs.get("tools", [])):
+            yield SimpleNamespace(type="response.web_search_call.in_progress")
+        chunks = list(_chunks(self.render(kwargs)))
+        # Half the latency before the first token, the rest spread across the chunks
+        timeout = self._timeout(kwargs, delay / 2)
+        if timeout is not None:
+            time.sleep(timeout)
+            raise SyntheticTimeoutError(f"Synthetic stream timed out after {timeout:.1f}s")
+        time.sleep(delay / 2)
+        if fail:
+            self._fail(kwargs)
+        for chunk in chunks:
+            time.sleep(delay / 2 / len(chunks))
+            yield _text_delta(chunk)
+        yield SimpleNamespace(type="response.completed", response=self._response(kwargs))
+
+
+# Global provider instance
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def get_provider_mode() -> str:
+    mode = os.getenv("PROPT_PROVIDER", "live").lower()
+    if mode not in PROVIDER_MODES:
+        print(f"⚠️ Unknown PROPT_PROVIDER '{mode}', using live")
+        return "live"
+    return mode
+
+
+def create_provider(mode: Optional[str] = None):
+    """Build a provider from the PROPT_* environment variables"""
+    mode = mode or get_provider_mode()
+    store = CassetteStore(os.getenv("PROPT_CASSETTE_DIR", DEFAULT_CASSETTE_DIR))
+    if mode == "record":
+        return RecordingProvider(store)
+    if mode == "replay":
+        return ReplayProvider(store)
+    if mode == "synthetic":
+        seed = os.getenv("PROPT_SYNTHETIC_SEED")
+        return SyntheticProvider(
+            LatencyDistribution(os.getenv("PROPT_SYNTHETIC_LATENCY", "fixed:0")),
+            error_rate=float(os.getenv("PROPT_SYNTHETIC_ERROR_RATE", "0")),
+            seed=int(seed) if seed is not None else None,
+        )
+    return LiveProvider()
+
+
+def get_provider():
+    """Get the process-wide provider (created on first use)"""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = create_provider()
+                if _provider.mode != "live":
+                    print(f"🧪 LLM provider mode: {_provider.mode}")
+    return _provider
+
+
+def set_provider(provider) -> None:
+    """Swap the process-wide provider (load tests and benchmarks)"""
+    global _provider
+    with _provider_lock:
+        _provider = provider
+
+
+def needs_api_key() -> bool:
+    return get_provider_mode() in ("live", "record")
@@ -0,0 +1,343 @@
+"""
+Deadlines, retries and hedging around upstream LLM calls
+
+Each call site passes an endpoint label that selects its deadline. Within the
+deadline, transient failures are retried with full-jitter backoff as long as the
+process-wide retry budget allows it, so retries can't multiply load during an
+outage. With hedging enabled, a duplicate request is fired once the first one
+runs past the observed p95 for its (model, effort, web_search) configuration,
+and whichever finishes first wins.
+"""
+import asyncio
+import contextvars
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional
+
+import openai
+
+from latency_controller import get_latency_controller, request_latency_key
+from providers import CassetteNotFoundError, ProviderError
+
+# Whole-call deadlines in seconds, retries included (override with PROPT_DEADLINE_<ENDPOINT>)
+DEFAULT_DEADLINES = {
+    "generate_prompt": 240.0,
+    "summarize_document": 60.0,
+    "analyze_document": 60.0,
+    "generate_formats": 60.0,
+    "agent": 180.0,
+    "default": 600.0,
+}
+
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_BASE_DELAY = 0.5
+DEFAULT_MAX_DELAY = 8.0
+DEFAULT_BUDGET_CAPACITY = 20.0   # retries that can be spent in a burst
+DEFAULT_BUDGET_RATIO = 0.2       # retry tokens earned per call
+DEFAULT_HEDGE_MIN_DELAY = 1.0    # never hedge sooner than this
+DEFAULT_HEDGE_WORKERS = 32
+
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+
+
+class DeadlineExceeded(TimeoutError):
+    """The endpoint deadline passed before the upstream call succeeded"""
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        print(f"⚠️ Invalid value for {name}, using default {default}")
+        return default
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Transient upstream failures worth another attempt"""
+    if isinstance(error, (DeadlineExceeded, CassetteNotFoundError)):
+        return False
+    status_code = getattr(error, "status_code", None)
+    if status_code is not None:
+        return status_code in RETRYABLE_STATUS_CODES or status_code >= 500
+    return isinstance(error, (openai.APIConnectionError, ProviderError, TimeoutError, ConnectionError))
+
+
+class CallPolicy:
+    """Deadline, retry and hedging settings for one endpoint"""
+
+    def __init__(self, endpoint: str, deadline: float, max_attempts: int, base_delay: float,
+                 max_delay: float, hedging: bool, hedge_min_delay: float):
+        self.endpoint = endpoint
+        self.deadline = deadline
+        self.max_attempts = max(max_attempts, 1)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedging = hedging
+        self.hedge_min_delay = hedge_min_delay
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff before retry number `attempt`"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+
+def get_policy(endpoint: str) -> CallPolicy:
+    """Build the policy for an endpoint from PROPT_* environment variables"""
+    default_deadline = DEFAULT_DEADLINES.get(endpoint, DEFAULT_DEADLINES["default"])
+    return CallPolicy(
+        endpoint=endpoint,
+        deadline=_env_float(f"PROPT_DEADLINE_{endpoint.upper()}", default_deadline),
+        max_attempts=int(_env_float("PROPT_RETRY_ATTEMPTS", DEFAULT_MAX_ATTEMPTS)),
+        base_delay=_env_float("PROPT_RETRY_BASE_DELAY", DEFAULT_BASE_DELAY),
+        max_delay=_env_float("PROPT_RETRY_MAX_DELAY", DEFAULT_MAX_DELAY),
+        hedging=os.getenv("PROPT_HEDGING", "0").lower() in ("1", "true", "yes"),
+        hedge_min_delay=_env_float("PROPT_HEDGE_MIN_DELAY", DEFAULT_HEDGE_MIN_DELAY),
+    )
+
+
+class RetryBudget:
+    """
+    Token bucket shared by all call sites: every call earns `ratio` tokens, every
+    retry or hedge spends one. Keeps extra upstream load to roughly `ratio` of
+    normal traffic once the initial `capacity` is used up.
+    """
+
+    def __init__(self, capacity: float = DEFAULT_BUDGET_CAPACITY, ratio: float = DEFAULT_BUDGET_RATIO):
+        self.capacity = capacity
+        self.ratio = ratio
+        self._tokens = capacity
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    @property
+    def tokens(self) -> float:
+        with self._lock:
+            return self._tokens
+
+
+class ResilienceStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[str, int] = {
+            "calls": 0, "attempts": 0, "retries": 0, "budget_exhausted": 0,
+            "deadline_exceeded": 0, "hedges": 0, "hedge_wins": 0,
+        }
+
+    def incr(self, name: str) -> None:
+        with self._lock:
+            self._counts[name] += 1
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+
+_budget = RetryBudget(
+    capacity=_env_float("PROPT_RETRY_BUDGET", DEFAULT_BUDGET_CAPACITY),
+    ratio=_env_float("PROPT_RETRY_BUDGET_RATIO", DEFAULT_BUDGET_RATIO),
+)
+_stats = ResilienceStats()
+_hedge_pool: Optional[ThreadPoolExecutor] = None
+_hedge_pool_lock = threading.Lock()
+
+
+def get_retry_budget() -> RetryBudget:
+    return _budget
+
+
+def get_resilience_stats() -> Dict[str, Any]:
+    return {**_stats.snapshot(), "retry_budget_tokens": round(_budget.tokens, 2)}
+
+
+def _get_hedge_pool() -> ThreadPoolExecutor:
+    global _hedge_pool
+    if _hedge_pool is None:
+        with _hedge_pool_lock:
+            if _hedge_pool is None:
+                _hedge_pool = ThreadPoolExecutor(
+                    max_workers=int(_env_float("PROPT_HEDGE_WORKERS", DEFAULT_HEDGE_WORKERS)),
+                    thread_name_prefix="llm-hedge",
+                )
+    return _hedge_pool
+
+
+def hedge_delay(policy: CallPolicy, request: Dict[str, Any]) -> Optional[float]:
+    """Seconds to wait before hedging, or None when hedging is off or there's no p95 yet"""
+    if not policy.hedging:
+        return None
+    controller = get_latency_controller()
+    summary = controller.tracker.summary(request_latency_key(policy.endpoint, request))
+    if summary["count"] < controller.min_samples:
+        return None
+    return max(summary["p95"], policy.hedge_min_delay)
+
+
+def _retry_delay(policy: CallPolicy, attempt: int, error: BaseException, deadline: float) -> Optional[float]:
+    """Backoff before the next attempt, or None if the error should be raised"""
+    if not is_retryable(error) or attempt >= policy.max_attempts:
+        return None
+    delay = policy.backoff(attempt)
+    if time.monotonic() + delay >= deadline:
+        return None
+    if not _budget.withdraw():
+        _stats.incr("budget_exhausted")
+        print(f"⚠️ Retry budget exhausted, not retrying {policy.endpoint}: {error}")
+        return None
+    _stats.incr("retries")
+    print(f"🔁 Retrying {policy.endpoint} in {delay:.2f}s (attempt {attempt + 1}/{policy.max_attempts}): {error}")
+    return delay
+
+
+def _remaining(policy: CallPolicy, deadline: float) -> float:
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        _stats.incr("deadline_exceeded")
+        raise DeadlineExceeded(f"{policy.endpoint} deadline of {policy.deadline:.0f}s exceeded")
+    return remaining
+
+
+def _hedged_call(policy: CallPolicy, call: Callable[[Dict[str, Any]], Any], request: Dict[str, Any], deadline: float) -> Any:
+    """
+    Run call(request) on the hedge pool and fire a duplicate if it outlives the
+    hedge delay. Sync HTTP calls can't be interrupted, so the losing request is
+    abandoned and bounded by its own timeout rather than cancelled.
+    """
+    delay = hedge_delay(policy, request)
+    if delay is None:
+        return call(request)
+
+    pool = _get_hedge_pool()
+    # Copied contexts keep the attempts inside the caller's trace
+    primary = pool.submit(contextvars.copy_context().run, call, request)
+    done, _ = wait([primary], timeout=min(delay, _remaining(policy, deadline)))
+    if done:
+        return primary.result()
+    if not _budget.withdraw():
+        _stats.incr("budget_exhausted")
+        done, _ = wait([primary], timeout=_remaining(policy, deadline))
+        if not done:
+            _remaining(policy, deadline)
+        return primary.result()
+
+    _stats.incr("hedges")
+    print(f"🏇 Hedging {policy.endpoint} after {delay:.1f}s")
+    hedge = pool.submit(contextvars.copy_context().run, call, {**request, "timeout": _remaining(policy, deadline)})
+    pending = {primary, hedge}
+    error: Optional[BaseException] = None
+    while pending:
+        done, pending = wait(pending, timeout=_remaining(policy, deadline), return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                for other in pending:
+                    other.cancel()
+                if future is hedge:
+                    _stats.incr("hedge_wins")
+                return future.result()
+            error = future.exception()
+    raise error
+
+
+def call_with_resilience(endpoint: str, call: Callable[[Dict[str, Any]], Any], request: Dict[str, Any]) -> Any:
+    """Run call(request) under the endpoint's deadline, retry and hedging policy"""
+    policy = get_policy(endpoint)
+    deadline = time.monotonic() + policy.deadline
+    _budget.deposit()
+    _stats.incr("calls")
+    attempt = 0
+    while True:
+        attempt += 1
+        _stats.incr("attempts")
+        attempt_request = {**request, "timeout": _remaining(policy, deadline)}
+        try:
+            return _hedged_call(policy, call, attempt_request, deadline)
+        except Exception as e:
+            delay = _retry_delay(policy, attempt, e, deadline)
+            if delay is None:
+                raise
+            time.sleep(delay)
+
+
+async def _ahedged_call(policy: CallPolicy, call: Callable[[Dict[str, Any]], Awaitable[Any]], request: Dict[str, Any], deadline: float) -> Any:
+    """Async hedging - the losing request is cancelled"""
+    delay = hedge_delay(policy, request)
+    primary = asyncio.ensure_future(call(request))
+    tasks = {primary}
+    try:
+        if delay is not None:
+            done, _ = await asyncio.wait(tasks, timeout=min(delay, _remaining(policy, deadline)))
+            if not done and _budget.withdraw():
+                _stats.incr("hedges")
+                print(f"🏇 Hedging {policy.endpoint} after {delay:.1f}s")
+                tasks.add(asyncio.ensure_future(call({**request, "timeout": _remaining(policy, deadline)})))
+        error: Optional[BaseException] = None
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, timeout=_remaining(policy, deadline), return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is not primary:
+                        _stats.incr("hedge_wins")
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def acall_with_resilience(endpoint: str, call: Callable[[Dict[str, Any]], Awaitable[Any]], request: Dict[str, Any]) -> Any:
+    """Async variant of call_with_resilience - call is a coroutine function"""
+    policy = get_policy(endpoint)
+    deadline = time.monotonic() + policy.deadline
+    _budget.deposit()
+    _stats.incr("calls")
+    attempt = 0
+    while True:
+        attempt += 1
+        _stats.incr("attempts")
+        attempt_request = {**request, "timeout": _remaining(policy, deadline)}
+        try:
+            return await _ahedged_call(policy, call, attempt_request, deadline)
+        except Exception as e:
+            delay = _retry_delay(policy, attempt, e, deadline)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+
+
+def stream_with_resilience(endpoint: str, open_stream: Callable[[Dict[str, Any]], Iterator[Any]], request: Dict[str, Any]) -> Iterator[Any]:
+    """
+    Stream under the endpoint's deadline. Failures before the first event are
+    retried; once events have been yielded the error is raised to the caller.
+    Streams are not hedged.
+    """
+    policy = get_policy(endpoint)
+    deadline = time.monotonic() + policy.deadline
+    _budget.deposit()
+    _stats.incr("calls")
+    attempt = 0
+    while True:
+        attempt += 1
+        _stats.incr("attempts")
+        started = False
+        try:
+            for event in open_stream({**request, "timeout": _remaining(policy, deadline)}):
+                started = True
+                yield event
+            return
+        except Exception as e:
+            delay = None if started else _retry_delay(policy, attempt, e, deadline)
+            if delay is None:
+                raise
+            time.sleep(delay)
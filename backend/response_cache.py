@@ -0,0 +1,236 @@
+"""
+Content-addressed response cache with an in-memory LRU tier and an on-disk tier
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+DEFAULT_TTL_SECONDS = 24 * 60 * 60       # web-search results go stale, so entries expire
+DEFAULT_MAX_MEMORY_ENTRIES = 256
+DEFAULT_MAX_DISK_ENTRIES = 2000
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(__file__), "cache", "responses")
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so cosmetic differences don't change the cache key"""
+    return _WHITESPACE.sub(" ", str(text)).strip()
+
+
+def make_cache_key(*parts: Any) -> str:
+    """Build a SHA-256 key from normalized parts (strings, numbers or JSON-able values)"""
+    normalized = []
+    for part in parts:
+        if isinstance(part, str):
+            normalized.append(normalize_text(part))
+        else:
+            normalized.append(json.dumps(part, sort_keys=True, default=str))
+    return hashlib.sha256("\x1f".join(normalized).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-tier cache: a bounded LRU dict in memory backed by one JSON file per
+    entry on disk. Disk writes are best effort - in read-only or serverless
+    environments the cache silently runs memory-only.
+    """
+
+    def __init__(self,
+                 name: str,
+                 ttl_seconds: float = DEFAULT_TTL_SECONDS,
+                 max_memory_entries: int = DEFAULT_MAX_MEMORY_ENTRIES,
+                 max_disk_entries: int = DEFAULT_MAX_DISK_ENTRIES,
+                 cache_dir: Optional[str] = DEFAULT_CACHE_DIR):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0,
+                       "expired": 0, "stores": 0, "evictions": 0}
+        self.cache_dir = self._init_cache_dir(cache_dir)
+
+    def _init_cache_dir(self, cache_dir: Optional[str]) -> Optional[str]:
+        if not cache_dir:
+            return None
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            if not os.access(cache_dir, os.W_OK):
+                raise PermissionError(f"{cache_dir} is not writable")
+            return cache_dir
+        except OSError as e:
+            print(f"⚠️ Disk cache disabled for {self.name}: {e}")
+            return None
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _is_fresh(self, entry: Dict[str, Any]) -> bool:
+        return time.time() - entry["created_at"] < self.ttl_seconds
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value or None on a miss / expired entry"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if self._is_fresh(entry):
+                    self._memory.move_to_end(key)
+                    self._stats["hits"] += 1
+                    self._stats["memory_hits"] += 1
+                    return entry["value"]
+                del self._memory[key]
+                self._stats["expired"] += 1
+
+        entry = self._read_disk(key)
+        with self._lock:
+            if entry is not None and self._is_fresh(entry):
+                self._remember(key, entry)
+                self._stats["hits"] += 1
+                self._stats["disk_hits"] += 1
+                return entry["value"]
+            if entry is not None:
+                self._stats["expired"] += 1
+                self._delete_disk(key)
+            self._stats["misses"] += 1
+        return None
+
+    def set(self, key: str, value: Any, metadata: Optional[Dict[str, Any]] = None) -> None:
+        """Store a JSON-serialisable value in both tiers"""
+        entry = {"created_at": time.time(), "value": value, "metadata": metadata or {}}
+        with self._lock:
+            self._remember(key, entry)
+            self._stats["stores"] += 1
+        self._write_disk(key, entry)
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._memory.pop(key, None)
+            self._delete_disk(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self.cache_dir:
+                for file_name in os.listdir(self.cache_dir):
+                    if file_name.endswith(".json"):
+                        self._delete_disk(file_name[:-5])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "max_memory_entries": self.max_memory_entries,
+                "disk_entries": self._count_disk_entries(),
+                "max_disk_entries": self.max_disk_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "disk_enabled": self.cache_dir is not None,
+            }
+
+    # Internal helpers (callers hold self._lock where it matters)
+
+    def _remember(self, key: str, entry: Dict[str, Any]) -> None:
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def _read_disk(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._disk_path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Unreadable cache entry {key[:12]}: {e}")
+            self._delete_disk(key)
+            return None
+
+    def _write_disk(self, key: str, entry: Dict[str, Any]) -> None:
+        if not self.cache_dir:
+            return
+        try:
+            tmp_path = self._disk_path(key) + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, self._disk_path(key))
+            self._prune_disk()
+        except (OSError, TypeError) as e:
+            print(f"⚠️ Failed to persist cache entry {key[:12]}: {e}")
+
+    def _delete_disk(self, key: str) -> None:
+        if not self.cache_dir:
+            return
+        try:
+            os.remove(self._disk_path(key))
+        except OSError:
+            pass
+
+    def _count_disk_entries(self) -> int:
+        if not self.cache_dir:
+            return 0
+        try:
+            return sum(1 for file_name in os.listdir(self.cache_dir) if file_name.endswith(".json"))
+        except OSError:
+            return 0
+
+    def _prune_disk(self) -> None:
+        """Drop expired files, then the oldest ones beyond max_disk_entries"""
+        try:
+            paths = [os.path.join(self.cache_dir, f) for f in os.listdir(self.cache_dir) if f.endswith(".json")]
+            if len(paths) <= self.max_disk_entries:
+                return
+            paths.sort(key=os.path.getmtime)
+            cutoff = time.time() - self.ttl_seconds
+            excess = len(paths) - self.max_disk_entries
+            for path in paths:
+                if excess <= 0 and os.path.getmtime(path) >= cutoff:
+                    break
+                os.remove(path)
+                excess -= 1
+        except OSError as e:
+            print(f"⚠️ Failed to prune disk cache {self.name}: {e}")
+
+
+def _cache_from_env(name: str, prefix: str, default_ttl: float) -> ResponseCache:
+    disabled = os.getenv(f"{prefix}_DISK", "1").lower() in ("0", "false", "no")
+    base_dir = os.getenv("PROPT_CACHE_DIR", os.path.dirname(DEFAULT_CACHE_DIR))
+    return ResponseCache(
+        name=name,
+        ttl_seconds=float(os.getenv(f"{prefix}_TTL", default_ttl)),
+        max_memory_entries=int(os.getenv(f"{prefix}_MAX_MEMORY", DEFAULT_MAX_MEMORY_ENTRIES)),
+        max_disk_entries=int(os.getenv(f"{prefix}_MAX_DISK", DEFAULT_MAX_DISK_ENTRIES)),
+        cache_dir=None if disabled else os.path.join(base_dir, name),
+    )
+
+
+# Global cache instances
+_caches: Dict[str, ResponseCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_response_cache(name: str = "responses", prefix: str = "PROPT_CACHE",
+                       default_ttl: float = DEFAULT_TTL_SECONDS) -> ResponseCache:
+    """Get or create a named process-wide cache (settings from <prefix>_* env vars, PROPT_CACHE_* by default)"""
+    with _caches_lock:
+        if name not in _caches:
+            _caches[name] = _cache_from_env(name, prefix, default_ttl)
+        return _caches[name]
+
+
+def get_all_cache_stats() -> Dict[str, Dict[str, Any]]:
+    with _caches_lock:
+        caches = dict(_caches)
+    return {name: cache.stats() for name, cache in caches.items()}
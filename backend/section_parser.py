@@ -0,0 +1,234 @@
+"""
+Single-pass parser for the sections of a generation response
+
+generate_prompt.md asks the model for "**planning**: ..." followed by
+"**final_prompt**: ...". The response is read once: a search that jumps from
+newline to newline finds the lines that may open a section, each is checked
+against the accepted marker spellings, and the text between markers goes to
+the current section. Markers are only recognised at the start of a line, so
+the parser gives the same sections for a whole response and for a stream of
+deltas - a trailing partial line that could still become a marker is held
+back until the next delta decides it. Inside final_prompt only bold (or
+triple-quoted, as in generate_prompt_gpt4.md) markers end the section, so a
+system prompt's own "Sources:" or "Considerations:" lines stay in it.
+"""
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from tracing import traced
+
+NO_PLANNING = "No planning information available."
+SYSTEM_PROMPT_HEADER = "# System Prompt"
+
+MIN_PLANNING_CHARS = 20      # shorter planning sections are treated as missing
+MAX_MARKER_LEAD = 8          # leading spaces and '#'s allowed before a marker
+MAX_TITLE_LINE_CHARS = 200   # "planning — Sources used ..." heading lines
+
+SECTION_ALIASES = {
+    "planning": "planning",
+    "final_prompt": "final_prompt",
+    "final prompt": "final_prompt",
+    "considerations": "considerations",
+    "sources": "sources",
+    "sources used": "sources",
+}
+
+# Lines dropped when a response has no recognisable final prompt at all
+SKIP_LINE_WORDS = ("planning", "context", "assumptions", "planned vs", "sources used")
+
+_LINK_PATTERN = re.compile(r"\[([^\]\n]+)\]\((https?://[^)\s]+)\)")
+_URL_PATTERN = re.compile(r"https?://[^\s)\]>\"']+")
+
+_NAMES = r"planning|final[_ ]prompt|considerations|sources(?: used)?"
+# "**name**:", "**name:**", "name:", 'name: """' and "name — title" heading lines
+_MARKER_PATTERN = re.compile(
+    rf"[ \t#]{{0,{MAX_MARKER_LEAD}}}(?:"
+    rf"\*\*(?P<bold>{_NAMES})(?:\*\*:|:\*\*)"
+    rf"|(?P<plain>{_NAMES}):(?P<quoted>[ \t]*\"\"\")?"
+    rf"|(?P<title_bold>\*\*)?(?P<title>{_NAMES})(?(title_bold)\*\*)[ \t]+[—–-])",
+    re.IGNORECASE,
+)
+# Line starts worth checking against _MARKER_PATTERN; the leading literal lets re skip from newline to newline
+_CANDIDATE_PATTERN = re.compile(r"\n[ \t#]*[*pfcsPFCS]")
+# The same inside final_prompt, where only bold or triple-quoted markers count
+_FINAL_CANDIDATE_PATTERN = re.compile(r'\n[ \t#]*(?:\*\*[pfcsPFCS]|[pfcsPFCS][\w ]{0,20}:[ \t]*""")')
+MARKER_FIRST_CHARS = "*pfcsPFCS"
+MARKER_WINDOW = 32   # a marker is decided by the first characters of its line
+
+Chunk = Tuple[Optional[str], str]
+
+
+class ParsedResponse:
+    """The sections of one generation response"""
+
+    def __init__(self, sections: Dict[Optional[str], str]):
+        self.sections = sections
+        planning = sections.get("planning", "").strip()
+        self.planning = planning if len(planning) > MIN_PLANNING_CHARS else ""
+        self.considerations = _unquote(sections.get("considerations", "").strip())
+        self.sources = _links(f"{self.planning}\n{sections.get('sources', '')}")
+        self.final_prompt = _final_prompt(sections)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "planning": self.planning,
+            "final_prompt": self.final_prompt,
+            "considerations": self.considerations,
+            "sources": self.sources,
+        }
+
+
+def _unquote(text: str) -> str:
+    if len(text) >= 6 and text.startswith('"""') and text.endswith('"""'):
+        return text[3:-3].strip()
+    return text
+
+
+def _links(text: str) -> List[Dict[str, str]]:
+    """Markdown links, then bare URLs not already linked"""
+    links, seen = [], set()
+    found = _LINK_PATTERN.findall(text) + [(url, url) for url in _URL_PATTERN.findall(text)]
+    for title, url in found:
+        url = url.rstrip(".,;:")
+        if url not in seen:
+            seen.add(url)
+            links.append({"title": title.strip(), "url": url})
+    return links
+
+
+def _from_header(text: str) -> str:
+    """Start the prompt at its "# System Prompt" header when there is text before it"""
+    if text.startswith(SYSTEM_PROMPT_HEADER):
+        return text
+    if text.startswith("System Prompt"):
+        return "# " + text
+    index = text.find(SYSTEM_PROMPT_HEADER)
+    return text[index:] if index != -1 else text
+
+
+def _final_prompt(sections: Dict[Optional[str], str]) -> str:
+    """The final_prompt section; without one, the unlabelled text from its header, or that text cleaned"""
+    final = _unquote(sections.get("final_prompt", "").strip())
+    if final:
+        return _from_header(final)
+    unlabelled = sections.get(None, "").strip()
+    if SYSTEM_PROMPT_HEADER in unlabelled:
+        return _from_header(unlabelled)
+    lines = [line for line in unlabelled.split("\n") if not any(word in line.lower() for word in SKIP_LINE_WORDS)]
+    return "\n".join(lines).strip()
+
+
+class SectionParser:
+    """
+    Splits response text into sections, fed whole or as stream deltas.
+    feed() and finish() return the (section, text) chunks that are ready to
+    emit; section is None for text before the first marker.
+    """
+
+    def __init__(self):
+        self.current: Optional[str] = None
+        self._parts: Dict[Optional[str], List[str]] = {}
+        self._pending = ""
+        self._line_start = True
+        self._after_marker = False
+
+    def feed(self, delta: str) -> List[Chunk]:
+        """Consume a delta and return the chunks it completed"""
+        return self._consume(self._pending + delta, final=False)
+
+    def finish(self) -> List[Chunk]:
+        """Flush held-back text at the end of the stream"""
+        return self._consume(self._pending, final=True)
+
+    def result(self) -> ParsedResponse:
+        return ParsedResponse({section: "".join(parts) for section, parts in self._parts.items()})
+
+    def _consume(self, text: str, final: bool) -> List[Chunk]:
+        self._pending = ""
+        chunks: List[Chunk] = []
+        emitted = search_from = 0
+        position = 0 if self._line_start else None
+        while True:
+            if position is None:
+                candidates = _FINAL_CANDIDATE_PATTERN if self.current == "final_prompt" else _CANDIDATE_PATTERN
+                match = candidates.search(text, search_from)
+                if match is None:
+                    break
+                position = match.start() + 1
+            search_from = position
+            newline = text.find("\n", position)
+            marker = self._match_marker(text, position, len(text) if newline == -1 else newline, newline != -1 or final)
+            if marker is None:
+                return self._hold(chunks, text, emitted, position)
+            if marker:
+                self._emit(chunks, text[emitted:position])
+                self.current, emitted = marker
+                search_from = emitted
+                self._after_marker = True
+            position = None
+
+        if not final:
+            # A partial last line may still become a marker, e.g. "**plan"
+            newline = text.rfind("\n", emitted)
+            line_start = newline + 1 if newline != -1 else (0 if emitted == 0 and self._line_start else None)
+            if line_start is not None and line_start < len(text) and self._match_marker(text, line_start, len(text), False) is None:
+                return self._hold(chunks, text, emitted, line_start)
+        self._emit(chunks, text[emitted:])
+        if text:
+            self._line_start = text.endswith("\n")
+        return chunks
+
+    def _hold(self, chunks: List[Chunk], text: str, emitted: int, start: int) -> List[Chunk]:
+        """Emit up to the line at `start` and keep the rest for the next delta"""
+        self._emit(chunks, text[emitted:start])
+        self._pending = text[start:]
+        self._line_start = True
+        return chunks
+
+    def _match_marker(self, text: str, start: int, end: int, complete: bool):
+        """
+        (section, offset after the marker) if the line from `start` to `end` opens
+        a section, () if it doesn't, None if too little of the line has arrived to tell.
+        """
+        if not complete and end - start < MARKER_WINDOW:
+            line = text[start:end]
+            body = line.lstrip(" \t#")
+            if len(line) - len(body) > MAX_MARKER_LEAD or (body and body[0] not in MARKER_FIRST_CHARS):
+                return ()
+            return None
+        match = _MARKER_PATTERN.match(text, start, min(end, start + MARKER_WINDOW))
+        if match is None:
+            return ()
+        if match.group("title"):
+            if end - start > MAX_TITLE_LINE_CHARS:
+                return ()
+            if not complete:
+                return None
+            name, strong, after = match.group("title"), bool(match.group("title_bold")), end
+        elif match.group("bold"):
+            name, strong, after = match.group("bold"), True, match.end()
+        else:
+            name, strong, after = match.group("plain"), bool(match.group("quoted")), match.end("plain") + 1
+        section = SECTION_ALIASES[name.lower()]
+        if self.current == "final_prompt" and (not strong or section == "sources"):
+            return ()
+        return section, after
+
+    def _emit(self, chunks: List[Chunk], text: str) -> None:
+        if self._after_marker:
+            # Drop the whitespace after "**section**:" even when it arrives in a later delta
+            text = text.lstrip()
+            self._after_marker = not text
+        if not text:
+            return
+        self._parts.setdefault(self.current, []).append(text)
+        chunks.append((self.current, text))
+
+
+@traced("parse.response")
+def parse_response(response_text: str) -> ParsedResponse:
+    """Parse a complete generation response"""
+    parser = SectionParser()
+    parser.feed(str(response_text))
+    parser.finish()
+    return parser.result()
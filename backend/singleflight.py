@@ -0,0 +1,137 @@
+"""
+In-flight request coalescing: concurrent identical calls share one upstream execution
+"""
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class _LeaderCancelled(Exception):
+    """Set on the shared future when the leader is cancelled; waiters retry instead"""
+
+
+class SingleFlight:
+    """
+    The first caller for a key (the leader) runs the function; callers that arrive
+    with the same key while it is still running wait on the leader's future and
+    receive the same result or exception. A cancelled leader's cancellation is not
+    shared: its waiters start over and one of them becomes the new leader. Nothing
+    is remembered after the call completes - that is the response cache's job.
+
+    The shared future is a concurrent.futures.Future, so sync callers on Flask
+    worker threads and async callers on any event loop can wait on it together.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+        self._waiters: Dict[Hashable, int] = {}
+        self._stats = {"leader_calls": 0, "coalesced_calls": 0, "max_waiters": 0, "leader_cancellations": 0}
+
+    def _join(self, key: Hashable) -> Tuple[Future, bool]:
+        """Return (future, is_leader) for key, registering the caller"""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self._waiters[key] += 1
+                self._stats["coalesced_calls"] += 1
+                self._stats["max_waiters"] = max(self._stats["max_waiters"], self._waiters[key])
+                return future, False
+            future = Future()
+            future.set_running_or_notify_cancel()
+            self._calls[key] = future
+            self._waiters[key] = 0
+            self._stats["leader_calls"] += 1
+            return future, True
+
+    def _leave(self, key: Hashable) -> None:
+        with self._lock:
+            if key in self._waiters:
+                self._waiters[key] = max(self._waiters[key] - 1, 0)
+
+    def _finish(self, key: Hashable) -> None:
+        with self._lock:
+            self._calls.pop(key, None)
+            self._waiters.pop(key, None)
+
+    def _fail(self, key: Hashable, future: Future, error: BaseException) -> None:
+        self._finish(key)
+        if isinstance(error, asyncio.CancelledError):
+            with self._lock:
+                self._stats["leader_cancellations"] += 1
+            error = _LeaderCancelled()
+        future.set_exception(error)
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Tuple[Any, bool]:
+        """Run fn(*args, **kwargs) once per in-flight key. Returns (result, shared)"""
+        while True:
+            future, is_leader = self._join(key)
+            if is_leader:
+                break
+            try:
+                return future.result(), True
+            except _LeaderCancelled:
+                continue
+            finally:
+                self._leave(key)
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self._fail(key, future, e)
+            raise
+        self._finish(key)
+        future.set_result(result)
+        return result, False
+
+    async def do_async(self, key: Hashable, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Tuple[Any, bool]:
+        """Async variant of do() - fn is a coroutine function"""
+        while True:
+            future, is_leader = self._join(key)
+            if is_leader:
+                break
+            try:
+                # Shield so a cancelled waiter doesn't cancel the shared future
+                return await asyncio.shield(asyncio.wrap_future(future)), True
+            except _LeaderCancelled:
+                continue
+            finally:
+                self._leave(key)
+
+        try:
+            result = await fn(*args, **kwargs)
+        except BaseException as e:
+            self._fail(key, future, e)
+            raise
+        self._finish(key)
+        future.set_result(result)
+        return result, False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._stats,
+                "in_flight": len(self._calls),
+                "current_waiters": sum(self._waiters.values()),
+            }
+
+
+# Global single-flight groups, one per call site
+_groups: Dict[str, SingleFlight] = {}
+_groups_lock = threading.Lock()
+
+
+def get_singleflight(name: str) -> SingleFlight:
+    """Get or create the named process-wide single-flight group"""
+    with _groups_lock:
+        if name not in _groups:
+            _groups[name] = SingleFlight(name)
+        return _groups[name]
+
+
+def get_all_singleflight_stats() -> Dict[str, Dict[str, Any]]:
+    with _groups_lock:
+        groups = dict(_groups)
+    return {name: group.stats() for name, group in groups.items()}
@@ -0,0 +1,81 @@
+"""
+Server-Sent Events helpers for streaming model output to the client
+"""
+import contextvars
+import json
+import queue
+import threading
+from typing import Any, Callable, Iterator, Optional, Tuple
+
+# Seconds of silence before a keep-alive comment is sent
+DEFAULT_HEARTBEAT_INTERVAL = 15.0
+
+# Sentinel yielded by iter_with_heartbeat when the source has been idle
+HEARTBEAT = object()
+
+def format_sse(data: Any, event: Optional[str] = None, event_id: Optional[str] = None) -> str:
+    """Format a single SSE message; dicts and lists are sent as JSON"""
+    if not isinstance(data, str):
+        data = json.dumps(data, ensure_ascii=False)
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    for line in data.split("\n"):
+        lines.append(f"data: {line}")
+    return "\n".join(lines) + "\n\n"
+
+
+def sse_comment(text: str = "keep-alive") -> str:
+    """SSE comment line - ignored by EventSource but keeps proxies from timing out"""
+    return f": {text}\n\n"
+
+
+def iter_call(fn: Callable[..., Any], *args, **kwargs) -> Iterator[Any]:
+    """Yield the result of fn(*args, **kwargs), called when the first item is requested"""
+    yield fn(*args, **kwargs)
+
+
+def iter_with_heartbeat(source: Iterator[Any], interval: float = DEFAULT_HEARTBEAT_INTERVAL) -> Iterator[Any]:
+    """
+    Drain `source` on a background thread and yield its items, yielding
+    HEARTBEAT whenever nothing has arrived for `interval` seconds.
+    Exceptions raised by the source are re-raised in the caller.
+    Closing this generator stops the source at its next item.
+    """
+    items: "queue.Queue[Tuple[str, Any]]" = queue.Queue()
+    stop = threading.Event()
+
+    def _produce():
+        try:
+            for item in source:
+                if stop.is_set():
+                    break
+                items.put(("item", item))
+        except Exception as e:
+            items.put(("error", e))
+        finally:
+            close = getattr(source, "close", None)
+            if close:
+                close()
+            items.put(("done", None))
+
+    # The copied context keeps trace spans opened by the source inside the request's trace
+    threading.Thread(target=contextvars.copy_context().run, args=(_produce,), name="sse-producer", daemon=True).start()
+
+    try:
+        while True:
+            try:
+                kind, value = items.get(timeout=interval)
+            except queue.Empty:
+                yield HEARTBEAT
+                continue
+            if kind == "item":
+                yield value
+            elif kind == "error":
+                raise value
+            else:
+                return
+    finally:
+        stop.set()
@@ -0,0 +1,60 @@
+"""
+JSON-schema structured outputs
+
+Turns a Pydantic model into the Responses API `text.format` parameter so the
+model is constrained to the schema, and validates the reply against the same
+model. Callers get a typed object (or a StructuredOutputError) instead of
+slicing JSON out of free text.
+"""
+import copy
+from functools import lru_cache
+from typing import Any, Dict, Type, TypeVar
+
+from pydantic import BaseModel, ValidationError
+
+Model = TypeVar("Model", bound=BaseModel)
+
+
+class StructuredOutputError(ValueError):
+    """The reply did not validate against the requested schema"""
+
+
+def _strict(node: Any) -> None:
+    """Apply the strict-mode rules in place: closed objects, every property required, no defaults"""
+    if isinstance(node, dict):
+        node.pop("default", None)
+        if node.get("type") == "object" and "properties" in node:
+            node["additionalProperties"] = False
+            node["required"] = list(node["properties"])
+        for value in node.values():
+            _strict(value)
+    elif isinstance(node, list):
+        for value in node:
+            _strict(value)
+
+
+@lru_cache(maxsize=64)
+def output_schema(model: Type[BaseModel], strict: bool = True) -> Dict[str, Any]:
+    """JSON schema for `model`; strict schemas follow the structured-outputs subset"""
+    schema = model.model_json_schema()
+    if strict:
+        _strict(schema)
+    return schema
+
+
+def text_format(model: Type[BaseModel], strict: bool = True) -> Dict[str, Any]:
+    """The `text` argument of a Responses API call that returns an instance of `model`"""
+    return {"format": {
+        "type": "json_schema",
+        "name": model.__name__,
+        "schema": copy.deepcopy(output_schema(model, strict)),
+        "strict": strict,
+    }}
+
+
+def parse_output(model: Type[Model], text: str) -> Model:
+    """Validate a structured-output reply"""
+    try:
+        return model.model_validate_json(text)
+    except ValidationError as e:
+        raise StructuredOutputError(f"Response does not match {model.__name__}: {e.error_count()} error(s), {e.errors()[0]['msg']}") from e
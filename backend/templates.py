@@ -0,0 +1,169 @@
+"""
+Precompiled prompt template registry
+
+Every backend/prompts/*.md file is read and compiled once, at startup, into
+alternating literal and placeholder segments, so rendering is one join instead
+of a str.replace pass per placeholder. Both placeholder styles in the templates
+are understood: {name} (generation templates) and ${name} (agent templates).
+A template is re-stat'ed at most every PROPT_TEMPLATE_CHECK_INTERVAL seconds
+and recompiled when its file changes, so edits apply without a restart. An
+edit that fails the placeholder check given to validate() is rejected and the
+last good version stays in use.
+"""
+import os
+import re
+import threading
+import time
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+PROMPTS_DIR = os.path.join(os.path.dirname(__file__), "prompts")
+DEFAULT_CHECK_INTERVAL = 2.0
+
+PLACEHOLDER_PATTERN = re.compile(r"\$?\{([a-z_]+)\}")
+
+
+class TemplateError(KeyError):
+    """A template is missing, or a placeholder has no value"""
+
+    def __str__(self) -> str:
+        return str(self.args[0]) if self.args else ""
+
+
+class Template:
+    """One compiled template: segments[0::2] are literals, segments[1::2] placeholder names"""
+
+    def __init__(self, name: str, text: str, mtime: Optional[int] = None):
+        self.name = name
+        self.text = text
+        self.mtime = mtime
+        self.segments: List[str] = PLACEHOLDER_PATTERN.split(text)
+        self.placeholders: Tuple[str, ...] = tuple(dict.fromkeys(self.segments[1::2]))
+        self.counts: Dict[str, int] = {name: self.segments[1::2].count(name) for name in self.placeholders}
+        # Placeholders as <name> references, for the cache-friendly prefix layout
+        self.references = "".join(part if i % 2 == 0 else f"<{part}>" for i, part in enumerate(self.segments))
+
+    def render(self, **values) -> str:
+        """Fill every placeholder; values the template doesn't use are ignored"""
+        parts = self.segments[:]
+        try:
+            for i in range(1, len(parts), 2):
+                parts[i] = str(values[parts[i]])
+        except KeyError as e:
+            raise TemplateError(f"No value for placeholder {e.args[0]!r} in template {self.name}") from None
+        return "".join(parts)
+
+    def check(self, allowed: Iterable[str]) -> None:
+        """Raise TemplateError if the template uses a placeholder outside `allowed`"""
+        unknown = sorted(set(self.placeholders) - set(allowed))
+        if unknown:
+            raise TemplateError(f"Template {self.name} has unknown placeholders: {', '.join(unknown)}")
+
+
+class TemplateRegistry:
+    """The compiled templates of one directory, reloaded when their files change"""
+
+    def __init__(self, directory: str = PROMPTS_DIR, check_interval: float = DEFAULT_CHECK_INTERVAL):
+        self.directory = directory
+        self.check_interval = check_interval
+        self._templates: Dict[str, Template] = {}
+        self._checked_at: Dict[str, float] = {}
+        self._allowed: Dict[str, FrozenSet[str]] = {}   # placeholder names per template, from validate()
+        self._rejected: Dict[str, int] = {}             # file version of a rejected edit, not retried
+        self._lock = threading.Lock()
+        self._stats = {"compiles": 0, "reloads": 0, "rejected_reloads": 0}
+
+    def load_all(self) -> None:
+        """Compile every .md template in the directory"""
+        names = [file_name for file_name in sorted(os.listdir(self.directory)) if file_name.endswith(".md")]
+        for name in names:
+            self.get(name)
+        print(f"📄 Compiled {len(names)} prompt templates from {self.directory}")
+
+    def _compile(self, name: str) -> Template:
+        path = os.path.join(self.directory, name)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+        except OSError as e:
+            raise TemplateError(f"Template {name} could not be read: {e}") from None
+        self._stats["compiles"] += 1
+        return Template(name, text, mtime)
+
+    def get(self, name: str) -> Template:
+        """The compiled template, recompiled if its file changed since the last check"""
+        now = time.monotonic()
+        with self._lock:
+            template = self._templates.get(name)
+            if template is not None and now - self._checked_at[name] < self.check_interval:
+                return template
+            if template is None:
+                template = self._compile(name)
+            else:
+                try:
+                    mtime = os.stat(os.path.join(self.directory, name)).st_mtime_ns
+                    changed = mtime != template.mtime and mtime != self._rejected.get(name)
+                except OSError:
+                    changed = False   # keep serving the last good version
+                if changed:
+                    template = self._reload(template)
+            self._templates[name] = template
+            self._checked_at[name] = now
+            return template
+
+    def _reload(self, current: Template) -> Template:
+        """The recompiled template, or `current` if the new version fails validation"""
+        try:
+            template = self._compile(current.name)
+        except TemplateError as e:
+            print(f"⚠️ Kept the previous version of {current.name}: {e}")
+            return current
+        try:
+            template.check(self._allowed.get(current.name, template.placeholders))
+        except TemplateError as e:
+            self._rejected[current.name] = template.mtime
+            self._stats["rejected_reloads"] += 1
+            print(f"⚠️ Kept the previous version of {current.name}: {e}")
+            return current
+        self._stats["reloads"] += 1
+        print(f"🔄 Reloaded template {current.name}")
+        return template
+
+    def render(self, name: str, **values) -> str:
+        return self.get(name).render(**values)
+
+    def version(self, names: Iterable[str]) -> Tuple[Optional[int], ...]:
+        """File versions of the named templates, for caches built from them"""
+        return tuple(self.get(name).mtime for name in names)
+
+    def validate(self, allowed: Dict[str, Iterable[str]]) -> None:
+        """Check each named template's placeholders against the values its caller supplies"""
+        for name, names in allowed.items():
+            self._allowed[name] = frozenset(names)
+            self.get(name).check(names)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {**self._stats, "templates": len(self._templates)}
+
+
+# Global registry instance
+_registry: Optional[TemplateRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_template_registry() -> TemplateRegistry:
+    """Get or create the registry for backend/prompts, compiling every template on first use"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                registry = TemplateRegistry(check_interval=float(os.getenv("PROPT_TEMPLATE_CHECK_INTERVAL", DEFAULT_CHECK_INTERVAL)))
+                registry.load_all()
+                _registry = registry
+    return _registry
+
+
+def render_prompt(name: str, **values) -> str:
+    """Render backend/prompts/<name> with the given placeholder values"""
+    return get_template_registry().render(name, **values)
@@ -0,0 +1,12 @@
+import os
+import sys
+
+# Offline settings for the app under test: synthetic model responses and no disk stores
+os.environ.pop("OPENAI_API_KEY", None)
+os.environ.setdefault("PROPT_PROVIDER", "synthetic")
+os.environ.setdefault("PROPT_SYNTHETIC_LATENCY", "fixed:0")
+for store in ("PROPT_CACHE", "PROPT_DOMAIN_FACTS", "PROPT_CHECKPOINT", "PROPT_CRITIQUE_CACHE"):
+    os.environ.setdefault(f"{store}_DISK", "0")
+os.environ.setdefault("PROPT_JOB_WORKERS", "0")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
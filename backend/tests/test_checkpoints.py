@@ -0,0 +1,16 @@
+import asyncio
+
+import main_flask
+
+
+def test_resume_at_a_degraded_effort_reuses_the_checkpoints():
+    def refine(effort):
+        return asyncio.run(main_flask.process_prompt_with_agent_thinking(
+            "You are a helper.", "Insurance", "Claims triage", effort, run_id="run-degraded"))
+
+    first = refine("high")
+    resumed = refine("low")   # the latency controller lowered the effort for the retry
+
+    assert first["success"] and resumed["success"]
+    assert first["resumed_stages"] == []
+    assert resumed["resumed_stages"]
@@ -0,0 +1,16 @@
+import format_generator
+
+
+def test_tasks_with_objects_are_accepted(monkeypatch):
+    calls = []
+
+    def generate(industry, usecase, tasks, reasoning_effort):
+        calls.append(tasks)
+        return {"query": "string"}, {"result": "string"}
+    monkeypatch.setattr(format_generator, "_generate_json_formats", generate)
+
+    tasks = [{"name": "summarize", "inputs": ["filing"]}, ["rank", "score"]]
+    input_format, output_format = format_generator.generate_json_formats("Finance", "Research", tasks)
+
+    assert input_format == {"query": "string"}
+    assert calls == [tasks]
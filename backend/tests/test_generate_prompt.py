@@ -0,0 +1,60 @@
+import itertools
+
+import pytest
+
+import main_flask
+
+_addresses = itertools.count(1)
+
+
+@pytest.fixture
+def post():
+    client = main_flask.app.test_client()
+
+    def _post(path, payload):
+        # A fresh client address per request keeps the per-IP rate limit out of the way
+        return client.post(path, json=payload, environ_base={"REMOTE_ADDR": f"10.0.0.{next(_addresses)}"})
+    return _post
+
+
+def test_generation_failure_returns_agent_error(post, monkeypatch):
+    def fail(*args, **kwargs):
+        raise ValueError("could not parse response")
+    monkeypatch.setattr(main_flask, "run_generation", fail)
+
+    response = post("/api/generate-prompt", {"industry": "Finance", "usecase": "Research"})
+
+    assert response.status_code == 500
+    body = response.get_json()
+    assert body["success"] is False
+    assert body["error_type"] == "agent_error"
+    assert body["error"] == "could not parse response"
+
+
+def test_failure_before_generation_returns_api_error(post, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("no latency stats")
+    monkeypatch.setattr(main_flask, "apply_latency_slo", fail)
+
+    response = post("/api/generate-prompt", {"industry": "Finance", "usecase": "Research"})
+
+    assert response.status_code == 500
+    assert response.get_json() == {"success": False, "error": "API error: no latency stats"}
+
+
+def test_repeat_request_hits_the_cache_after_research_is_stored():
+    first, second = {}, {}
+    main_flask.make_prompt_agent("Retail", "Repeat pricing", meta=first)
+    main_flask.make_prompt_agent("Retail", "Repeat pricing", meta=second)
+
+    assert (first["cache"], first["domain_research"]) == ("miss", "searched")
+    assert (second["cache"], second["domain_research"]) == ("hit", "cached")
+
+
+@pytest.mark.parametrize("concurrency", ["fast", [2], {"n": 2}])
+def test_batch_rejects_a_malformed_concurrency(post, concurrency):
+    response = post("/api/generate-prompt/batch", {"items": [{"industry": "Finance", "usecase": "Research"}],
+                                                   "concurrency": concurrency})
+
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "concurrency must be a number"
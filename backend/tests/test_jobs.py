@@ -0,0 +1,41 @@
+import time
+
+import pytest
+
+import main_flask
+from jobs import JobStore
+
+
+def test_failed_refinement_fails_the_job(monkeypatch):
+    async def failed_pipeline(*args, **kwargs):
+        return {"success": False, "error": "Error: critique_agent timed out", "run_id": "run-1", "resumable": True}
+    monkeypatch.setattr(main_flask, "process_prompt_with_agent_thinking", failed_pipeline)
+
+    with pytest.raises(RuntimeError, match="critique_agent timed out"):
+        main_flask.run_refinement_job({"content": "You are a helper.", "run_id": "run-1"}, lambda stage: None)
+
+
+def test_successful_refinement_returns_the_result(monkeypatch):
+    async def pipeline(*args, **kwargs):
+        return {"success": True, "refined_prompt": "You are a careful helper."}
+    monkeypatch.setattr(main_flask, "process_prompt_with_agent_thinking", pipeline)
+
+    result = main_flask.run_refinement_job({"content": "You are a helper."}, lambda stage: None)
+
+    assert result["refined_prompt"] == "You are a careful helper."
+    assert "trace_id" in result
+
+
+def test_requeued_claim_cannot_overwrite_the_new_owner(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    job_id = store.create("generate_prompt", {})
+    first = store.claim("worker-a")
+    time.sleep(0.01)
+    assert store.requeue_stale(stale_after=0, max_attempts=3) == 1
+    second = store.claim("worker-b")
+
+    assert not store.finish(job_id, "worker-a", first["attempts"], result={"from": "a"})
+    store.set_stage(job_id, "stale stage", "worker-a", first["attempts"])
+    assert store.get(job_id)["stage"] == "starting"
+    assert store.finish(job_id, "worker-b", second["attempts"], result={"from": "b"})
+    assert store.get(job_id)["result"] == {"from": "b"}
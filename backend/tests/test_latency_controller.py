@@ -0,0 +1,55 @@
+from latency_controller import AdaptiveController, LatencyTracker, request_latency_key
+
+MODEL = "gpt-5-2025-08-07"
+
+
+def observe(tracker, kind, effort, seconds, web_search=True, count=5, failed=False):
+    for _ in range(count):
+        tracker.observe((kind, MODEL, effort, web_search), seconds, failed)
+
+
+def test_degradation_with_web_search_skips_minimal_effort():
+    tracker = LatencyTracker()
+    observe(tracker, "generate_prompt", "medium", 200.0)
+    observe(tracker, "generate_prompt", "low", 200.0)
+    controller = AdaptiveController(tracker, model_ladder=[MODEL])
+
+    decision = controller.choose("generate_prompt", MODEL, "medium", web_search=True)
+
+    assert decision["degraded"]
+    assert decision["reasoning_effort"] == "low"
+
+
+def test_degradation_without_web_search_may_use_minimal_effort():
+    tracker = LatencyTracker()
+    observe(tracker, "generate_prompt", "low", 200.0, web_search=False)
+    controller = AdaptiveController(tracker, model_ladder=[MODEL])
+
+    decision = controller.choose("generate_prompt", MODEL, "low", web_search=False)
+
+    assert decision["reasoning_effort"] == "minimal"
+
+
+def test_failed_calls_count_towards_p95():
+    tracker = LatencyTracker()
+    observe(tracker, "generate_prompt", "medium", 10.0, count=4)
+    observe(tracker, "generate_prompt", "medium", 300.0, count=1, failed=True)
+
+    summary = tracker.summary(("generate_prompt", MODEL, "medium", True))
+
+    assert summary["failures"] == 1
+    assert summary["p95"] == 300.0
+
+
+def test_samples_are_kept_per_call_kind():
+    tracker = LatencyTracker()
+    observe(tracker, "agent", "medium", 200.0)
+    controller = AdaptiveController(tracker, model_ladder=[MODEL])
+
+    assert not controller.choose("generate_prompt", MODEL, "medium")["degraded"]
+    assert controller.choose("process_prompt", MODEL, "medium", kind="agent", degrade_model=False)["degraded"]
+
+
+def test_request_latency_key():
+    request = {"model": MODEL, "reasoning": {"effort": "low"}, "tools": [{"type": "web_search_preview"}]}
+    assert request_latency_key("agent", request) == ("agent", MODEL, "low", True)
@@ -0,0 +1,18 @@
+import asyncio
+
+import llm_client
+
+
+def test_sdk_retries_are_off(monkeypatch):
+    # Retries belong to resilience.py, which counts them against the retry budget and deadline
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(llm_client, "_sync_client", None)
+
+    async def async_retries():
+        client = llm_client.get_async_client()
+        await llm_client.aclose_async_client()
+        return client.max_retries
+
+    assert llm_client.get_client().max_retries == 0
+    assert asyncio.run(async_retries()) == 0
+    llm_client.get_client().close()
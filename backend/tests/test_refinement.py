@@ -0,0 +1,29 @@
+import asyncio
+
+import main_flask
+from agents import Runner
+
+MULTI_ROUND = {"max_rounds": 3, "token_budget": 1_000_000, "time_budget": 300.0}
+
+
+def run_pipeline(refine=None):
+    agent = main_flask.make_prompt_editing_agent("Finance", "Research", "low", domain_facts="Cached facts.", refine=refine)
+    return asyncio.run(Runner.run(agent, "You are a helper."))
+
+
+def test_single_round_is_not_reported_as_max_rounds():
+    result = run_pipeline()
+
+    assert not result.error
+    assert result.refinement["rounds"] == 1
+    assert result.refinement["stop_reason"] == "not_requested"
+
+
+def test_nothing_to_revise_stops_before_any_round(monkeypatch):
+    monkeypatch.setattr(Runner, "_actionable", staticmethod(lambda critique: False))
+
+    result = run_pipeline(MULTI_ROUND)
+
+    assert result.skipped
+    assert result.refinement["rounds"] == 1
+    assert result.refinement["stop_reason"] == "no_issues"
@@ -0,0 +1,46 @@
+import asyncio
+import time
+
+import pytest
+
+import providers
+from agents import Agent, Runner
+from providers import LatencyDistribution, SyntheticProvider
+
+LATENCY = 0.5
+CONCURRENT_RUNS = 8
+
+
+@pytest.fixture
+def delayed_provider():
+    """A synthetic provider that takes LATENCY seconds per call"""
+    previous = providers.get_provider()
+    providers.set_provider(SyntheticProvider(LatencyDistribution(f"fixed:{LATENCY}")))
+    yield
+    providers.set_provider(previous)
+
+
+def make_agent():
+    return Agent(name="echo_agent", model="gpt-5-mini-2025-08-07", instructions="Repeat the input.", reasoning_effort="low")
+
+
+def test_concurrent_runs_take_about_as_long_as_one(delayed_provider):
+    async def run_all():
+        return await asyncio.gather(*(Runner.run(make_agent(), f"input {i}") for i in range(CONCURRENT_RUNS)))
+
+    started = time.perf_counter()
+    results = asyncio.run(run_all())
+    elapsed = time.perf_counter() - started
+
+    assert not any(result.error for result in results)
+    assert elapsed < LATENCY * 2 < LATENCY * CONCURRENT_RUNS
+
+
+def test_timeout_cancels_the_run(delayed_provider):
+    started = time.perf_counter()
+    result = asyncio.run(Runner.run(make_agent(), "input", timeout=0.1))
+    elapsed = time.perf_counter() - started
+
+    assert result.error
+    assert "timed out" in result.content
+    assert elapsed < LATENCY
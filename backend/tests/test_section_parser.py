@@ -0,0 +1,27 @@
+from section_parser import SectionParser, parse_response
+
+RESPONSE = (
+    "**planning**: - [SEC EDGAR](https://www.sec.gov/edgar) — filing structure and dates\n\n"
+    "**final_prompt**: # System Prompt - Equity Research Assistant\n\n"
+    "## Instructions\n**Important**: cite the filing date.\nSources: the filings you are given.\n\n"
+    "**considerations**: keep figures in USD\n"
+)
+
+
+def test_final_prompt_keeps_blank_lines_and_inline_labels():
+    parsed = parse_response(RESPONSE)
+
+    assert parsed.final_prompt.startswith("# System Prompt - Equity Research Assistant\n\n## Instructions")
+    assert "**Important**: cite the filing date." in parsed.final_prompt
+    assert parsed.final_prompt.endswith("Sources: the filings you are given.")
+    assert parsed.considerations == "keep figures in USD"
+    assert parsed.sources == [{"title": "SEC EDGAR", "url": "https://www.sec.gov/edgar"}]
+
+
+def test_stream_deltas_give_the_same_sections():
+    for chunk in (1, 3, 7, 64):
+        parser = SectionParser()
+        for index in range(0, len(RESPONSE), chunk):
+            parser.feed(RESPONSE[index:index + chunk])
+        parser.finish()
+        assert parser.result().sections == parse_response(RESPONSE).sections
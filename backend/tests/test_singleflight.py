@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def test_cancelled_leader_hands_over_to_a_waiter():
+    flight = SingleFlight("test")
+    calls = []
+
+    async def work(label):
+        calls.append(label)
+        await asyncio.sleep(0.2)
+        return label
+
+    async def scenario():
+        leader = asyncio.ensure_future(flight.do_async("key", work, "leader"))
+        await asyncio.sleep(0.05)
+        waiter = asyncio.ensure_future(flight.do_async("key", work, "waiter"))
+        await asyncio.sleep(0.05)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await waiter
+
+    assert asyncio.run(scenario()) == ("waiter", False)
+    assert calls == ["leader", "waiter"]
+    assert flight.stats()["leader_cancellations"] == 1
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_leader_errors_are_shared():
+    flight = SingleFlight("test")
+
+    async def fail():
+        await asyncio.sleep(0.1)
+        raise ValueError("upstream failed")
+
+    async def scenario():
+        return await asyncio.gather(flight.do_async("key", fail), flight.do_async("key", fail), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert flight.stats()["coalesced_calls"] == 1
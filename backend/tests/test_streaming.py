@@ -0,0 +1,14 @@
+import time
+
+from streaming import HEARTBEAT, iter_call, iter_with_heartbeat
+
+
+def test_slow_call_is_wrapped_in_heartbeats():
+    def summarize(text):
+        time.sleep(0.15)
+        return text.upper()
+
+    items = list(iter_with_heartbeat(iter_call(summarize, "contract"), interval=0.05))
+
+    assert items[-1] == "CONTRACT"
+    assert HEARTBEAT in items[:-1]
@@ -0,0 +1,23 @@
+import os
+
+from templates import TemplateRegistry
+
+
+def write(path, text, version):
+    path.write_text(text, encoding="utf-8")
+    os.utime(path, ns=(version, version))
+
+
+def test_reload_with_an_unknown_placeholder_keeps_the_last_good_version(tmp_path):
+    template = tmp_path / "greeting.md"
+    write(template, "Hello {industry}", 1_000_000_000)
+    registry = TemplateRegistry(str(tmp_path), check_interval=0)
+    registry.validate({"greeting.md": ("industry",)})
+
+    write(template, "Hello {industry} in {regoin}", 2_000_000_000)
+    assert registry.render("greeting.md", industry="retail") == "Hello retail"
+    assert registry.stats()["rejected_reloads"] == 1
+
+    write(template, "Hi {industry}", 3_000_000_000)
+    assert registry.render("greeting.md", industry="retail") == "Hi retail"
+    assert registry.stats()["rejected_reloads"] == 1
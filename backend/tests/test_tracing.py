@@ -0,0 +1,28 @@
+import json
+
+from tracing import TraceExporter
+
+
+def test_no_export_without_a_destination(monkeypatch):
+    monkeypatch.delenv("PROPT_TRACE_FILE", raising=False)
+    monkeypatch.delenv("PROPT_TRACE_COLLECTOR_URL", raising=False)
+    exporter = TraceExporter()
+
+    exporter.export({"trace_id": "t1"})
+
+    assert exporter._thread is None
+    assert exporter._queue.empty()
+
+
+def test_trace_file_is_rotated(monkeypatch, tmp_path):
+    path = tmp_path / "traces.jsonl"
+    monkeypatch.setenv("PROPT_TRACE_FILE", str(path))
+    monkeypatch.setenv("PROPT_TRACE_FILE_MAX_BYTES", "10")
+    monkeypatch.delenv("PROPT_TRACE_COLLECTOR_URL", raising=False)
+    exporter = TraceExporter()
+
+    exporter._write({"trace_id": "t1"})
+    exporter._write({"trace_id": "t2"})
+
+    assert json.loads((tmp_path / "traces.jsonl.1").read_text())["trace_id"] == "t1"
+    assert json.loads(path.read_text())["trace_id"] == "t2"
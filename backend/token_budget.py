@@ -0,0 +1,224 @@
+"""
+Token estimation and per-model input budgets
+
+Prompts are assembled from a fixed template plus variable sections (tasks, links,
+document, formats). fit_sections() measures every section and, when the total
+would exceed the budget, trims the lowest-priority sections first. Trimmed text
+keeps its head and tail with an explicit marker in between, so the model (and
+the logs) can see that something was cut.
+"""
+import math
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("o200k_base")
+except Exception:  # tiktoken is optional - fall back to a character heuristic
+    _ENCODING = None
+
+CHARS_PER_TOKEN = 4
+
+# Context window, max output and USD per 1M input/output tokens, matched by model prefix
+MODEL_LIMITS = {
+    "gpt-5-nano": {"context": 400_000, "max_output": 128_000, "input_cost": 0.05, "output_cost": 0.40},
+    "gpt-5-mini": {"context": 400_000, "max_output": 128_000, "input_cost": 0.25, "output_cost": 2.00},
+    "gpt-5": {"context": 400_000, "max_output": 128_000, "input_cost": 1.25, "output_cost": 10.00},
+    "gpt-4.1": {"context": 1_047_576, "max_output": 32_768, "input_cost": 2.00, "output_cost": 8.00},
+}
+DEFAULT_LIMITS = {"context": 128_000, "max_output": 16_384, "input_cost": 1.25, "output_cost": 10.00}
+
+# Input budgets in tokens - well under the context windows, to bound latency and cost
+DEFAULT_PROMPT_BUDGET = 12_000
+DEFAULT_DOCUMENT_BUDGET = 6_000
+TRIM_MARKER = "\n[… {count} tokens trimmed …]\n"
+
+
+def estimate_tokens(text: str) -> int:
+    """Token count for text (exact with tiktoken, roughly chars/4 without)"""
+    if not text:
+        return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text, disallowed_special=()))
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def get_model_limits(model: str) -> Dict[str, float]:
+    for prefix, limits in MODEL_LIMITS.items():
+        if model.startswith(prefix):
+            return limits
+    return DEFAULT_LIMITS
+
+
+def estimate_cost(model: str, input_tokens: int, output_tokens: int = 0) -> float:
+    """Estimated USD cost of a call"""
+    limits = get_model_limits(model)
+    return (input_tokens * limits["input_cost"] + output_tokens * limits["output_cost"]) / 1_000_000
+
+
+def input_budget(model: str, budget: Optional[int] = None) -> int:
+    """Input token budget for a model: the configured budget, capped by its context window"""
+    limits = get_model_limits(model)
+    if budget is None:
+        budget = int(os.getenv("PROPT_PROMPT_TOKEN_BUDGET", DEFAULT_PROMPT_BUDGET))
+    return min(budget, int(limits["context"] - limits["max_output"]))
+
+
+def trim_text(text: str, max_tokens: int) -> str:
+    """Shorten text to about max_tokens, keeping the first two thirds and last third of the budget"""
+    tokens = estimate_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+    keep_chars = int(len(text) * max_tokens / tokens)
+    head_chars = keep_chars * 2 // 3
+    tail_chars = keep_chars - head_chars
+    head = text[:head_chars]
+    tail = text[len(text) - tail_chars:] if tail_chars else ""
+    # Cut on line boundaries when that doesn't lose too much
+    if "\n" in head[head_chars // 2:]:
+        head = head[:head.rindex("\n")]
+    if "\n" in tail[:tail_chars // 2]:
+        tail = tail[tail.index("\n") + 1:]
+    return head + TRIM_MARKER.format(count=tokens - max_tokens) + tail
+
+
+class Section:
+    """
+    A variable part of a prompt; lower priority numbers are kept longest.
+    `occurrences` is how many times the template repeats it.
+    """
+
+    def __init__(self, name: str, text: str, priority: int, min_tokens: int = 0, occurrences: int = 1):
+        self.name = name
+        self.text = text or ""
+        self.priority = priority
+        self.min_tokens = min_tokens
+        self.occurrences = max(occurrences, 0)
+
+
+def fit_sections(model: str, fixed_text: str, sections: List[Section], budget: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Trim sections so fixed_text plus all sections fit the model's input budget.
+
+    Returns {"texts": {name: text}, "report": breakdown}. The report lists the
+    tokens per section before and after trimming, the total, the budget and the
+    estimated input cost.
+    """
+    budget = input_budget(model, budget)
+    fixed_tokens = estimate_tokens(fixed_text)
+    sizes = {section.name: estimate_tokens(section.text) for section in sections}
+    texts = {section.name: section.text for section in sections}
+    over = fixed_tokens + sum(sizes[s.name] * s.occurrences for s in sections) - budget
+
+    # Lowest priority first (highest number)
+    for section in sorted(sections, key=lambda s: -s.priority):
+        if over <= 0:
+            break
+        available = sizes[section.name] - section.min_tokens
+        if available <= 0 or section.occurrences == 0:
+            continue
+        target = sizes[section.name] - min(available, math.ceil(over / section.occurrences))
+        texts[section.name] = trim_text(section.text, target)
+        over -= (sizes[section.name] - estimate_tokens(texts[section.name])) * section.occurrences
+
+    section_report = {}
+    for section in sections:
+        tokens = estimate_tokens(texts[section.name])
+        section_report[section.name] = {
+            "tokens": tokens,
+            "original_tokens": sizes[section.name],
+            "occurrences": section.occurrences,
+            "trimmed": texts[section.name] != section.text,
+        }
+    total = fixed_tokens + sum(entry["tokens"] * entry["occurrences"] for entry in section_report.values())
+    report = {
+        "model": model,
+        "budget": budget,
+        "template_tokens": fixed_tokens,
+        "total_tokens": total,
+        "over_budget": total > budget,
+        "estimated_input_cost_usd": round(estimate_cost(model, total), 6),
+        "sections": section_report,
+        "estimator": "tiktoken" if _ENCODING is not None else "chars/4",
+    }
+    return {"texts": texts, "report": report}
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    """One-line summary of a fit_sections report for the console"""
+    parts = [f"template {report['template_tokens']}"]
+    for name, entry in report["sections"].items():
+        if not entry["tokens"] or not entry["occurrences"]:
+            continue
+        repeat = f"×{entry['occurrences']}" if entry["occurrences"] > 1 else ""
+        trimmed = f" (trimmed from {entry['original_tokens']})" if entry["trimmed"] else ""
+        parts.append(f"{name} {entry['tokens']}{repeat}{trimmed}")
+    return (f"{', '.join(parts)} → {report['total_tokens']}/{report['budget']} tokens "
+            f"(≈${report['estimated_input_cost_usd']:.4f})")
+
+
+def fit_document(model: str, document: str, budget: Optional[int] = None) -> str:
+    """Trim a raw document to the document budget, keeping its beginning and end"""
+    if budget is None:
+        budget = int(os.getenv("PROPT_DOCUMENT_TOKEN_BUDGET", DEFAULT_DOCUMENT_BUDGET))
+    trimmed = trim_text(document, input_budget(model, budget))
+    if trimmed != document:
+        print(f"✂️ Document trimmed from {estimate_tokens(document)} to ~{budget} tokens for {model}")
+    return trimmed
+
+
+def _usage_value(usage: Any, name: str) -> int:
+    value = usage.get(name) if isinstance(usage, dict) else getattr(usage, name, None)
+    return value or 0
+
+
+def cached_tokens(usage: Any) -> int:
+    """Prompt tokens the provider served from its prefix cache (usage.input_tokens_details.cached_tokens)"""
+    if usage is None:
+        return 0
+    details = usage.get("input_tokens_details") if isinstance(usage, dict) else getattr(usage, "input_tokens_details", None)
+    return _usage_value(details, "cached_tokens") if details is not None else 0
+
+
+class UsageTracker:
+    """Input, cached and output token totals per model, from response.usage"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models: Dict[str, Dict[str, int]] = {}
+
+    def record(self, model: str, usage: Any) -> None:
+        if usage is None:
+            return
+        with self._lock:
+            totals = self._models.setdefault(model, {"calls": 0, "cache_hit_calls": 0, "input_tokens": 0,
+                                                     "cached_tokens": 0, "output_tokens": 0})
+            cached = cached_tokens(usage)
+            totals["calls"] += 1
+            totals["cache_hit_calls"] += 1 if cached else 0
+            totals["input_tokens"] += _usage_value(usage, "input_tokens")
+            totals["cached_tokens"] += cached
+            totals["output_tokens"] += _usage_value(usage, "output_tokens")
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            models = {model: dict(totals) for model, totals in self._models.items()}
+        for totals in models.values():
+            totals["cached_ratio"] = round(totals["cached_tokens"] / totals["input_tokens"], 3) if totals["input_tokens"] else 0.0
+        return models
+
+
+# Global usage tracker instance
+_usage_tracker = UsageTracker()
+
+
+def record_usage(model: str, usage: Any) -> None:
+    """Add a response's token usage to the process-wide totals"""
+    _usage_tracker.record(model, usage)
+
+
+def get_usage_stats() -> Dict[str, Any]:
+    return _usage_tracker.snapshot()
@@ -0,0 +1,284 @@
+"""
+Lightweight in-process tracing
+
+A trace is a tree of timed spans (HTTP request → pipeline stage → LLM call, ...)
+kept in a context variable, so nested calls, asyncio tasks and threads started
+with a copied context attach to the right parent. Spans are only recorded inside
+an active trace; outside one span() is a no-op. When the root span ends the
+whole trace is exported from a background thread: appended as one JSON line to
+PROPT_TRACE_FILE (e.g. backend/traces/traces.jsonl, rotated to <file>.1 past
+PROPT_TRACE_FILE_MAX_BYTES) and/or POSTed to PROPT_TRACE_COLLECTOR_URL. With
+neither set, traces are only kept in memory for the response headers and stats.
+"""
+import asyncio
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+DEFAULT_TRACE_FILE_MAX_BYTES = 50 * 1024 * 1024
+EXPORT_QUEUE_SIZE = 1000
+TRACE_ID_PATTERN = re.compile(r"^[0-9a-f]{16,32}$")
+
+
+class Span:
+    """One timed operation; attributes are JSON-serializable key/values"""
+
+    def __init__(self, trace: "Trace", name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.error: Optional[str] = None
+
+    @property
+    def trace_id(self) -> str:
+        return self.trace.trace_id
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self._started
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        self.trace.finish(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_offset_ms": round((self.start - self.trace.root.start) * 1000, 1),
+            "duration_ms": round(self.duration * 1000, 1) if self.duration is not None else None,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _NoopSpan:
+    """Stand-in returned outside a trace so callers can always call .set()"""
+
+    trace_id = None
+
+    def set(self, **attributes) -> None:
+        pass
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    """The spans of one request or job; exported when the root span ends"""
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.root: Optional[Span] = None
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def finish(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+        if span is self.root:
+            _exporter.export(self.to_dict())
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span.start)
+        return {
+            "trace_id": self.trace_id,
+            "name": self.root.name,
+            "start": self.root.start,
+            "duration_ms": round(self.root.duration * 1000, 1),
+            "error": self.root.error,
+            "spans": [span.to_dict() for span in spans],
+        }
+
+
+_current: "contextvars.ContextVar[Optional[Span]]" = contextvars.ContextVar("propt_span", default=None)
+
+
+def tracing_enabled() -> bool:
+    return os.getenv("PROPT_TRACING", "1").lower() not in ("0", "false", "no")
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def set_attributes(**attributes) -> None:
+    """Add attributes to the current span, if any"""
+    span = _current.get()
+    if span is not None:
+        span.set(**attributes)
+
+
+def current_trace_id() -> Optional[str]:
+    span = _current.get()
+    return span.trace_id if span is not None else None
+
+
+def begin_trace(name: str, trace_id: Optional[str] = None, **attributes):
+    """
+    Start a trace and make its root span current. Returns (span, token) for
+    end_trace(); use this form when start and end live in different callbacks.
+    An incoming trace_id is reused if it looks like one (16-32 hex chars).
+    """
+    if not tracing_enabled():
+        return NOOP_SPAN, None
+    if not trace_id or not TRACE_ID_PATTERN.match(trace_id):
+        trace_id = uuid.uuid4().hex
+    trace = Trace(trace_id)
+    trace.root = Span(trace, name, None, attributes)
+    return trace.root, _current.set(trace.root)
+
+
+def end_trace(root, token, error: Optional[BaseException] = None) -> None:
+    """End the root span (exporting the trace) and restore the previous context"""
+    root.end(error)
+    if token is not None:
+        with contextlib.suppress(ValueError):
+            _current.reset(token)
+
+
+@contextlib.contextmanager
+def trace(name: str, trace_id: Optional[str] = None, **attributes) -> Iterator[Any]:
+    """Run a block as the root span of a new trace (jobs, CLI runs)"""
+    root, token = begin_trace(name, trace_id, **attributes)
+    try:
+        yield root
+    except BaseException as e:
+        end_trace(root, token, e)
+        raise
+    end_trace(root, token)
+
+
+def start_span(name: str, **attributes):
+    """Open a child of the current span without making it current; the caller ends it"""
+    parent = _current.get()
+    if parent is None:
+        return NOOP_SPAN
+    return Span(parent.trace, name, parent.span_id, attributes)
+
+
+@contextlib.contextmanager
+def span(name: str, **attributes) -> Iterator[Any]:
+    """Time a block as a child of the current span (no-op outside a trace)"""
+    parent = _current.get()
+    if parent is None:
+        yield NOOP_SPAN
+        return
+    child = Span(parent.trace, name, parent.span_id, attributes)
+    token = _current.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.end(e)
+        raise
+    finally:
+        try:
+            _current.reset(token)
+        except ValueError:  # exited in another context (generator closed elsewhere)
+            _current.set(parent)
+    child.end()
+
+
+def traced(name: str, **attributes) -> Callable:
+    """Decorator form of span() for sync and async functions"""
+    def decorator(fn: Callable) -> Callable:
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name, **attributes):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name, **attributes):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class TraceExporter:
+    """Writes finished traces to a JSONL file and/or a collector URL off the request path"""
+
+    def __init__(self):
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=EXPORT_QUEUE_SIZE)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stats = {"exported": 0, "dropped": 0, "failed": 0}
+
+    def export(self, trace_dict: Dict[str, Any]) -> None:
+        if not (os.getenv("PROPT_TRACE_FILE") or os.getenv("PROPT_TRACE_COLLECTOR_URL")):
+            return
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(trace_dict)
+        except queue.Full:
+            with self._lock:
+                self._stats["dropped"] += 1
+
+    def _ensure_started(self) -> None:
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                    self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            trace_dict = self._queue.get()
+            try:
+                self._write(trace_dict)
+                with self._lock:
+                    self._stats["exported"] += 1
+            except Exception as e:
+                print(f"⚠️ Trace export failed: {e}")
+                with self._lock:
+                    self._stats["failed"] += 1
+
+    def _write(self, trace_dict: Dict[str, Any]) -> None:
+        line = json.dumps(trace_dict, ensure_ascii=False, default=str)
+        path = os.getenv("PROPT_TRACE_FILE")
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            max_bytes = int(os.getenv("PROPT_TRACE_FILE_MAX_BYTES", DEFAULT_TRACE_FILE_MAX_BYTES))
+            if os.path.exists(path) and os.path.getsize(path) >= max_bytes:
+                os.replace(path, path + ".1")   # keep one previous file
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        collector = os.getenv("PROPT_TRACE_COLLECTOR_URL")
+        if collector:
+            import httpx
+            httpx.post(collector, content=line, headers={"Content-Type": "application/json"}, timeout=5.0)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, "queued": self._queue.qsize(), "enabled": tracing_enabled()}
+
+
+# Global exporter instance
+_exporter = TraceExporter()
+
+
+def get_tracing_stats() -> Dict[str, Any]:
+    return _exporter.stats()
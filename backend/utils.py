@@ -1,14 +1,14 @@
 import os
-from string import Template
+
+from templates import PROMPTS_DIR, render_prompt
 
 def load_prompt(path: str, **kwargs) -> str:
     """
-    Load a prompt template and substitute placeholders like ${industry}, ${tech}, etc.
+    Render a prompt template from backend/prompts, substituting placeholders like
+    ${industry} or {usecase} (compiled once by the template registry).
     """
     project_root = os.path.dirname(os.path.abspath(__file__))
     full_path = os.path.join(project_root, path)
-    if not os.path.isfile(full_path):
-        raise FileNotFoundError(f"Prompt file not found: {full_path}")
-
-    text = open(full_path, "r", encoding="utf-8").read()
-    return Template(text).substitute(**kwargs)
+    if os.path.dirname(os.path.abspath(full_path)) != os.path.abspath(PROMPTS_DIR):
+        raise FileNotFoundError(f"Prompt file not found in {PROMPTS_DIR}: {full_path}")
+    return render_prompt(os.path.basename(full_path), **kwargs)